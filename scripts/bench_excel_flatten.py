@@ -0,0 +1,99 @@
+"""Benchmark Excel flattening: the pandas dump against the openpyxl stream.
+
+Builds a synthetic workbook (sheets of sales rows with empty columns,
+sparse cells and blank rows), then flattens it once per mode, each in a
+fresh interpreter so peaks don't carry over. Reports wall time, the
+tracemalloc peak, peak RSS and the size of the output in characters and
+estimated tokens. tracemalloc slows every mode down; compare the times
+with each other, not with a production run.
+
+    python scripts/bench_excel_flatten.py [--sheets 3] [--rows 20000] [--keep]
+
+Defaults (3 sheets x 20000 rows, a 2.6 MiB workbook), Python 3.11, Linux:
+
+    mode                 time  peak MiB   rss MiB      chars     tokens
+    pandas              96.5s      56.2     218.4    7140050    1785013
+    stream-uncapped     48.4s      28.9     160.4    4069663    1017416
+    stream-default      19.4s       4.6      93.4     415290     103823
+    stream-summary      56.3s       4.2      92.6       5669       1418
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+MODES = ("pandas", "stream-uncapped", "stream-default", "stream-summary")
+
+_MEASURE = r"""
+import resource, sys, time, tracemalloc
+from kelp_teaser.tools.excel_parser import flatten_legacy_workbook, flatten_workbook
+from kelp_teaser.tools.token_budget import TokenEstimator
+
+mode, path = sys.argv[1], sys.argv[2]
+run = {
+    "pandas": flatten_legacy_workbook,
+    "stream-uncapped": lambda p: flatten_workbook(p, max_rows=10**9, max_cells=10**9),
+    "stream-default": flatten_workbook,
+    "stream-summary": lambda p: flatten_workbook(p, summary=True),
+}[mode]
+tracemalloc.start()
+start = time.monotonic()
+out = run(path)
+elapsed = time.monotonic() - start
+peak = tracemalloc.get_traced_memory()[1]
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(f"{mode:16} {elapsed:7.1f}s {peak / 2**20:9.1f} {rss:9.1f} "
+      f"{len(out):>10} {TokenEstimator().estimate(out):>10}")
+"""
+
+
+def build_workbook(path: Path, sheets: int, rows: int, seed: int = 0) -> None:
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Sheet{s}")
+        ws.append(["Date", "Region", None, "Product", "Units", "Price", "Revenue", None,
+                   "Margin %", "Notes", None, "Owner"])
+        for r in range(rows):
+            if r % 50 == 49:
+                ws.append([])
+                continue
+            ws.append([f"2024-{r % 12 + 1:02d}-01", rng.choice(["North", "South", "East", "West"]),
+                       None, f"SKU-{r % 300}", rng.randint(1, 500),
+                       round(rng.uniform(5, 200), 2),
+                       None if r % 7 == 0 else round(rng.uniform(100, 90_000), 2), None,
+                       round(rng.uniform(0, 0.6), 4), "promo" if r % 13 == 0 else None,
+                       None, rng.choice(["AK", "BM", "CS"])])
+    wb.save(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sheets", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per sheet")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--keep", action="store_true", help="keep the workbook")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_excel_"))
+    book = tmp / "bench.xlsx"
+    build_workbook(book, args.sheets, args.rows)
+    print(f"{book}: {book.stat().st_size / 2**20:.1f} MiB, "
+          f"{args.sheets} sheets x {args.rows} rows")
+    print(f"{'mode':16} {'time':>8} {'peak MiB':>9} {'rss MiB':>9} {'chars':>10} {'tokens':>10}")
+    for mode in args.modes:
+        subprocess.run([sys.executable, "-W", "ignore", "-c", _MEASURE, mode, str(book)],
+                       check=True)
+    if not args.keep:
+        book.unlink()
+        tmp.rmdir()
+
+
+if __name__ == "__main__":
+    main()
@@ -71,7 +71,8 @@ def _scrub_text(text: str, real_name: str, codename: str,
         real_name=real_name, codename=codename, original_text=text,
     )
     try:
-        out = llm.complete_json(MODEL_FAST, prompt, _Replacement)
+        out = llm.complete_json(MODEL_FAST, prompt, _Replacement,
+                                agent="anonymizer")
         return out.replacement or text
     except Exception as e:  # noqa: BLE001
         log.error("Anonymizer call failed: %s", e)
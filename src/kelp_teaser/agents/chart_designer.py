@@ -15,6 +15,7 @@ def design_chart(section: SectionPlan, *, source_context: str) -> ChartSpec:
         chart_kind=section.chart_spec.chart_kind.value,
         heading=section.chart_spec.title or "",
         data_hooks=", ".join(section.data_hooks),
-        source_context=source_context,
     )
-    return llm.complete_json(MODEL_FAST, prompt, ChartSpec)
+    return llm.complete_json(MODEL_FAST, prompt, ChartSpec,
+                             context=llm.shared_context(MODEL_FAST, source_context),
+                             agent="chart_designer")
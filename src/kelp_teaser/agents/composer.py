@@ -1,32 +1,50 @@
 """Composer: Pro call per slide. Writes the ComposedSlide for one SlidePlan.
 
 Side calls: ChartDesigner for chart sections; ImageCurator for hero_image sections.
+The Composer response is streamed (`llm.stream_json`), so each section's side
+call starts as soon as that section has arrived instead of after the whole
+slide. The source material is sent as a shared context (`llm.shared_context`), so the
+three parallel Composer calls share one cached copy of it.
 """
 from __future__ import annotations
 
 import json
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 from kelp_teaser.agents import chart_designer, image_curator
 from kelp_teaser.config import MODEL_SMART
 from kelp_teaser.schemas.facts import IngestedDoc, WebSnippet
-from kelp_teaser.schemas.plan import ComponentKind, SlidePlan
+from kelp_teaser.schemas.plan import ComponentKind, SectionPlan, SlidePlan
 from kelp_teaser.schemas.slide import ComposedSection, ComposedSlide
 from kelp_teaser.tools import llm
 from kelp_teaser.tools.prompt_loader import load_prompt
+from kelp_teaser.tools.token_budget import Source
 
 log = logging.getLogger(__name__)
 
+# Budget room left for the per-slide prompt. Fixed rather than measured per
+# slide, so every slide fits the sources identically and shares one cached
+# context.
+_PROMPT_RESERVE_TOKENS = 4_000
+
 
 def build_source_context(docs: list[IngestedDoc],
-                          snippets: list[WebSnippet]) -> str:
-    parts: list[str] = []
-    for d in docs:
-        parts.append(f"### {d.source_id}\n{d.text.strip()}")
-    for s in snippets:
-        parts.append(f"### {s.source_id} (from {s.url})\n{s.summary.strip()}")
-    return "\n\n".join(parts)
+                          snippets: list[WebSnippet], *,
+                          reserve_tokens: int | None = None) -> str:
+    """Source material for the Composer. With `reserve_tokens` (the rest of
+    the prompt), it is fitted to the composer's input budget: each source is
+    capped, then web snippets are dropped before private documents."""
+    sources = [Source(d.source_id, f"### {d.source_id}\n{d.text.strip()}", priority=1)
+               for d in docs]
+    sources += [Source(s.source_id,
+                       f"### {s.source_id} (from {s.url})\n{s.summary.strip()}")
+                for s in snippets]
+    if reserve_tokens is not None:
+        sources = llm.budget_sources("composer", sources, reserve_tokens=reserve_tokens,
+                                     model=MODEL_SMART)
+    return "\n\n".join(s.text for s in sources)
 
 
 def compose_slide(
@@ -45,7 +63,6 @@ def compose_slide(
     failures (e.g. "chart_missing: ChartDesigner failed for slide 0:
     <reason>"). Empty list on a clean run.
     """
-    source_context = build_source_context(docs, web_snippets)
     section_plans_json = json.dumps(
         [s.model_dump(mode="json") for s in slide_plan.sections],
         indent=2,
@@ -55,14 +72,30 @@ def compose_slide(
         slide_title=slide_plan.title,
         codename=codename,
         section_plans_json=section_plans_json,
-        source_context=source_context,
     )
-    composed: ComposedSlide = llm.complete_json(MODEL_SMART, prompt, ComposedSlide)
-
-    composed, warnings = _attach_charts_and_images(
-        composed=composed, slide_plan=slide_plan,
-        source_context=source_context, sector=sector, out_dir=out_dir,
+    source_context = build_source_context(docs, web_snippets,
+                                          reserve_tokens=_PROMPT_RESERVE_TOKENS)
+    stream = llm.stream_json(
+        MODEL_SMART, prompt, ComposedSlide, item_field="sections",
+        context=llm.shared_context(MODEL_SMART, source_context), agent="composer",
     )
+    early: dict[int, tuple[ComposedSection, Future]] = {}
+    with ThreadPoolExecutor(max_workers=len(slide_plan.sections)) as pool:
+        for i, section in enumerate(stream):
+            if i >= len(slide_plan.sections):
+                continue
+            early[i] = (section, pool.submit(
+                _attach_side_work, slide_plan.sections[i], section,
+                slide_index=slide_index, source_context=source_context,
+                sector=sector, out_dir=out_dir,
+            ))
+        composed: ComposedSlide = stream.result
+
+        composed, warnings = _attach_charts_and_images(
+            composed=composed, slide_plan=slide_plan,
+            source_context=source_context, sector=sector, out_dir=out_dir,
+            early=early,
+        )
     return composed, warnings
 
 
@@ -73,43 +106,71 @@ def _attach_charts_and_images(
     source_context: str,
     sector: str,
     out_dir: Path,
+    early: dict[int, tuple[ComposedSection, Future]] | None = None,
 ) -> tuple[ComposedSlide, list[str]]:
     """Pair each ComposedSection with its SectionPlan and run the side agents.
 
+    `early` maps section index to (streamed section, side-work future)
+    already started while the response streamed; it is reused when the
+    final section matches what was streamed.
+
     Returns (updated_composed, warnings).
     """
     new_sections: list[ComposedSection] = []
     warnings: list[str] = []
     paired = list(zip(slide_plan.sections, composed.sections))
-    for plan_sec, composed_sec in paired:
-        if plan_sec.kind == ComponentKind.chart and composed_sec.chart is None:
-            try:
-                chart = chart_designer.design_chart(
-                    plan_sec, source_context=source_context,
-                )
-                composed_sec = composed_sec.model_copy(update={"chart": chart})
-            except Exception as e:  # noqa: BLE001
-                msg = (f"chart_missing: ChartDesigner failed for slide "
-                       f"{composed.index}: {e}")
-                log.error(msg)
-                warnings.append(msg)
-        elif plan_sec.kind == ComponentKind.hero_image and composed_sec.image is None:
-            try:
-                img = image_curator.curate_image(
-                    plan_sec, sector=sector,
-                    out_dir=out_dir / "images",
-                )
-                if img is not None:
-                    composed_sec = composed_sec.model_copy(update={"image": img})
-                else:
-                    msg = (f"image_missing: ImageCurator returned None for "
-                           f"slide {composed.index}")
-                    log.warning(msg)
-                    warnings.append(msg)
-            except Exception as e:  # noqa: BLE001
-                msg = (f"image_missing: ImageCurator failed for slide "
-                       f"{composed.index}: {e}")
-                log.error(msg)
-                warnings.append(msg)
+    for i, (plan_sec, composed_sec) in enumerate(paired):
+        started = (early or {}).get(i)
+        if started is not None and started[0] == composed_sec:
+            composed_sec, sec_warnings = started[1].result()
+        else:
+            composed_sec, sec_warnings = _attach_side_work(
+                plan_sec, composed_sec, slide_index=composed.index,
+                source_context=source_context, sector=sector, out_dir=out_dir,
+            )
+        warnings.extend(sec_warnings)
         new_sections.append(composed_sec)
     return composed.model_copy(update={"sections": new_sections}), warnings
+
+
+def _attach_side_work(
+    plan_sec: SectionPlan,
+    composed_sec: ComposedSection,
+    *,
+    slide_index: int,
+    source_context: str,
+    sector: str,
+    out_dir: Path,
+) -> tuple[ComposedSection, list[str]]:
+    """Run ChartDesigner / ImageCurator for one section if it needs them."""
+    warnings: list[str] = []
+    if plan_sec.kind == ComponentKind.chart and composed_sec.chart is None:
+        try:
+            chart = chart_designer.design_chart(
+                plan_sec, source_context=source_context,
+            )
+            composed_sec = composed_sec.model_copy(update={"chart": chart})
+        except Exception as e:  # noqa: BLE001
+            msg = (f"chart_missing: ChartDesigner failed for slide "
+                   f"{slide_index}: {e}")
+            log.error(msg)
+            warnings.append(msg)
+    elif plan_sec.kind == ComponentKind.hero_image and composed_sec.image is None:
+        try:
+            img = image_curator.curate_image(
+                plan_sec, sector=sector,
+                out_dir=out_dir / "images",
+            )
+            if img is not None:
+                composed_sec = composed_sec.model_copy(update={"image": img})
+            else:
+                msg = (f"image_missing: ImageCurator returned None for "
+                       f"slide {slide_index}")
+                log.warning(msg)
+                warnings.append(msg)
+        except Exception as e:  # noqa: BLE001
+            msg = (f"image_missing: ImageCurator failed for slide "
+                   f"{slide_index}: {e}")
+            log.error(msg)
+            warnings.append(msg)
+    return composed_sec, warnings
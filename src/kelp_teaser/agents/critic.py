@@ -85,7 +85,8 @@ def run(state: GraphState, *, trace_writer: TraceWriter | None = None) -> dict:
     )
 
     composed_json = json.dumps(
-        {i: s.model_dump(mode="json") for i, s in state.composed_slides.items()},
+        {i: s.model_dump(mode="json", exclude_none=True)
+         for i, s in state.composed_slides.items()},
         indent=2,
     )
     prompt = load_prompt("critic").render(
@@ -96,7 +97,8 @@ def run(state: GraphState, *, trace_writer: TraceWriter | None = None) -> dict:
         source_ids_json=json.dumps(sorted(valid_source_ids)),
     )
     try:
-        judgmental = llm.complete_json(MODEL_FAST, prompt, CriticReport).issues
+        judgmental = llm.complete_json(MODEL_FAST, prompt, CriticReport,
+                                       agent="critic").issues
     except Exception as e:  # noqa: BLE001
         log.error("Critic LLM judgment failed: %s", e)
         judgmental = [
@@ -31,7 +31,8 @@ def curate_image(section: SectionPlan, *, sector: str, out_dir: Path) -> HeroIma
         image_brief=section.image_brief, sector=sector,
     )
     try:
-        plan = llm.complete_json(MODEL_FAST, prompt, ImageQueries)
+        plan = llm.complete_json(MODEL_FAST, prompt, ImageQueries,
+                                 agent="image_curator")
     except Exception as e:  # noqa: BLE001
         log.error("ImageCurator query gen failed: %s", e)
         return None
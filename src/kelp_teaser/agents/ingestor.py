@@ -1,71 +1,209 @@
 """Ingestor: walks the input path, parses every supported file into an IngestedDoc.
 
-No LLM call. Pure I/O + parsing.
+No LLM call. Pure I/O + parsing. The input folder is walked recursively
+(filtered by INGEST_INCLUDE / INGEST_EXCLUDE). Each file's type is sniffed
+from its bytes and parsed by the strategies registered for it in
+tools/parsers.py, local extractors first (a PDF only goes to LlamaParse
+when its text layer looks poor). Excel workbooks, which are CPU-bound to
+flatten, go to a process pool. PDFs, which may wait on LlamaParse, are
+parsed a bounded number at a time on threads. Docs come out sorted by
+source_id however the work interleaves, and the trace records each file's
+type, the strategy that parsed it and its parse time.
+
+Files are identified by content. A file identical to another in the pack
+becomes one doc, under the first path in sort order. Parses of binary
+formats are cached on disk by content hash and parser strategies
+(tools/doc_cache.py), so unchanged files are not parsed again on the next
+run.
 """
 from __future__ import annotations
 
 import logging
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from fnmatch import fnmatch
 from pathlib import Path
 
+from kelp_teaser.config import (
+    INGEST_EXCEL_WORKERS,
+    INGEST_EXCLUDE,
+    INGEST_INCLUDE,
+    INGEST_PDF_CONCURRENCY,
+    PARSED_CACHE_DIR,
+    PARSED_CACHE_ENABLED,
+    PARSED_CACHE_MAX_BYTES,
+    PARSED_CACHE_TTL_S,
+)
 from kelp_teaser.graph.state import GraphState
 from kelp_teaser.graph.trace import TraceWriter
 from kelp_teaser.schemas.facts import IngestedDoc
-from kelp_teaser.tools.excel_parser import flatten_workbook
-from kelp_teaser.tools.pdf_parser import parse_pdf
+from kelp_teaser.tools.doc_cache import ParsedDoc, ParsedDocCache, file_digest, parse_key
+from kelp_teaser.tools.parsers import FileType, ParseOutcome, file_type, parse_file, sniff_mime
 
 log = logging.getLogger(__name__)
 
-_TEXT_SUFFIXES = {".md", ".txt"}
-_EXCEL_SUFFIXES = {".xlsx", ".xls"}
-_PDF_SUFFIXES = {".pdf"}
-
 
 def run(state: GraphState, *, trace_writer: TraceWriter | None = None) -> dict:
-    docs: list[IngestedDoc] = []
+    started = time.monotonic()
     path = state.input_path
+    base = path.parent if path.is_file() else path
+    types = {f: ft for f in walk_inputs(path) if (ft := _supported(f)) is not None}
+    files = list(types)
+    rel = {f: f.relative_to(base).as_posix() for f in files}
 
-    if path.is_file():
-        candidates = [path]
-    elif path.is_dir():
-        candidates = sorted(p for p in path.iterdir()
-                            if p.is_file() and not p.name.startswith("."))
-    else:
-        log.warning("Ingestor: input_path %s is neither file nor directory", path)
-        candidates = []
+    digests = {f: file_digest(f) for f in files}
+    first_by_digest: dict[str, Path] = {}
+    duplicates: dict[str, str] = {}
+    for f in files:
+        first = first_by_digest.setdefault(digests[f], f)
+        if first is not f:
+            duplicates[rel[f]] = rel[first]
+    unique = [f for f in files if rel[f] not in duplicates]
 
-    for f in candidates:
-        text = _read_one(f)
-        if not text:
+    cache = _get_doc_cache()
+    keys = {f: parse_key(digests[f], types[f].parser_id)
+            for f in unique if cache is not None and types[f].cached}
+    cached: dict[Path, ParsedDoc] = {}
+    for f, key in keys.items():
+        hit = cache.get(key)
+        if hit is not None:
+            cached[f] = hit
+    parsed = _parse_all({f: types[f] for f in unique if f not in cached})
+
+    docs: list[IngestedDoc] = []
+    timings: list[dict] = []
+    for f in unique:
+        outcome = parsed.get(f, ParseOutcome())
+        if f in cached:
+            doc = cached[f]
+        else:
+            doc = ParsedDoc(text=outcome.text, strategy=outcome.strategy)
+            if f in keys and outcome.accepted:
+                cache.put(keys[f], doc)
+        timings.append({"file": rel[f], "parser": types[f].kind, "mime": types[f].mime,
+                        "strategy": doc.strategy, "seconds": round(outcome.seconds, 3),
+                        "chars": len(doc.text), "cached": f in cached,
+                        **({"attempts": outcome.attempts} if len(outcome.attempts) > 1
+                           else {}),
+                        **({"error": outcome.error} if outcome.error else {})})
+        if not doc.text:
             continue
-        docs.append(IngestedDoc(
-            source_id=f"doc:{f.name}",
-            filename=f.name,
-            text=text,
-        ))
+        docs.append(IngestedDoc(source_id=f"doc:{rel[f]}", filename=rel[f],
+                                text=doc.text, page_anchors=doc.page_anchors))
+    docs.sort(key=lambda d: d.source_id)
 
     if trace_writer is not None:
         trace_writer.write_step("ingestor", {
             "docs_count": len(docs),
             "filenames": [d.filename for d in docs],
+            "files_seen": len(files),
+            "elapsed_s": round(time.monotonic() - started, 3),
+            "files": sorted(timings, key=lambda t: t["file"]),
+            "cache_hits": len(cached),
+            "duplicates": duplicates,
         })
 
     return {"docs": docs}
 
 
-def _read_one(path: Path) -> str:
-    suffix = path.suffix.lower()
-    if suffix in _TEXT_SUFFIXES:
-        try:
-            return path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            return path.read_text(encoding="latin-1", errors="replace")
-    if suffix in _EXCEL_SUFFIXES:
-        try:
-            return flatten_workbook(str(path))
-        except Exception as e:  # noqa: BLE001
-            log.error("Excel parse failed for %s: %s", path, e)
-            return ""
-    if suffix in _PDF_SUFFIXES:
-        return parse_pdf(path)
-    log.info("Ingestor: skipping unsupported file %s", path.name)
-    return ""
+def walk_inputs(path: Path, include: tuple[str, ...] | None = None,
+                exclude: tuple[str, ...] | None = None) -> list[Path]:
+    """Files under `path` (or `path` itself) to ingest, sorted.
+
+    Globs (default INGEST_INCLUDE / INGEST_EXCLUDE) match the path relative
+    to `path` in POSIX form, and `*` also matches "/": "*.pdf" selects PDFs
+    at any depth, "archive/*" everything under archive/. Hidden files and
+    folders are skipped.
+    """
+    include = INGEST_INCLUDE if include is None else include
+    exclude = INGEST_EXCLUDE if exclude is None else exclude
+    if path.is_file():
+        return [path]
+    if not path.is_dir():
+        log.warning("Ingestor: input_path %s is neither file nor directory", path)
+        return []
+    out: list[Path] = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for name in filenames:
+            if name.startswith("."):
+                continue
+            f = Path(dirpath) / name
+            rel = f.relative_to(path).as_posix()
+            if not any(fnmatch(rel, g) for g in include):
+                continue
+            if any(fnmatch(rel, g) for g in exclude):
+                continue
+            out.append(f)
+    return sorted(out)
+
+
+def _get_doc_cache() -> ParsedDocCache | None:
+    if not PARSED_CACHE_ENABLED:
+        return None
+    return ParsedDocCache(PARSED_CACHE_DIR, max_bytes=PARSED_CACHE_MAX_BYTES,
+                          ttl_s=PARSED_CACHE_TTL_S)
+
+
+def _supported(path: Path) -> FileType | None:
+    ft = file_type(path)
+    if ft is None:
+        log.info("Ingestor: skipping unsupported file %s (%s)", path.name,
+                 sniff_mime(path) or "unknown type")
+    return ft
+
+
+def _parse_all(types: dict[Path, FileType]) -> dict[Path, ParseOutcome]:
+    """Parse every file, workbooks and PDFs concurrently."""
+    by_pool: dict[str, list[Path]] = {"inline": [], "process": [], "thread": []}
+    for f, ft in types.items():
+        by_pool[ft.pool].append(f)
+
+    futures: dict[Path, Future[ParseOutcome]] = {}
+    out: dict[Path, ParseOutcome] = {}
+    with ExitStack() as stack:
+        excel_pool = _excel_pool(len(by_pool["process"]))
+        if excel_pool is not None:
+            stack.enter_context(excel_pool)
+            for f in by_pool["process"]:
+                futures[f] = excel_pool.submit(parse_file, str(f))
+        else:
+            by_pool["inline"] += by_pool["process"]
+        if by_pool["thread"]:
+            pdf_pool = stack.enter_context(ThreadPoolExecutor(
+                max_workers=max(1, min(INGEST_PDF_CONCURRENCY, len(by_pool["thread"]))),
+                thread_name_prefix="ingest-pdf"))
+            for f in by_pool["thread"]:
+                futures[f] = pdf_pool.submit(parse_file, str(f))
+        for f in by_pool["inline"]:
+            out[f] = parse_file(str(f))
+        for f, fut in futures.items():
+            try:
+                out[f] = fut.result()
+            except BrokenProcessPool:
+                out[f] = parse_file(str(f))
+    for f, outcome in out.items():
+        if outcome.error:
+            log.error("%s parse failed for %s: %s", types[f].kind, f, outcome.error)
+        elif not outcome.accepted and outcome.text:
+            log.warning("Ingestor: keeping %s output for %s; every strategy looked poor (%s)",
+                        outcome.strategy, f, "; ".join(
+                            f"{a['strategy']}: {a.get('rejected') or a.get('error')}"
+                            for a in outcome.attempts))
+    return out
+
+
+def _excel_pool(n_files: int) -> Executor | None:
+    """A process pool for `n_files` workbooks, or None to parse in-process
+    (one workbook, one worker, or no process support here)."""
+    workers = min(INGEST_EXCEL_WORKERS, n_files)
+    if workers <= 1:
+        return None
+    try:
+        return ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError) as e:
+        log.warning("Ingestor: no process pool (%s); flattening Excel in-process", e)
+        return None
@@ -15,12 +15,18 @@ log = logging.getLogger(__name__)
 
 def run(state: GraphState, *, trace_writer: TraceWriter | None = None) -> dict:
     sector_name = state.sector.value if state.sector is not None else "Other"
-    prompt = load_prompt("planner").render(
+    template = load_prompt("planner")
+    brief = llm.budget_text(
+        "planner", state.planner_brief, model=MODEL_SMART, label="planner_brief",
+        reserve_tokens=template.static_tokens + llm.estimate_tokens(
+            f"{sector_name} ({state.sub_sector})", MODEL_SMART))
+    prompt = template.render(
         sector=sector_name,
         sub_sector=state.sub_sector,
-        brief=state.planner_brief,
+        brief=brief,
     )
-    plan: DeckPlan = llm.complete_json(MODEL_SMART, prompt, DeckPlan)
+    plan: DeckPlan = llm.complete_json(MODEL_SMART, prompt, DeckPlan,
+                                       agent="planner")
 
     if trace_writer is not None:
         trace_writer.write_step("planner", plan.model_dump())
@@ -1,13 +1,29 @@
-"""Researcher: targeted Tavily queries + Flash summarization + planner_brief."""
+"""Researcher: targeted Tavily queries + Flash summarization + planner_brief.
+
+Hit summaries are independent Flash calls, so they run concurrently on one
+event loop via `llm.acomplete_text`, or as one discounted batch job when
+LLM_BATCH_MODE is on. Near-identical pages (the same article excerpted
+differently by different queries) are summarized once per run, and a page
+near-identical to one summarized on an earlier run reuses that summary
+(tools/near_dup_cache.py).
+"""
 from __future__ import annotations
 
+import asyncio
 import logging
 
-from kelp_teaser.config import MODEL_FAST, WEB_SEARCH_MAX_RESULTS
+from kelp_teaser.config import (
+    LLM_BATCH_MODE,
+    LLM_NEAR_DUP_ENABLED,
+    LLM_NEAR_DUP_THRESHOLD,
+    MODEL_FAST,
+    WEB_SEARCH_MAX_RESULTS,
+)
 from kelp_teaser.graph.state import GraphState
 from kelp_teaser.graph.trace import TraceWriter
 from kelp_teaser.schemas.facts import IngestedDoc, WebSnippet
 from kelp_teaser.tools import llm, web_search
+from kelp_teaser.tools.near_dup_cache import NearDupKey, group_near_duplicates
 
 log = logging.getLogger(__name__)
 
@@ -42,19 +58,29 @@ def build_planner_brief(docs: list[IngestedDoc], snippets: list[WebSnippet]) ->
 
 
 def run(state: GraphState, *, trace_writer: TraceWriter | None = None) -> dict:
-    snippets: list[WebSnippet] = []
+    pending: list[tuple[str, web_search.TavilyHit]] = []
     for query in default_queries(state.company_name):
         hits = web_search.search(query, max_results=WEB_SEARCH_MAX_RESULTS)
         for hit in hits:
             if not hit.url or not hit.content:
                 continue
-            summary = _summarize_hit(state.company_name, hit)
-            snippets.append(WebSnippet(
-                source_id=f"web:tavily:{hit.url}",
-                url=hit.url,
-                summary=summary,
-                query=query,
-            ))
+            pending.append((query, hit))
+
+    hits = [hit for _, hit in pending]
+    batchable = llm.route("researcher", MODEL_FAST)[0].supports_batch
+    if LLM_BATCH_MODE and hits and batchable:
+        summaries = _summarize_all_batched(state.company_name, hits)
+    else:
+        summaries = asyncio.run(_summarize_all(state.company_name, hits))
+    snippets = [
+        WebSnippet(
+            source_id=f"web:tavily:{hit.url}",
+            url=hit.url,
+            summary=summary,
+            query=query,
+        )
+        for (query, hit), summary in zip(pending, summaries)
+    ]
 
     brief = build_planner_brief(state.docs, snippets)
 
@@ -76,13 +102,77 @@ def run(state: GraphState, *, trace_writer: TraceWriter | None = None) -> dict:
     return {"web_snippets": snippets, "planner_brief": brief}
 
 
-def _summarize_hit(company: str, hit) -> str:
-    prompt = _SUMMARIZE_PROMPT.format(
+def _summary_prompt(company: str, hit) -> str:
+    reserve = llm.estimate_tokens(
+        _SUMMARIZE_PROMPT.format(company=company, title=hit.title, url=hit.url,
+                                 content=""), MODEL_FAST)
+    return _SUMMARIZE_PROMPT.format(
         company=company, title=hit.title, url=hit.url,
-        content=hit.content[:8000],
+        content=llm.budget_text("researcher", hit.content, reserve_tokens=reserve,
+                                model=MODEL_FAST, label=hit.url),
     )
+
+
+def _near_dup_key(company: str, hit) -> NearDupKey:
+    return NearDupKey(scope=f"researcher\n{MODEL_FAST}\n{company}\n{_SUMMARIZE_PROMPT}",
+                      text=hit.content)
+
+
+def _near_dup_leaders(hits: list) -> list[int]:
+    """Per hit, the index of the hit whose summary it shares."""
+    if not LLM_NEAR_DUP_ENABLED:
+        return list(range(len(hits)))
+    return group_near_duplicates([h.content for h in hits], LLM_NEAR_DUP_THRESHOLD)
+
+
+def _share_summaries(company: str, hits: list, leaders: list[int],
+                     summaries: dict[int, str]) -> list[str]:
+    for i, leader in enumerate(leaders):
+        if i != leader:
+            llm.note_near_dup_reuse(MODEL_FAST, _summary_prompt(company, hits[i]),
+                                    summaries[leader], agent="researcher")
+    return [summaries[leader] for leader in leaders]
+
+
+async def _summarize_all(company: str, hits: list) -> list[str]:
+    leaders = _near_dup_leaders(hits)
+    unique = sorted(set(leaders))
+    results = await asyncio.gather(*(_summarize_hit(company, hits[i]) for i in unique))
+    return _share_summaries(company, hits, leaders, dict(zip(unique, results)))
+
+
+def _summarize_all_batched(company: str, hits: list) -> list[str]:
+    leaders = _near_dup_leaders(hits)
+    summaries: dict[int, str] = {}
+    pending: list[int] = []
+    for i in sorted(set(leaders)):
+        reused = llm.near_dup_lookup(MODEL_FAST, _summary_prompt(company, hits[i]),
+                                     _near_dup_key(company, hits[i]), agent="researcher")
+        if reused is not None:
+            summaries[i] = reused
+        else:
+            pending.append(i)
+    with llm.batch_executor() as batch:
+        futures = [batch.submit_text(
+            MODEL_FAST, _summary_prompt(company, hits[i]), temperature=0.2,
+            thinking_budget=llm.thinking_budget("researcher", MODEL_FAST))
+            for i in pending]
+    for i, fut in zip(pending, futures):
+        try:
+            summaries[i] = fut.result()
+            llm.near_dup_store(_near_dup_key(company, hits[i]), summaries[i])
+        except Exception as e:  # noqa: BLE001
+            log.error("Researcher batch summarize failed for %s: %s", hits[i].url, e)
+            summaries[i] = hits[i].content[:500]
+    return _share_summaries(company, hits, leaders, summaries)
+
+
+async def _summarize_hit(company: str, hit) -> str:
+    prompt = _summary_prompt(company, hit)
     try:
-        return llm.complete_text(MODEL_FAST, prompt, temperature=0.2)
+        return await llm.acomplete_text(MODEL_FAST, prompt, temperature=0.2,
+                                        agent="researcher",
+                                        near_dup=_near_dup_key(company, hit))
     except Exception as e:  # noqa: BLE001
         log.error("Researcher summarize failed for %s: %s", hit.url, e)
         return hit.content[:500]
@@ -22,9 +22,14 @@ class SectorClassification(BaseModel):
 
 
 def run(state: GraphState, *, trace_writer: TraceWriter | None = None) -> dict:
-    prompt = load_prompt("sector_classifier").render(brief=state.planner_brief)
+    template = load_prompt("sector_classifier")
+    brief = llm.budget_text(
+        "sector_classifier", state.planner_brief, model=MODEL_FAST, label="planner_brief",
+        reserve_tokens=template.static_tokens)
+    prompt = template.render(brief=brief)
     try:
-        result = llm.complete_json(MODEL_FAST, prompt, SectorClassification)
+        result = llm.complete_json(MODEL_FAST, prompt, SectorClassification,
+                                   agent="sector_classifier")
     except Exception as e:  # noqa: BLE001
         log.error("SectorClassifier failed, defaulting to Other: %s", e)
         result = SectorClassification(sector=Sector.Other, confidence=0.0)
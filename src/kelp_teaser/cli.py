@@ -7,16 +7,23 @@ from __future__ import annotations
 import argparse
 import logging
 import sys
+import time
 import uuid
 from dataclasses import dataclass
 from pathlib import Path
 
-from kelp_teaser.config import DATA_OUTPUTS_DIR
+from kelp_teaser.config import (
+    DATA_OUTPUTS_DIR,
+    LLM_CACHE_DIR,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_TTL_S,
+)
 from kelp_teaser.graph.build_graph import build_graph
 from kelp_teaser.graph.state import GraphState
 from kelp_teaser.graph.trace import TraceWriter
 from kelp_teaser.render.citations_doc import render_citations_doc
 from kelp_teaser.render.deck import render_deck
+from kelp_teaser.tools.prompt_loader import check_prompts
 
 log = logging.getLogger(__name__)
 
@@ -35,6 +42,7 @@ def run_pipeline(
     output_root: Path = DATA_OUTPUTS_DIR,
     run_id: str | None = None,
 ) -> RunResult:
+    check_prompts()
     rid = run_id or f"{company_name}_{uuid.uuid4().hex[:8]}"
     run_dir = output_root / rid
     run_dir.mkdir(parents=True, exist_ok=True)
@@ -55,9 +63,11 @@ def run_pipeline(
         final_dict = graph.invoke(state)
     finally:
         llm_module.CURRENT_TRACKER = None
+        llm_module.release_shared_contexts()
     final = GraphState.model_validate(final_dict)
 
-    print(f"Run cost: ${tracker.total_cost_usd:.4f} across {tracker.total_calls} calls")
+    print(f"Run cost: ${tracker.total_cost_usd:.4f} across {tracker.total_calls} calls "
+          f"({tracker.cache_hits} served from cache)")
 
     if not final.composed_slides or not final.plan:
         raise RuntimeError("Pipeline produced no composed slides")
@@ -74,6 +84,7 @@ def run_pipeline(
         render_citations_doc(final.citation_table, citations_path)
 
     trace.add_cost(tracker.total_cost_usd)
+    trace.add_llm_stats(tracker.summary())
     trace_path = trace.finalize()
 
     print(f"Wrote {pptx_path}")
@@ -93,6 +104,10 @@ def main(argv: list[str] | None = None) -> int:
                      help="Path to a company folder under data/inputs/")
     run.add_argument("--company", required=False,
                      help="Override company name (defaults to input folder name)")
+    cache = sub.add_parser("cache", help="Inspect or prune the LLM response cache")
+    cache.add_argument("action", choices=["stats", "prune"])
+    cache.add_argument("--all", action="store_true",
+                       help="With prune: remove every entry, not just expired ones")
     args = parser.parse_args(argv)
 
     logging.basicConfig(
@@ -108,8 +123,29 @@ def main(argv: list[str] | None = None) -> int:
         company = args.company or input_path.name
         result = run_pipeline(company_name=company, input_path=input_path)
         return 0
+    if args.cmd == "cache":
+        return _cache_command(args.action, clear=args.all)
     return 1
 
 
+def _cache_command(action: str, *, clear: bool = False) -> int:
+    from kelp_teaser.tools.llm_cache import ResponseCache
+
+    cache = ResponseCache(LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES,
+                          ttl_s=LLM_CACHE_TTL_S)
+    if action == "prune":
+        removed = cache.prune(clear=clear)
+        print(f"Removed {removed} cache entries from {LLM_CACHE_DIR}")
+    stats = cache.stats()
+    print(f"LLM cache: {LLM_CACHE_DIR}")
+    print(f"  entries: {stats.entries}")
+    print(f"  size:    {stats.total_bytes / (1024 * 1024):.2f} MB "
+          f"(limit {LLM_CACHE_MAX_BYTES / (1024 * 1024):.0f} MB)")
+    if stats.oldest_s is not None:
+        print(f"  oldest:  {time.strftime('%Y-%m-%d %H:%M', time.localtime(stats.oldest_s))}")
+        print(f"  newest:  {time.strftime('%Y-%m-%d %H:%M', time.localtime(stats.newest_s))}")
+    return 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -28,10 +28,225 @@ MODEL_SMART = os.getenv("KELP_MODEL_SMART", "gemini-2.5-pro")
 COST_SOFT_WARNING = 2.00
 COST_HARD_ABORT = 5.00
 
+# Model router (tools/model_router.py) for agents that default to MODEL_SMART.
+# A call starts on MODEL_FAST when its estimated prompt is at most the agent's
+# small-prompt threshold (or always, for agents in KELP_ROUTER_CASCADE), and
+# escalates to MODEL_SMART only if the Flash output fails schema validation.
+# Past COST_SOFT_WARNING, or when a Pro call would breach COST_HARD_ABORT,
+# routed agents run on MODEL_FAST without escalation. Off by default, since it
+# moves Planner and Composer calls to a different model; KELP_MODEL_ROUTER=1
+# turns it on.
+MODEL_ROUTER_ENABLED = os.getenv("KELP_MODEL_ROUTER", "0") == "1"
+MODEL_ROUTER_SMALL_PROMPT_TOKENS = {
+    "planner": 6000,
+    "composer": 6000,
+}
+MODEL_ROUTER_CASCADE_AGENTS = frozenset(
+    a.strip() for a in os.getenv("KELP_ROUTER_CASCADE", "").split(",") if a.strip())
+MODEL_ROUTER_FAST_ATTEMPTS = 1
+# Output tokens assumed when projecting a Pro call against the hard budget.
+MODEL_ROUTER_EXPECTED_OUTPUT_TOKENS = 2000
+
+# Per-agent token budgets (tools/token_budget.py). "input" caps the agent's
+# estimated prompt; the variable part (brief, sources, page text) is cut to
+# fit with "strategy": head / tail / head_tail keep that end of one text,
+# drop_low_priority caps each source at "per_source" tokens and then drops
+# the lowest-priority sources (web snippets before private documents).
+# "output" is what the agent is expected to produce; trace.json compares both
+# against the token counts the provider reports.
+# Estimates use a chars/token ratio per model, calibrated from those counts.
+AGENT_TOKEN_BUDGETS: dict[str, dict[str, object]] = {
+    "sector_classifier": {"input": 16_000, "output": 200, "strategy": "head"},
+    "planner": {"input": 60_000, "output": 3_000, "strategy": "head_tail"},
+    "composer": {"input": 60_000, "output": 3_000, "strategy": "drop_low_priority",
+                 "per_source": 20_000},
+    "chart_designer": {"input": 62_000, "output": 800},
+    "critic": {"input": 12_000, "output": 1_500},
+    "researcher": {"input": 2_200, "output": 600, "strategy": "head"},
+}
+# max_output_tokens sent with each complete_json / stream_json request, per
+# response schema. A runaway guard, not a target: on gemini-2.5 models thinking
+# tokens count against it too, so these leave generous headroom.
+LLM_MAX_OUTPUT_TOKENS: dict[str, int] = {
+    "SectorClassification": 2_048,
+    "DeckPlan": 16_384,
+    "ComposerSlide": 16_384,
+    "ChartSpec": 8_192,
+    "CriticReport": 8_192,
+    "ImageQueries": 2_048,
+}
+
+# Hedged requests (tools/hedge.py). For the listed agents, a call still
+# running after the LLM_HEDGE_PERCENTILE latency of recent calls to its model
+# gets a backup request (on MODEL_FAST with KELP_LLM_HEDGE_MODEL=fast, the
+# default, or on the same model with "same"); the first valid result wins.
+# Off until at least LLM_HEDGE_MIN_SAMPLES latencies are known for the model.
+LLM_HEDGE_AGENTS = frozenset(
+    a.strip() for a in os.getenv("KELP_LLM_HEDGE_AGENTS", "").split(",") if a.strip())
+LLM_HEDGE_MODEL = os.getenv("KELP_LLM_HEDGE_MODEL", "fast")
+LLM_HEDGE_PERCENTILE = float(os.getenv("KELP_LLM_HEDGE_PERCENTILE", "0.9"))
+LLM_HEDGE_MIN_SAMPLES = 5
+LLM_HEDGE_WINDOW = 50
+
 # Retry policy. Retries feed the specific validation errors back to the model
 # (see tools/llm.complete_json), so a third attempt meaningfully improves
 # recovery from transient schema violations.
+# LLM_MAX_ATTEMPTS is the whole budget of one logical request: transport
+# retries and validation re-asks draw on the same count (tools/retry.py).
 LLM_MAX_ATTEMPTS = 3
+# Per-request caps: no further attempts once a request has cost this much or
+# run this long (the run-wide caps are COST_SOFT_WARNING / COST_HARD_ABORT).
+LLM_REQUEST_MAX_COST_USD = float(os.getenv("KELP_LLM_REQUEST_MAX_COST_USD", "1.0"))
+LLM_REQUEST_MAX_ELAPSED_S = float(os.getenv("KELP_LLM_REQUEST_MAX_ELAPSED_S", "600"))
+
+# Send complete_json schemas via Gemini's native response_schema instead of
+# appending the JSON Schema text to every prompt (and every retry).
+LLM_STRUCTURED_OUTPUT = os.getenv("KELP_LLM_STRUCTURED_OUTPUT", "1") != "0"
+
+# Coalesce byte-identical LLM requests that are in flight at the same time
+# (tools/single_flight.py): one network call and one cost record, shared.
+LLM_SINGLE_FLIGHT = os.getenv("KELP_LLM_SINGLE_FLIGHT", "1") != "0"
+
+# Fix malformed complete_json output locally (trailing commas, truncated
+# brackets, a chart section missing chart_spec, ...) before paying for a
+# re-ask (tools/json_repair.py). Repairs are listed in trace.json.
+LLM_JSON_REPAIR = os.getenv("KELP_LLM_JSON_REPAIR", "1") != "0"
+
+# When a well-formed response fails validation in a few sub-objects (say one
+# Bullet's source_id), the first retry asks only for replacements of those
+# objects and merges them back, instead of regenerating the whole response.
+# Falls back to a full re-ask above LLM_FIELD_REASK_MAX_PATHS objects.
+LLM_FIELD_REASK = os.getenv("KELP_LLM_FIELD_REASK", "1") != "0"
+LLM_FIELD_REASK_MAX_PATHS = 8
+
+# Full re-asks after a validation failure continue the conversation: the
+# first request is resent unchanged (a context cache or prefix-cache hit)
+# and the follow-up carries only the previous response and its errors,
+# instead of a rebuilt prompt + schema + errors. Off: the old rebuilt prompt.
+LLM_CHAT_RETRY = os.getenv("KELP_LLM_CHAT_RETRY", "1") != "0"
+
+# Compact wire format (tools/compact_wire.py). For the listed agents,
+# structured responses use short JSON keys ("s" for source_id, "dh" for
+# data_hooks, ...) mapped back to the canonical models after validation;
+# trace.json reports the estimated output tokens saved per agent.
+# Off by default: KELP_LLM_COMPACT_WIRE=composer,planner,critic.
+LLM_COMPACT_WIRE_AGENTS = frozenset(
+    a.strip() for a in os.getenv("KELP_LLM_COMPACT_WIRE", "").split(",") if a.strip())
+
+# On-disk LLM response cache (tools/llm_cache.py). Re-runs on an unchanged
+# data pack replay identical requests from disk instead of paying again.
+# Set KELP_LLM_CACHE=0 to disable; `kelp-teaser cache stats|prune` manages it.
+LLM_CACHE_ENABLED = os.getenv("KELP_LLM_CACHE", "1") != "0"
+LLM_CACHE_DIR = Path(os.getenv("KELP_LLM_CACHE_DIR", str(REPO_ROOT / ".cache" / "llm")))
+LLM_CACHE_MAX_BYTES = int(os.getenv("KELP_LLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+LLM_CACHE_TTL_S = float(os.getenv("KELP_LLM_CACHE_TTL_DAYS", "14")) * 86400
+
+# Near-duplicate cache for Researcher summaries (tools/near_dup_cache.py).
+# A page whose text is at least LLM_NEAR_DUP_THRESHOLD similar (MinHash
+# estimate of word-shingle Jaccard) to one already summarized for the same
+# company reuses that summary instead of a new Flash call. Kept under
+# LLM_CACHE_DIR with the same TTL; KELP_LLM_NEAR_DUP=0 disables it.
+LLM_NEAR_DUP_ENABLED = os.getenv("KELP_LLM_NEAR_DUP", "1") != "0"
+LLM_NEAR_DUP_THRESHOLD = float(os.getenv("KELP_LLM_NEAR_DUP_THRESHOLD", "0.8"))
+LLM_NEAR_DUP_MAX_ENTRIES = 2000
+
+# Context caching for prompt prefixes shared across calls (Composer and
+# ChartDesigner source material; see tools/context_cache.py). Backend is
+# "gemini" (explicit caching API), "local" (in-process stand-in) or "off".
+# Prefixes under the model's minimum cacheable size are simply inlined. A
+# cache is re-created REFRESH_S before its TTL ends; a failed create is
+# retried after RETRY_S.
+LLM_CONTEXT_CACHE_BACKEND = os.getenv("KELP_CONTEXT_CACHE", "gemini")
+LLM_CONTEXT_CACHE_MIN_TOKENS: dict[str, int] = {
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+LLM_CONTEXT_CACHE_TTL_S = 600
+LLM_CONTEXT_CACHE_REFRESH_S = 60
+LLM_CONTEXT_CACHE_RETRY_S = 60
+
+# LLM providers (tools/llm_providers.py). "gemini" is the default; "openai" is
+# any OpenAI-compatible /chat/completions server (vLLM, llama.cpp, Ollama),
+# e.g. a local CPU box for throughput tests and air-gapped runs.
+# Per-agent routing: KELP_LLM_AGENT_PROVIDERS="researcher=openai,critic=openai".
+# The openai backend serves MODEL_FAST / MODEL_SMART calls with
+# KELP_OPENAI_MODEL_FAST / KELP_OPENAI_MODEL_SMART (default: KELP_OPENAI_MODEL).
+def _parse_agent_map(raw: str) -> dict[str, str]:
+    pairs = (item.split("=", 1) for item in raw.split(",") if "=" in item)
+    return {agent.strip(): value.strip() for agent, value in pairs}
+
+
+LLM_DEFAULT_PROVIDER = os.getenv("KELP_LLM_PROVIDER", "gemini")
+LLM_AGENT_PROVIDERS = _parse_agent_map(os.getenv("KELP_LLM_AGENT_PROVIDERS", ""))
+OPENAI_COMPAT_BASE_URL = os.getenv("KELP_OPENAI_BASE_URL", "http://localhost:8000/v1")
+OPENAI_COMPAT_API_KEY = os.getenv("KELP_OPENAI_API_KEY")
+OPENAI_COMPAT_MODEL = os.getenv("KELP_OPENAI_MODEL", "local-model")
+OPENAI_COMPAT_MODELS = {
+    model: value for model, value in (
+        (MODEL_FAST, os.getenv("KELP_OPENAI_MODEL_FAST")),
+        (MODEL_SMART, os.getenv("KELP_OPENAI_MODEL_SMART")),
+    ) if value
+}
+OPENAI_COMPAT_TIMEOUT_S = float(os.getenv("KELP_OPENAI_TIMEOUT_S", "300"))
+
+# Thinking budgets (tokens) per agent on gemini-2.5 models, sent as
+# ThinkingConfig.thinking_budget: 0 turns thinking off (gemini-2.5-pro cannot,
+# and gets its 128-token minimum), -1 lets the model decide. Unlisted agents
+# (the Planner) keep the model default. Thinking tokens bill at the output
+# rate and are reported per agent in trace.json.
+# Override with KELP_LLM_THINKING_BUDGETS="planner=8192,critic=0".
+LLM_THINKING_BUDGETS: dict[str, int] = {
+    "sector_classifier": 0,
+    "anonymizer": 0,
+    "image_curator": 0,
+    "researcher": 0,
+    "chart_designer": 512,
+    "critic": 1024,
+    "composer": 4096,
+    **{agent: int(value) for agent, value in
+       _parse_agent_map(os.getenv("KELP_LLM_THINKING_BUDGETS", "")).items()},
+}
+
+# Batch-job mode (tools/llm_batch.py) for overnight, non-interactive runs:
+# discounted pricing, latency of minutes to hours. KELP_LLM_BATCH=1 routes the
+# Researcher's hit summaries through one batch job. Backend is "gemini" or
+# "local" (file-based stand-in under LLM_BATCH_DIR).
+LLM_BATCH_MODE = os.getenv("KELP_LLM_BATCH", "0") == "1"
+LLM_BATCH_BACKEND = os.getenv("KELP_LLM_BATCH_BACKEND", "gemini")
+LLM_BATCH_DIR = Path(os.getenv("KELP_LLM_BATCH_DIR", str(REPO_ROOT / ".cache" / "batch")))
+LLM_BATCH_POLL_S = float(os.getenv("KELP_LLM_BATCH_POLL_S", "30"))
+
+# Max in-flight async LLM calls per model on one event loop
+# (tools/llm.acomplete_text / acomplete_json).
+LLM_ASYNC_CONCURRENCY: dict[str, int] = {MODEL_FAST: 8, MODEL_SMART: 3}
+LLM_ASYNC_CONCURRENCY_DEFAULT = 4
+
+# Per-model Gemini rate budgets as (requests/min, prompt tokens/min), enforced
+# process-wide by tools/rate_limit.RateLimiter. Pick the table matching your
+# API tier with KELP_GEMINI_TIER (an unknown tier is an error, not a silent
+# tier1); override either model with
+# KELP_RPM_FAST / KELP_TPM_FAST / KELP_RPM_SMART / KELP_TPM_SMART. A
+# KELP_MODEL_SMART missing from the table gets the tier's Pro budget.
+_RATE_LIMITS_BY_TIER: dict[str, dict[str, tuple[int, int]]] = {
+    "free": {"gemini-2.5-flash": (10, 250_000), "gemini-2.5-pro": (5, 250_000)},
+    "tier1": {"gemini-2.5-flash": (1_000, 1_000_000), "gemini-2.5-pro": (150, 2_000_000)},
+}
+GEMINI_TIER = os.getenv("KELP_GEMINI_TIER", "tier1")
+if GEMINI_TIER not in _RATE_LIMITS_BY_TIER:
+    raise ValueError(f"KELP_GEMINI_TIER={GEMINI_TIER!r} is not one of "
+                     f"{', '.join(sorted(_RATE_LIMITS_BY_TIER))}")
+_tier_limits = _RATE_LIMITS_BY_TIER[GEMINI_TIER]
+_smart_limits = _tier_limits.get(MODEL_SMART, _tier_limits["gemini-2.5-pro"])
+LLM_RATE_LIMITS: dict[str, tuple[int, int]] = {
+    MODEL_SMART: (
+        int(os.getenv("KELP_RPM_SMART", _smart_limits[0])),
+        int(os.getenv("KELP_TPM_SMART", _smart_limits[1])),
+    ),
+    MODEL_FAST: (
+        int(os.getenv("KELP_RPM_FAST", _tier_limits[MODEL_FAST][0])),
+        int(os.getenv("KELP_TPM_FAST", _tier_limits[MODEL_FAST][1])),
+    ),
+}
 
 # Parallel composer fan-out cap
 MAX_PARALLEL_SLIDES = 3
@@ -41,3 +256,50 @@ MAX_PARALLEL_SLIDES = 3
 # is 1 so a fully-integrated run fits comfortably in free-tier Flash quota.
 # Bump up to 3 on paid tier for richer Planner briefs.
 WEB_SEARCH_MAX_RESULTS = int(os.getenv("KELP_WEB_SEARCH_MAX_RESULTS", "1"))
+
+# Data-room ingestion (agents/ingestor.py). The input folder is walked
+# recursively; a file is read when its path relative to the input folder
+# matches an include glob and no exclude glob (comma-separated lists, e.g.
+# KELP_INGEST_EXCLUDE="archive/*,*draft*"). Hidden files and folders are
+# always skipped. Excel workbooks are flattened in a process pool of
+# INGEST_EXCEL_WORKERS; PDFs go to LlamaParse INGEST_PDF_CONCURRENCY at a time.
+INGEST_INCLUDE = tuple(
+    g.strip() for g in os.getenv("KELP_INGEST_INCLUDE", "*").split(",") if g.strip())
+INGEST_EXCLUDE = tuple(
+    g.strip() for g in os.getenv("KELP_INGEST_EXCLUDE", "").split(",") if g.strip())
+INGEST_EXCEL_WORKERS = int(os.getenv("KELP_INGEST_EXCEL_WORKERS",
+                                     str(min(4, os.cpu_count() or 1))))
+INGEST_PDF_CONCURRENCY = int(os.getenv("KELP_INGEST_PDF_CONCURRENCY", "4"))
+
+# Local-first PDF parsing (tools/parsers.py). A PDF's embedded text layer is
+# read with pypdf first and the file only goes to LlamaParse when that text
+# looks poor: under PDF_LOCAL_MIN_CHARS_PER_PAGE characters a page (scans,
+# image-only decks) or over PDF_LOCAL_MAX_GARBAGE of characters that are
+# unprintable, U+FFFD or private-use glyphs (broken font encodings).
+# KELP_PDF_LOCAL=0 sends every PDF to LlamaParse, whose markdown keeps
+# table layout that a text layer loses.
+PDF_LOCAL_ENABLED = os.getenv("KELP_PDF_LOCAL", "1") != "0"
+PDF_LOCAL_MIN_CHARS_PER_PAGE = float(os.getenv("KELP_PDF_LOCAL_MIN_CHARS_PER_PAGE", "100"))
+PDF_LOCAL_MAX_GARBAGE = float(os.getenv("KELP_PDF_LOCAL_MAX_GARBAGE", "0.05"))
+
+# Excel flattening (tools/excel_parser.py). Sheets are streamed row by row
+# and emitted as " | "-delimited rows without empty rows or columns. At most
+# EXCEL_MAX_ROWS rows and EXCEL_MAX_CELLS non-empty cells of a sheet (or a
+# CSV file) are emitted; the rest is cut with a note of how many rows were
+# kept. With
+# KELP_EXCEL_SUMMARY=1 a sheet over either cap is summarized instead: its
+# header, first EXCEL_SUMMARY_ROWS rows and per-column stats over all rows.
+EXCEL_MAX_ROWS = int(os.getenv("KELP_EXCEL_MAX_ROWS", "2000"))
+EXCEL_MAX_CELLS = int(os.getenv("KELP_EXCEL_MAX_CELLS", "40000"))
+EXCEL_SUMMARY = os.getenv("KELP_EXCEL_SUMMARY", "0") == "1"
+EXCEL_SUMMARY_ROWS = int(os.getenv("KELP_EXCEL_SUMMARY_ROWS", "20"))
+
+# Parsed-document cache (tools/doc_cache.py): parsed text keyed by the
+# file's sha256 plus parser name, version and options, so unchanged files
+# (above all PDFs, a LlamaParse round trip each) are not parsed again on
+# the next run. KELP_PARSED_CACHE=0 disables it.
+PARSED_CACHE_ENABLED = os.getenv("KELP_PARSED_CACHE", "1") != "0"
+PARSED_CACHE_DIR = Path(os.getenv("KELP_PARSED_CACHE_DIR",
+                                  str(REPO_ROOT / ".cache" / "parsed")))
+PARSED_CACHE_MAX_BYTES = int(os.getenv("KELP_PARSED_CACHE_MAX_MB", "512")) * 1024 * 1024
+PARSED_CACHE_TTL_S = float(os.getenv("KELP_PARSED_CACHE_TTL_DAYS", "90")) * 86400
@@ -18,6 +18,7 @@ class TraceWriter:
         self.run_dir = run_dir
         self.steps: list[dict[str, Any]] = []
         self.costs: list[float] = []
+        self.llm_stats: dict[str, Any] = {}
         self._started_at = time.time()
         if run_dir is not None:
             (run_dir / "intermediate").mkdir(parents=True, exist_ok=True)
@@ -39,6 +40,10 @@ class TraceWriter:
     def add_cost(self, usd: float) -> None:
         self.costs.append(usd)
 
+    def add_llm_stats(self, stats: dict[str, Any]) -> None:
+        """Attach the run's LLM rollup (calls, cache hits, ...) to trace.json."""
+        self.llm_stats.update(stats)
+
     def finalize(self) -> Path | None:
         if self.run_dir is None:
             return None
@@ -48,6 +53,7 @@ class TraceWriter:
                 {
                     "total_cost_usd": round(sum(self.costs), 4),
                     "total_elapsed_s": round(time.time() - self._started_at, 3),
+                    "llm": self.llm_stats,
                     "steps": self.steps,
                 },
                 indent=2,
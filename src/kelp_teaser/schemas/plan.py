@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 from enum import Enum
+from typing import Any
 
 from pydantic import BaseModel, Field, model_validator
 
@@ -44,6 +45,17 @@ class ChartSpecSkeleton(BaseModel):
     title: str = ""
 
 
+# Keywords in a section's data_hooks / note that suggest a chart kind, checked
+# in order when a chart section arrives without its chart_spec.
+_CHART_KIND_HINTS: list[tuple[tuple[str, ...], ChartKind]] = [
+    (("margin", "ebitda"), ChartKind.margin_trend_line),
+    (("geo", "region", "export", "domestic"), ChartKind.geo_split_stacked_bar),
+    (("channel",), ChartKind.channel_mix_donut),
+    (("segment", "mix", "product"), ChartKind.segment_mix_donut),
+    (("trend", "line"), ChartKind.revenue_growth_line),
+]
+
+
 class SectionPlan(BaseModel):
     kind: ComponentKind
     data_hooks: list[str] = Field(default_factory=list)
@@ -51,6 +63,24 @@ class SectionPlan(BaseModel):
     image_brief: str | None = None
     note: str = ""
 
+    @classmethod
+    def repair_payload(cls, data: dict[str, Any]) -> tuple[dict[str, Any], str] | None:
+        """Local fix for a chart / hero_image section missing its required field
+        (see tools.json_repair)."""
+        kind = data.get("kind")
+        hints = " ".join([*map(str, data.get("data_hooks") or []), str(data.get("note") or "")])
+        if kind == ComponentKind.chart.value and not data.get("chart_spec"):
+            text = hints.lower()
+            chart_kind = next((k for words, k in _CHART_KIND_HINTS
+                               if any(w in text for w in words)),
+                              ChartKind.revenue_growth_bar)
+            data["chart_spec"] = {"chart_kind": chart_kind.value}
+            return data, f"chart_spec inferred as {chart_kind.value}"
+        if kind == ComponentKind.hero_image.value and not data.get("image_brief") and hints.strip():
+            data["image_brief"] = hints.strip()
+            return data, "image_brief taken from data_hooks/note"
+        return None
+
     @model_validator(mode="after")
     def _validate_kind_specific_fields(self) -> "SectionPlan":
         if self.kind == ComponentKind.chart and self.chart_spec is None:
@@ -1,6 +1,8 @@
 """Composed-slide schemas. These are what the Composer agent produces and renderers consume."""
 from __future__ import annotations
 
+from typing import Any
+
 from pydantic import BaseModel, Field, field_validator
 
 from kelp_teaser.schemas.facts import parse_source_id
@@ -27,6 +29,13 @@ class MetricTile(BaseModel):
 
     _v_source_id = field_validator("source_id")(_validate_source_id)
 
+    @classmethod
+    def repair_payload(cls, data: dict[str, Any]) -> tuple[None, str] | None:
+        """A tile without a value is dropped rather than re-asked (see tools.json_repair)."""
+        if not str(data.get("value") or "").strip():
+            return None, f"metric {data.get('label', '')!r} has no value"
+        return None
+
 
 class ChartSeries(BaseModel):
     name: str = Field(min_length=1)
@@ -0,0 +1,42 @@
+"""Wire schemas: the slimmed response models individual agents ask the LLM for.
+
+An agent's canonical output model can carry fields that the agent never
+writes: the Composer leaves `chart` and `image` to ChartDesigner and
+ImageCurator. Sending those definitions costs input tokens on every call and
+retry and gives the model more ways to fail validation.
+
+`WIRE_SCHEMAS` maps (agent, canonical model) to the model actually sent.
+`tools.llm` validates the response against it and returns `to_canonical()`.
+"""
+from __future__ import annotations
+
+from pydantic import BaseModel, Field
+
+from kelp_teaser.schemas.plan import ComponentKind
+from kelp_teaser.schemas.slide import Bullet, ComposedSection, ComposedSlide, MetricTile
+
+
+class ComposerSection(BaseModel):
+    kind: ComponentKind
+    heading: str = ""
+    bullets: list[Bullet] = Field(default_factory=list)
+    metrics: list[MetricTile] = Field(default_factory=list)
+
+    def to_canonical(self) -> ComposedSection:
+        return ComposedSection(kind=self.kind, heading=self.heading,
+                               bullets=self.bullets, metrics=self.metrics)
+
+
+class ComposerSlide(BaseModel):
+    index: int = Field(ge=0)
+    title: str = Field(min_length=1)
+    sections: list[ComposerSection] = Field(min_length=1)
+
+    def to_canonical(self) -> ComposedSlide:
+        return ComposedSlide(index=self.index, title=self.title,
+                             sections=[s.to_canonical() for s in self.sections])
+
+
+WIRE_SCHEMAS: dict[tuple[str, type[BaseModel]], type[BaseModel]] = {
+    ("composer", ComposedSlide): ComposerSlide,
+}
@@ -0,0 +1,116 @@
+"""Compact wire format: short JSON keys for structured LLM responses.
+
+Keys such as `source_id` or `data_hooks` repeat dozens of times in one
+ComposedSlide or DeckPlan, and output tokens cost several times input
+tokens. `compact_model(schema)` builds a subclass of `schema` (and of
+every nested model) whose fields have short aliases: "s" for `source_id`,
+"dh" for `data_hooks`, and so on. Each aliased field's description names
+the original field, so the model still knows what it is filling in.
+Validators and `repair_payload` hooks carry over. Full field names are
+accepted too, so a model that ignores the aliases still validates.
+
+`from_compact(obj)` turns a validated compact object back into `schema`.
+"""
+from __future__ import annotations
+
+import functools
+import operator
+import types
+import typing
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, create_model
+from pydantic.fields import FieldInfo
+
+# Fixed aliases for the most repeated keys; other fields get their initials.
+_ALIASES: dict[str, str] = {
+    "source_id": "s",
+    "text": "t",
+    "value": "v",
+    "label": "l",
+    "kind": "k",
+    "heading": "h",
+    "bullets": "b",
+    "metrics": "m",
+    "sections": "sc",
+    "data_hooks": "dh",
+    "suggested_fix": "fx",
+}
+
+
+def _aliases(names: list[str]) -> dict[str, str]:
+    """A short key per field name, unique within one model. Fixed aliases are
+    claimed first, so `source_id` is "s" in every model."""
+    out = {name: _ALIASES[name] for name in names if name in _ALIASES}
+    taken = set(out.values())
+    for name in names:
+        if name in out:
+            continue
+        initials = "".join(part[0] for part in name.split("_") if part)
+        candidates = [initials, *(name[:n] for n in range(2, len(name) + 1))]
+        out[name] = next((c for c in candidates if c not in taken), name)
+        taken.add(out[name])
+    return {name: out[name] for name in names}
+
+
+def _compact_annotation(tp: Any) -> Any:
+    if isinstance(tp, type) and issubclass(tp, BaseModel):
+        return compact_model(tp)
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if not args:
+        return tp
+    new_args = tuple(_compact_annotation(a) for a in args)
+    if new_args == args:
+        return tp
+    if origin is types.UnionType:
+        return functools.reduce(operator.or_, new_args)
+    if origin is typing.Union:
+        return typing.Union[new_args]
+    return origin[new_args if len(new_args) > 1 else new_args[0]]
+
+
+def _wrap_repair_hook(base: type[BaseModel], aliases: dict[str, str]) -> classmethod:
+    names = {alias: name for name, alias in aliases.items()}
+
+    def repair_payload(cls, data: dict[str, Any]):
+        out = base.repair_payload({names.get(k, k): v for k, v in data.items()})
+        if out is None or out[0] is None:
+            return out
+        fixed, description = out
+        return {aliases.get(k, k): v for k, v in fixed.items()}, description
+
+    return classmethod(repair_payload)
+
+
+@functools.lru_cache(maxsize=None)
+def compact_model(schema: type[BaseModel]) -> type[BaseModel]:
+    """`schema` with short field aliases, recursively. Cached per class."""
+    aliases = _aliases(list(schema.model_fields))
+    fields: dict[str, Any] = {}
+    for name, info in schema.model_fields.items():
+        annotation = _compact_annotation(info.annotation)
+        description = f"{name}: {info.description}" if info.description else name
+        fields[name] = (annotation, FieldInfo.merge_field_infos(
+            info, annotation=annotation, alias=aliases[name], alias_priority=2,
+            validation_alias=aliases[name], serialization_alias=aliases[name],
+            description=description))
+    namespace: dict[str, Any] = {}
+    if hasattr(schema, "repair_payload"):
+        namespace["repair_payload"] = _wrap_repair_hook(schema, aliases)
+    base = type(schema.__name__, (schema,), {
+        "model_config": ConfigDict(populate_by_name=True),
+        "__module__": __name__,
+        "__compact_of__": schema,
+        **namespace,
+    })
+    return create_model(schema.__name__, __base__=base, __module__=__name__, **fields)
+
+
+def is_compact(obj: BaseModel) -> bool:
+    return hasattr(type(obj), "__compact_of__")
+
+
+def from_compact(obj: BaseModel) -> BaseModel:
+    """The `schema` instance equivalent to a `compact_model(schema)` instance."""
+    return type(obj).__compact_of__.model_validate(obj.model_dump())
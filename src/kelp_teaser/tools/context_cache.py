@@ -0,0 +1,189 @@
+"""Shared-prefix context caching for prompts that repeat a large source blob.
+
+Callers wrap the repeated prefix (e.g. Composer's source material) in a
+`SharedContext` via `tools.llm.shared_context`. Creating the handle is free;
+the backend cache is created lazily on the first call that uses it, once per
+(model, prefix) per run, and later calls reference it by name so the prefix
+is billed at the cached-input rate instead of being re-sent.
+
+The registry tracks each cache's expiry and re-creates it shortly before
+the TTL runs out. A failed create is retried after a cooldown. A cache the
+provider no longer knows (deleted, or expired early) is evicted via
+`invalidate`, and that call inlines the prefix instead.
+
+Backends:
+- `GeminiContextCacheBackend` — Gemini explicit caching (`client.caches`).
+- `LocalContextCacheBackend` — in-process stand-in for tests; holds the
+  prefix so a fake client can resolve what a cache name refers to.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Protocol
+
+from google.genai import types as genai_types
+
+log = logging.getLogger(__name__)
+
+# Provider errors that mean a referenced cache no longer exists.
+_GONE_MARKERS = ("not_found", "not found", "expired")
+
+
+@dataclass(frozen=True)
+class SharedContext:
+    """A prompt prefix shared by several calls to the same model."""
+
+    model: str
+    prefix: str
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()
+
+
+class ContextCacheBackend(Protocol):
+    def create(self, model: str, prefix: str, ttl_s: float) -> tuple[str, int]:
+        """Create a cache entry. Returns (name, cached_token_count)."""
+
+    def delete(self, name: str) -> None: ...
+
+
+class GeminiContextCacheBackend:
+    def __init__(self, client_factory: Callable[[], Any]) -> None:
+        self._client_factory = client_factory
+
+    def create(self, model: str, prefix: str, ttl_s: float) -> tuple[str, int]:
+        cached = self._client_factory().caches.create(
+            model=model,
+            config=genai_types.CreateCachedContentConfig(
+                contents=[prefix],
+                ttl=f"{int(ttl_s)}s",
+                display_name="kelp-teaser-source-context",
+            ),
+        )
+        usage = getattr(cached, "usage_metadata", None)
+        return cached.name, getattr(usage, "total_token_count", 0) or 0
+
+    def delete(self, name: str) -> None:
+        self._client_factory().caches.delete(name=name)
+
+
+@dataclass
+class LocalContextCacheBackend:
+    """Test stand-in: keeps prefixes in memory under `local/<digest>` names."""
+
+    entries: dict[str, str] = field(default_factory=dict)
+    creates: int = 0
+    token_counter: Callable[[str], int] = lambda text: len(text) // 4 + 1
+
+    def create(self, model: str, prefix: str, ttl_s: float) -> tuple[str, int]:
+        self.creates += 1
+        name = f"local/{model}/{hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:16]}"
+        self.entries[name] = prefix
+        return name, self.token_counter(prefix)
+
+    def delete(self, name: str) -> None:
+        self.entries.pop(name, None)
+
+    def lookup(self, name: str) -> str | None:
+        return self.entries.get(name)
+
+
+def cache_gone(exc: BaseException) -> bool:
+    """Whether a request failed because its context cache no longer exists."""
+    text = str(exc).lower()
+    return any(m in text for m in _GONE_MARKERS)
+
+
+@dataclass
+class _Entry:
+    name: str | None
+    tokens: int = 0
+    # Clock time after which the entry is re-created: the cache's expiry less
+    # the refresh margin, or the end of the cooldown after a failed create.
+    renew_at: float = 0.0
+    ready: threading.Event = field(default_factory=threading.Event)
+
+
+class ContextRegistry:
+    """Creates each (model, prefix) cache once per TTL and hands out its name.
+
+    `resolve` returns None when the prefix should simply be inlined: caching
+    disabled, prefix below the model's minimum cacheable size, or creation
+    failed (logged; retried once `retry_s` has passed).
+    """
+
+    def __init__(self, backend: ContextCacheBackend | None, *,
+                 min_tokens: dict[str, int], ttl_s: float,
+                 token_counter: Callable[[str], int],
+                 refresh_s: float = 60.0, retry_s: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.backend = backend
+        self.min_tokens = min_tokens
+        self.ttl_s = ttl_s
+        # Re-create a cache this long before it expires, so no request
+        # references one that lapses in flight.
+        self.refresh_s = min(refresh_s, ttl_s / 2)
+        self.retry_s = retry_s
+        self.clock = clock
+        self._count = token_counter
+        self._entries: dict[tuple[str, str], _Entry] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, ctx: SharedContext) -> tuple[str | None, int]:
+        """Return (cache_name or None, tokens billed to create it this call)."""
+        if self.backend is None:
+            return None, 0
+        if self._count(ctx.prefix) < self.min_tokens.get(ctx.model, 4096):
+            return None, 0
+        key = (ctx.model, ctx.digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None or (entry.ready.is_set()
+                                      and self.clock() >= entry.renew_at)
+            if owner:
+                entry = self._entries[key] = _Entry(name=None)
+        if not owner:
+            entry.ready.wait()
+            return entry.name, 0
+        started = self.clock()
+        try:
+            entry.name, entry.tokens = self.backend.create(ctx.model, ctx.prefix, self.ttl_s)
+            entry.renew_at = started + self.ttl_s - self.refresh_s
+            log.info("Context cache created for %s (%d tokens)", ctx.model, entry.tokens)
+        except Exception as e:  # noqa: BLE001 - fall back to inlining the prefix
+            entry.renew_at = started + self.retry_s
+            log.warning("Context cache creation failed for %s; inlining prefix: %s",
+                        ctx.model, e)
+        finally:
+            entry.ready.set()
+        return entry.name, entry.tokens
+
+    def invalidate(self, ctx: SharedContext, name: str) -> None:
+        """Forget `name` after the provider reported it missing or expired.
+
+        The next `resolve` creates a fresh cache. A newer entry that already
+        replaced `name` is left alone.
+        """
+        key = (ctx.model, ctx.digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.name == name:
+                del self._entries[key]
+        log.info("Context cache %s is gone; inlining the prefix for this call", name)
+
+    def release_all(self) -> None:
+        """Delete every cache this registry created (stops storage billing)."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            if entry.name and self.backend is not None:
+                try:
+                    self.backend.delete(entry.name)
+                except Exception as e:  # noqa: BLE001
+                    log.warning("Context cache delete failed for %s: %s", entry.name, e)
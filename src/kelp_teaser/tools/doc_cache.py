@@ -0,0 +1,75 @@
+"""Persistent cache of parsed documents, keyed by file content.
+
+A key hashes the file's sha256 together with the parser's name, version
+and options. Renaming or moving a file keeps its entry, while editing the
+file, bumping a parser's version or changing its options (say LlamaParse's
+result_type) misses. Entries hold the parsed text and page anchors and
+are stored by `ResponseCache` (tools/llm_cache.py), so they get the same
+atomic writes, TTL and size-bounded LRU eviction as LLM responses.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from kelp_teaser.tools.llm_cache import ResponseCache
+
+log = logging.getLogger(__name__)
+
+_CHUNK = 1 << 20
+
+
+def file_digest(path: Path) -> str:
+    """sha256 of the file's bytes."""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@dataclass(frozen=True)
+class ParserId:
+    """What, besides the bytes, determines a parse."""
+
+    name: str
+    version: int
+    options: dict[str, Any] = field(default_factory=dict)
+
+
+def parse_key(digest: str, parser: ParserId) -> str:
+    payload = json.dumps({"sha256": digest, "parser": parser.name,
+                          "version": parser.version, "options": parser.options},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ParsedDoc:
+    text: str
+    page_anchors: dict[str, str] = field(default_factory=dict)
+    strategy: str = ""  # the parser strategy that produced the text
+
+
+class ParsedDocCache:
+    def __init__(self, cache_dir: Path, *, max_bytes: int, ttl_s: float) -> None:
+        self._store = ResponseCache(cache_dir, max_bytes=max_bytes, ttl_s=ttl_s)
+
+    def get(self, key: str) -> ParsedDoc | None:
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        try:
+            return ParsedDoc(text=entry["text"], page_anchors=dict(entry["page_anchors"]),
+                             strategy=entry.get("strategy", ""))
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning("Discarding malformed parsed-doc entry %s: %s", key[:12], e)
+            return None
+
+    def put(self, key: str, doc: ParsedDoc) -> None:
+        self._store.put(key, {"text": doc.text, "page_anchors": doc.page_anchors,
+                              "strategy": doc.strategy})
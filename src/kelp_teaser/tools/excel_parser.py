@@ -1,13 +1,69 @@
-"""Excel workbook flattener."""
+"""Excel workbook and CSV flatteners.
+
+Workbooks are streamed through openpyxl in read-only mode, one row at a
+time, so memory grows with what is emitted, not with the sheet. Each
+sheet becomes a "[Sheet: name]" line followed by one " | "-delimited line
+per non-empty row, with empty columns dropped and numbers written without
+padding or trailing ".0". Per-sheet row and cell caps (EXCEL_MAX_ROWS,
+EXCEL_MAX_CELLS) bound the output; with EXCEL_SUMMARY a sheet over a cap
+becomes its header, first rows and per-column stats instead.
+
+Legacy .xls workbooks, which openpyxl cannot read, still go through pandas.
+"""
 from __future__ import annotations
 
-from typing import IO, Union
+import csv
+import datetime as dt
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Union
 
 import pandas as pd
+from openpyxl import load_workbook
+
+from kelp_teaser.config import (
+    EXCEL_MAX_CELLS,
+    EXCEL_MAX_ROWS,
+    EXCEL_SUMMARY,
+    EXCEL_SUMMARY_ROWS,
+)
+
+# Bump when the flattened text changes, so cached parses are redone
+# (tools/doc_cache.py).
+PARSER_VERSION = 2
+XLS_PARSER_VERSION = 1
+CSV_PARSER_VERSION = 1
+
+_SNIFF_BYTES = 64 * 1024
+_MAX_DISTINCT = 1000
+
+# A row as its non-empty cells: (column index, raw value, text).
+_Row = list[tuple[int, Any, str]]
+
 
+def flatten_workbook(source: Union[str, IO[bytes]], *, max_rows: int | None = None,
+                     max_cells: int | None = None, summary: bool | None = None,
+                     summary_rows: int | None = None) -> str:
+    """Stream every sheet of an .xlsx workbook into compact text for LLM
+    ingestion. Caps and summary mode default to the EXCEL_* settings."""
+    max_rows = EXCEL_MAX_ROWS if max_rows is None else max_rows
+    max_cells = EXCEL_MAX_CELLS if max_cells is None else max_cells
+    summary = EXCEL_SUMMARY if summary is None else summary
+    summary_rows = EXCEL_SUMMARY_ROWS if summary_rows is None else summary_rows
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        parts: list[str] = []
+        for ws in wb.worksheets:
+            parts.extend(_flatten_sheet(ws, max_rows, max_cells, summary, summary_rows))
+            parts.append("")
+        return "\n".join(parts)
+    finally:
+        wb.close()
 
-def flatten_workbook(source: Union[str, IO[bytes]]) -> str:
-    """Read every sheet and return a single text dump suitable for LLM ingestion."""
+
+def flatten_legacy_workbook(source: Union[str, IO[bytes]]) -> str:
+    """Read every sheet of an .xls workbook with pandas and dump it as text."""
     sheets: dict[str, pd.DataFrame] = pd.read_excel(source, sheet_name=None)
     parts: list[str] = []
     for name, df in sheets.items():
@@ -15,3 +71,150 @@ def flatten_workbook(source: Union[str, IO[bytes]]) -> str:
         parts.append(df.to_string())
         parts.append("")
     return "\n".join(parts)
+
+
+def _flatten_sheet(ws, max_rows: int, max_cells: int, summary: bool,
+                   summary_rows: int) -> list[str]:
+    kept: list[_Row] = []
+    cells = 0
+    rows = 0
+    truncated = False
+    stats: dict[int, _ColumnStats] = {}
+    for values in ws.iter_rows(values_only=True):
+        row = [(i, v, t) for i, v in enumerate(values)
+               if v is not None and (t := _cell_text(v))]
+        if not row:
+            continue
+        rows += 1
+        if summary and kept:
+            for i, v, t in row:
+                stats.setdefault(i, _ColumnStats()).add(v, t)
+        if truncated:
+            continue
+        if len(kept) >= max_rows or cells + len(row) > max_cells:
+            truncated = True
+            if not summary:
+                break
+            continue
+        kept.append(row)
+        cells += len(row)
+
+    if truncated and summary and kept:
+        header = {i: t for i, _, t in kept[0]}
+        lines = [f"[Sheet: {ws.title}] (summary of {rows} rows)"]
+        lines += _row_lines(kept[:summary_rows + 1])
+        lines.append("[Column stats]")
+        lines += [f"{header.get(i) or _column_letter(i)}: {stats[i].describe()}"
+                  for i in sorted(stats)]
+        return lines
+    lines = [f"[Sheet: {ws.title}]", *_row_lines(kept)]
+    if truncated:
+        lines.append(_cut_note(len(kept)))
+    return lines
+
+
+def _cut_note(rows: int) -> str:
+    # The sheet is not read past the cap, so its full length is unknown
+    # (ws.max_row counts blank rows and may be stale or missing).
+    return f"[... cut after {rows} rows]"
+
+
+def _row_lines(rows: list[_Row]) -> list[str]:
+    """Rows as " | " lines over the columns that have a value in any of them."""
+    columns = {i: n for n, i in enumerate(sorted({i for row in rows for i, _, _ in row}))}
+    out: list[str] = []
+    for row in rows:
+        cells = [""] * (columns[row[-1][0]] + 1)
+        for i, _, t in row:
+            cells[columns[i]] = t
+        out.append(" | ".join(cells))
+    return out
+
+
+def _cell_text(value: Any) -> str:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return str(value)
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return repr(round(value, 6))
+    if isinstance(value, dt.datetime):
+        if value.time() == dt.time():
+            return value.date().isoformat()
+        return value.isoformat(sep=" ")
+    if isinstance(value, (dt.date, dt.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _column_letter(i: int) -> str:
+    letters = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        letters = chr(65 + r) + letters
+    return f"column {letters}"
+
+
+@dataclass
+class _ColumnStats:
+    values: int = 0
+    numbers: int = 0
+    low: float = math.inf
+    high: float = -math.inf
+    total: float = 0.0
+    distinct: set[str] = field(default_factory=set)
+
+    def add(self, value: Any, text: str) -> None:
+        self.values += 1
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.numbers += 1
+            self.low = min(self.low, value)
+            self.high = max(self.high, value)
+            self.total += value
+        elif len(self.distinct) < _MAX_DISTINCT:
+            self.distinct.add(text)
+
+    def describe(self) -> str:
+        if self.numbers == self.values:
+            return (f"{self.values} values, min {_cell_text(float(self.low))}, "
+                    f"max {_cell_text(float(self.high))}, "
+                    f"mean {_cell_text(self.total / self.numbers)}")
+        more = "+" if len(self.distinct) >= _MAX_DISTINCT else ""
+        numeric = f", {self.numbers} numeric" if self.numbers else ""
+        return f"{self.values} values, {len(self.distinct)}{more} distinct{numeric}"
+
+
+def flatten_csv(path: Path, *, max_rows: int | None = None,
+                max_cells: int | None = None) -> str:
+    """One " | "-delimited line per non-empty row. The delimiter is sniffed
+    (comma, semicolon, tab or pipe) and defaults to comma. The file is
+    capped like a sheet, at EXCEL_MAX_ROWS rows and EXCEL_MAX_CELLS
+    non-empty cells by default."""
+    max_rows = EXCEL_MAX_ROWS if max_rows is None else max_rows
+    max_cells = EXCEL_MAX_CELLS if max_cells is None else max_cells
+    with path.open(encoding="utf-8-sig", errors="replace", newline="") as f:
+        sample = f.read(_SNIFF_BYTES)
+        f.seek(0)
+        try:
+            dialect: type[csv.Dialect] | csv.Dialect = csv.Sniffer().sniff(sample, ",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        lines = [f"[CSV: {path.name}]"]
+        rows = cells = 0
+        for row in csv.reader(f, dialect):
+            values = [c.strip() for c in row]
+            filled = sum(1 for v in values if v)
+            if not filled:
+                continue
+            if rows >= max_rows or cells + filled > max_cells:
+                lines.append(_cut_note(rows))
+                break
+            lines.append(" | ".join(values))
+            rows += 1
+            cells += filled
+    return "\n".join(lines) + "\n"
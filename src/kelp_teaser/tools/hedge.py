@@ -0,0 +1,219 @@
+"""Hedged requests: fire a backup request when the first one runs long.
+
+A call that has not returned after `delay_s` (a high percentile of recent
+latencies for its model, from `LatencyWindow`) gets a second, identical
+request, possibly on a faster model. The first acceptable result wins.
+
+- `hedge_call` / `ahedge_call` hedge one blocking / awaitable request. The
+  async loser is cancelled; a blocking loser cannot be interrupted and is left
+  to finish on its daemon thread, its result discarded.
+- `HedgedStream` hedges a streamed response: chunks are read on a worker
+  thread, and if the backup finishes first the stream is closed at its next
+  chunk and `backup_result` holds the winner.
+
+`tools.llm` decides when to hedge and records a `HedgeRecord` per call.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Generic, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    """The last `maxlen` call latencies per model."""
+
+    def __init__(self, maxlen: int = 50) -> None:
+        self._samples: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=maxlen))
+        self._lock = threading.Lock()
+
+    def record(self, model: str, elapsed_s: float) -> None:
+        with self._lock:
+            self._samples[model].append(elapsed_s)
+
+    def percentile(self, model: str, q: float, min_samples: int) -> float | None:
+        """The `q` quantile (0-1) of recent latencies, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+@dataclass
+class HedgeRecord:
+    id: int
+    agent: str
+    model: str
+    backup_model: str
+    delay_s: float
+    hedged: bool = False
+    winner: str = "primary"  # or "backup"
+
+    def to_dict(self) -> dict[str, Any]:
+        out = asdict(self)
+        out["delay_s"] = round(self.delay_s, 3)
+        return out
+
+
+@dataclass
+class HedgeOutcome(Generic[T]):
+    value: T
+    hedged: bool
+    winner: str
+
+
+def _start(fn: Callable[[], T]) -> Future:
+    fut: Future = Future()
+    ctx = contextvars.copy_context()
+
+    def run() -> None:
+        try:
+            fut.set_result(ctx.run(fn))
+        except BaseException as e:  # noqa: BLE001 - handed to the waiter
+            fut.set_exception(e)
+
+    threading.Thread(target=run, daemon=True, name="llm-hedge").start()
+    return fut
+
+
+def hedge_call(primary: Callable[[], T], backup: Callable[[], T], delay_s: float, *,
+               accept: Callable[[T], bool] | None = None) -> HedgeOutcome[T]:
+    """Run `primary`; if it is still running after `delay_s`, also run `backup`.
+
+    The first result passing `accept` wins; if neither does, the first result
+    to arrive is returned. If both raise, the primary's error is raised. A
+    primary that fails before `delay_s` raises without hedging.
+    """
+    first = _start(primary)
+    try:
+        return HedgeOutcome(first.result(timeout=delay_s), False, "primary")
+    except TimeoutError:
+        pass
+    second = _start(backup)
+    pending = {first: "primary", second: "backup"}
+    fallback: HedgeOutcome[T] | None = None
+    errors: dict[str, BaseException] = {}
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            role = pending.pop(fut)
+            if fut.exception() is not None:
+                errors[role] = fut.exception()
+                continue
+            outcome = HedgeOutcome(fut.result(), True, role)
+            if accept is None or accept(outcome.value):
+                return outcome
+            fallback = fallback or outcome
+    if fallback is not None:
+        return fallback
+    raise errors.get("primary") or errors["backup"]
+
+
+async def ahedge_call(primary: Callable[[], Awaitable[T]],
+                      backup: Callable[[], Awaitable[T]], delay_s: float, *,
+                      accept: Callable[[T], bool] | None = None) -> HedgeOutcome[T]:
+    """Coroutine twin of `hedge_call`; the losing request is cancelled."""
+    first = asyncio.ensure_future(primary())
+    done, _ = await asyncio.wait({first}, timeout=delay_s)
+    if done:
+        return HedgeOutcome(first.result(), False, "primary")
+    second = asyncio.ensure_future(backup())
+    pending = {first: "primary", second: "backup"}
+    fallback: HedgeOutcome[T] | None = None
+    errors: dict[str, BaseException] = {}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                role = pending.pop(task)
+                if task.exception() is not None:
+                    errors[role] = task.exception()
+                    continue
+                outcome = HedgeOutcome(task.result(), True, role)
+                if accept is None or accept(outcome.value):
+                    return outcome
+                fallback = fallback or outcome
+    finally:
+        for task in pending:
+            task.cancel()
+    if fallback is not None:
+        return fallback
+    raise errors.get("primary") or errors["backup"]
+
+
+class HedgedStream(Generic[T]):
+    """Iterate `chunks`; once `delay_s` has passed without the stream ending,
+    start `backup()` too. Iteration stops early if the backup returns first:
+    then `winner == "backup"` and `backup_result` is set."""
+
+    _POLL_S = 0.05
+
+    def __init__(self, chunks: Iterator[str], backup: Callable[[], T],
+                 delay_s: float) -> None:
+        self._chunks = chunks
+        self._backup = backup
+        self.delay_s = delay_s
+        self.hedged = False
+        self.winner = "primary"
+        self.backup_result: T | None = None
+
+    def __iter__(self) -> Iterator[str]:
+        items: queue.Queue = queue.Queue()
+        stop = threading.Event()
+        ctx = contextvars.copy_context()
+
+        def read() -> None:
+            try:
+                for chunk in self._chunks:
+                    if stop.is_set():
+                        break
+                    items.put(("chunk", chunk))
+                items.put(("end", None))
+            except BaseException as e:  # noqa: BLE001 - re-raised by the reader
+                items.put(("error", e))
+            finally:
+                close = getattr(self._chunks, "close", None)
+                if close is not None:
+                    close()
+
+        threading.Thread(target=lambda: ctx.run(read), daemon=True,
+                         name="llm-hedge-stream").start()
+        started = time.monotonic()
+        backup: Future | None = None
+        try:
+            while True:
+                if backup is None and time.monotonic() - started >= self.delay_s:
+                    self.hedged = True
+                    backup = _start(self._backup)
+                if backup is not None and backup.done() and backup.exception() is None:
+                    self._backup_won(backup)
+                    return
+                try:
+                    kind, value = items.get(timeout=self._POLL_S)
+                except queue.Empty:
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "end":
+                    return
+                elif backup is not None and backup.exception() is None:
+                    # The primary failed while the backup is still running.
+                    self._backup_won(backup)
+                    return
+                else:
+                    raise value
+        finally:
+            stop.set()
+
+    def _backup_won(self, backup: Future) -> None:
+        self.winner = "backup"
+        self.backup_result = backup.result()
@@ -0,0 +1,417 @@
+"""Deterministic local repair of LLM JSON before spending a re-ask.
+
+`repair_json(raw, schema)` runs two stages and returns the validated model
+plus a list of `Repair` records (written to the trace by `tools.llm`):
+
+1. Syntactic — surrounding prose, trailing commas, and output truncated
+   mid-object (dangling key or comma, unclosed brackets). A string cut off
+   mid-value is dropped with its element, never closed as if complete.
+2. Schema-guided — driven by the Pydantic errors, repeated until the data
+   validates or a round fixes nothing:
+   - schema hooks: a model class may define a `repair_payload(data)`
+     classmethod returning `(fixed_dict, description)`, `(None, description)`
+     to drop the object from its list, or None when it has no fix;
+   - `null` sent for a field that has a default: the key is removed;
+   - over-long strings: cut at a word boundary to `max_length`;
+   - enum values differing only in case or separators: normalized.
+
+Raises `RepairFailed` when the result still does not validate; the caller
+then re-asks the model with the original error.
+
+When the response is well-formed JSON and only some sub-objects are invalid,
+`field_reask(data, schema, error)` plans a narrower re-ask: it picks the
+smallest enclosing objects of the failing paths, and `FieldReask.merge` puts
+the model's replacements back into the otherwise-valid response.
+"""
+from __future__ import annotations
+
+import json
+import re
+import types
+import typing
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import Any
+
+from pydantic import BaseModel, ValidationError
+from pydantic.fields import FieldInfo
+
+_MAX_SCHEMA_ROUNDS = 8
+
+
+class RepairFailed(ValueError):
+    pass
+
+
+@dataclass
+class Repair:
+    stage: str  # "syntax" | "schema"
+    action: str
+    path: str = ""
+    detail: str = ""
+
+    def to_dict(self) -> dict[str, str]:
+        return asdict(self)
+
+
+def repair_json(raw: str, schema: type[BaseModel]) -> tuple[BaseModel, list[Repair]]:
+    repairs: list[Repair] = []
+    data = _repair_syntax(raw, repairs)
+    for _ in range(_MAX_SCHEMA_ROUNDS):
+        try:
+            return schema.model_validate(data), repairs
+        except ValidationError as e:
+            errors = e.errors()
+            last_error = e
+        if not _repair_schema_round(data, schema, errors, repairs):
+            break
+    raise RepairFailed(f"local repair could not fix: {last_error}")
+
+
+# --- syntax ----------------------------------------------------------------
+
+
+def _repair_syntax(raw: str, repairs: list[Repair]) -> Any:
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rstrip()
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise RepairFailed("no JSON object in response")
+    if start > 0:
+        repairs.append(Repair("syntax", "strip_preamble", detail=text[:40]))
+        text = text[start:]
+    try:
+        value, end = json.JSONDecoder().raw_decode(text)
+        repairs.append(Repair("syntax", "strip_trailer", detail=text[end:end + 40]))
+        return value
+    except ValueError:
+        pass
+
+    without_commas = _remove_trailing_commas(text)
+    if without_commas != text:
+        repairs.append(Repair("syntax", "trailing_commas"))
+        text = without_commas
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+
+    closed, closers = _close_truncated(text)
+    if closers:
+        repairs.append(Repair("syntax", "close_truncated", detail=closers))
+        try:
+            return json.loads(_remove_trailing_commas(closed))
+        except ValueError as e:
+            raise RepairFailed(f"JSON still invalid after closing brackets: {e}") from e
+    raise RepairFailed("JSON syntax error not repairable locally")
+
+
+def _remove_trailing_commas(text: str) -> str:
+    out: list[str] = []
+    in_str = escape = False
+    pending_comma: int | None = None
+    for c in text:
+        if in_str:
+            out.append(c)
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_str = False
+            continue
+        if c in "}]" and pending_comma is not None:
+            del out[pending_comma]
+        if c == ",":
+            pending_comma = len(out)
+        elif not c.isspace():
+            pending_comma = None
+        if c == '"':
+            in_str = True
+        out.append(c)
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> tuple[str, str]:
+    """Terminate a cut-off document. Returns (text, what_was_appended).
+
+    A string cut off mid-value is never closed: "expanded to 2" may have
+    been "expanded to 25%". The element it belongs to is dropped instead,
+    back to the last complete `,`, `[` or `{`. Raises RepairFailed if
+    nothing complete is left.
+    """
+    stack: list[list[Any]] = []  # [bracket, expecting_key]
+    in_str = escape = False
+    last_sep = -1  # index of the last `,`, `[` or `{` outside a string
+    element_start = -1  # last_sep when the open string began
+    for i, c in enumerate(text):
+        if in_str:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_str = False
+            continue
+        if c == '"':
+            in_str = True
+            element_start = last_sep
+        elif c in "{[":
+            stack.append([c, c == "{"])
+            last_sep = i
+        elif c in "}]" and stack:
+            stack.pop()
+        elif c == ":" and stack:
+            stack[-1][1] = False
+        elif c == ",":
+            last_sep = i
+            if stack and stack[-1][0] == "{":
+                stack[-1][1] = True
+    if in_str:
+        if element_start < 0:
+            raise RepairFailed("JSON cut off inside a string with nothing complete before it")
+        cut = text[:element_start] if text[element_start] == "," else text[:element_start + 1]
+        if not cut.strip(" \t\r\n{[:"):
+            raise RepairFailed("JSON cut off inside its first value")
+        return _close_truncated(cut)
+    if not stack:
+        return text, ""
+
+    body = text.rstrip()
+    if body.endswith(","):
+        body = body[:-1]
+    elif body.endswith(":"):
+        body += " null"
+    elif stack[-1][0] == "{" and stack[-1][1] and body.endswith('"'):
+        body += ": null"
+    closers = "".join("}" if b == "{" else "]" for b, _ in reversed(stack))
+    return body + closers, closers
+
+
+# --- schema ----------------------------------------------------------------
+
+
+def _repair_schema_round(data: Any, schema: type[BaseModel],
+                         errors: list[dict[str, Any]], repairs: list[Repair]) -> bool:
+    """Apply at most one fix per failing object; deepest paths first so list
+    deletions don't shift indices still to be visited. Returns True if any."""
+    fixed = False
+    touched: set[tuple] = set()
+    for err in sorted(errors, key=lambda e: len(e["loc"]), reverse=True):
+        loc = tuple(err["loc"])
+        if any(loc[:len(t)] == t for t in touched):
+            continue
+        target = _fix_error(data, schema, loc, err, repairs)
+        if target is not None:
+            touched.add(target)
+            fixed = True
+    return fixed
+
+
+def _fix_error(data: Any, schema: type[BaseModel], loc: tuple,
+               err: dict[str, Any], repairs: list[Repair]) -> tuple | None:
+    """Try the fixes for one error; return the path it rewrote, or None."""
+    for owner_loc in (loc, loc[:-1]):
+        model = _model_at(schema, owner_loc)
+        hook = getattr(model, "repair_payload", None)
+        obj = _get(data, owner_loc)
+        if hook is None or not isinstance(obj, dict):
+            continue
+        outcome = hook(dict(obj))
+        if outcome is None:
+            continue
+        new_obj, description = outcome
+        parent = _get(data, owner_loc[:-1]) if owner_loc else None
+        if new_obj is None:
+            if not isinstance(parent, list):
+                continue
+            del parent[owner_loc[-1]]
+            repairs.append(Repair("schema", "drop_item", _path(owner_loc), description))
+            return owner_loc[:-1]
+        if owner_loc:
+            parent[owner_loc[-1]] = new_obj
+        else:
+            data.clear()
+            data.update(new_obj)
+        repairs.append(Repair("schema", "fill_field", _path(owner_loc), description))
+        return owner_loc
+
+    if not loc or not isinstance(loc[-1], str):
+        return None
+    owner = _get(data, loc[:-1])
+    model = _model_at(schema, loc[:-1])
+    if not isinstance(owner, dict) or model is None:
+        return None
+    field = _field(model, loc[-1])
+    value = owner.get(loc[-1])
+    if field is None:
+        return None
+    if value is None and loc[-1] in owner and not field.is_required():
+        del owner[loc[-1]]
+        repairs.append(Repair("schema", "null_to_default", _path(loc)))
+        return loc
+    if err["type"] == "string_too_long" and isinstance(value, str):
+        limit = int(err.get("ctx", {}).get("max_length", len(value)))
+        owner[loc[-1]] = _truncate(value, limit)
+        repairs.append(Repair("schema", "truncate", _path(loc), f"{len(value)}->{limit}"))
+        return loc
+    if err["type"] == "enum" and isinstance(value, str):
+        enum_cls = _strip_optional(field.annotation)
+        match = _match_enum(enum_cls, value)
+        if match is not None:
+            owner[loc[-1]] = match
+            repairs.append(Repair("schema", "normalize_enum", _path(loc),
+                                  f"{value!r}->{match!r}"))
+            return loc
+    return None
+
+
+# --- field-level re-ask ----------------------------------------------------
+
+
+@dataclass
+class FieldReask:
+    """Replacement request for the invalid sub-objects of one response."""
+
+    schema: type[BaseModel]
+    data: Any
+    # (loc, model class at loc, error messages) per sub-object to regenerate.
+    targets: list[tuple[tuple, type[BaseModel], list[str]]]
+
+    @property
+    def paths(self) -> list[str]:
+        return [_path(loc) for loc, _, _ in self.targets]
+
+    def prompt(self, prompt: str) -> str:
+        parts = [
+            prompt,
+            "\n\nYour previous response was valid except for the objects below. "
+            "Respond ONLY with a JSON object mapping each path to a corrected "
+            "replacement object that validates against the schema given for it. "
+            "Do not repeat the rest of the response.",
+        ]
+        for loc, model, errors in self.targets:
+            parts.append(
+                f"\n\nPath: {_path(loc)}\nErrors:\n"
+                + "\n".join(f"- {m}" for m in errors)
+                + f"\nPrevious value: {json.dumps(_get(self.data, loc), ensure_ascii=False)}"
+                + f"\nSchema: {json.dumps(model.model_json_schema())}"
+            )
+        return "".join(parts)
+
+    def merge(self, reply: Any) -> BaseModel:
+        """Validate each replacement, write it into the response, and validate
+        the whole. Raises ValueError if any part is still wrong."""
+        if not isinstance(reply, dict):
+            raise ValueError("field re-ask reply is not a JSON object")
+        merged = json.loads(json.dumps(self.data))
+        for loc, model, _ in self.targets:
+            path = _path(loc)
+            if path not in reply:
+                raise ValueError(f"field re-ask reply has no replacement for {path}")
+            model.model_validate(reply[path])
+            _get(merged, loc[:-1])[loc[-1]] = reply[path]
+        return self.schema.model_validate(merged)
+
+
+def field_reask(data: Any, schema: type[BaseModel], error: ValidationError,
+                max_paths: int) -> FieldReask | None:
+    """Plan a re-ask of just the failing sub-objects, or None when the failure
+    is at the top level or spans more than `max_paths` objects."""
+    targets: dict[tuple, tuple[type[BaseModel], list[str]]] = {}
+    for err in error.errors():
+        loc = tuple(err["loc"])
+        unit = next(((loc[:n], _model_at(schema, loc[:n]))
+                     for n in range(len(loc), 0, -1)
+                     if _model_at(schema, loc[:n]) is not None
+                     and isinstance(_get(data, loc[:n]), dict)), None)
+        if unit is None:
+            return None
+        unit_loc, model = unit
+        targets.setdefault(unit_loc, (model, []))[1].append(
+            f"{_path(loc[len(unit_loc):]) or '(object)'}: {err['msg']}")
+    # An object nested in another target is regenerated with its parent.
+    outer = {loc: v for loc, v in targets.items()
+             if not any(loc != o and loc[:len(o)] == o for o in targets)}
+    if not outer or len(outer) > max_paths:
+        return None
+    return FieldReask(schema, data, [(loc, m, errs) for loc, (m, errs) in outer.items()])
+
+
+def _truncate(value: str, limit: int) -> str:
+    if len(value) <= limit:
+        return value
+    cut = value[:limit - 1]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,;:") + "…"
+
+
+def _norm(value: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", value.lower())
+
+
+def _match_enum(enum_cls: Any, value: str) -> str | None:
+    if not (isinstance(enum_cls, type) and issubclass(enum_cls, Enum)):
+        return None
+    matches = [m.value for m in enum_cls if _norm(str(m.value)) == _norm(value)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _strip_optional(tp: Any) -> Any:
+    if typing.get_origin(tp) in (typing.Union, types.UnionType):
+        args = [a for a in typing.get_args(tp) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return tp
+
+
+def _field(model: type[BaseModel], key: str) -> FieldInfo | None:
+    """The field `key` names, by name or by alias (see tools.compact_wire)."""
+    field = model.model_fields.get(key)
+    if field is None:
+        field = next((f for f in model.model_fields.values() if f.alias == key), None)
+    return field
+
+
+def _model_at(schema: type[BaseModel], loc: tuple) -> type[BaseModel] | None:
+    tp: Any = schema
+    for part in loc:
+        tp = _strip_optional(tp)
+        if isinstance(part, int):
+            if typing.get_origin(tp) is not list:
+                return None
+            tp = typing.get_args(tp)[0]
+        elif isinstance(tp, type) and issubclass(tp, BaseModel) and _field(tp, part):
+            tp = _field(tp, part).annotation
+        else:
+            return None
+    tp = _strip_optional(tp)
+    return tp if isinstance(tp, type) and issubclass(tp, BaseModel) else None
+
+
+def _get(data: Any, loc: tuple) -> Any:
+    for part in loc:
+        try:
+            data = data[part]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def _path(loc: tuple) -> str:
+    out = ""
+    for part in loc:
+        out += f"[{part}]" if isinstance(part, int) else (f".{part}" if out else part)
+    return out
@@ -0,0 +1,145 @@
+"""Incremental parsing of a streamed JSON object, one array element at a time.
+
+`ArrayItemScanner` is fed raw text chunks as a model streams them and hands
+back the source text of each element of one top-level array field (e.g.
+`ComposedSlide.sections`) as soon as that element's closing brace arrives.
+It only tracks nesting and strings; callers validate each element.
+
+It also spots streams that have clearly left the schema — text that is not a
+JSON object, an unknown top-level key, a `field` value that is not an array,
+a non-object array element — and raises
+`OffSchemaStream`, so the caller can stop paying for output tokens.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+
+
+class OffSchemaStream(ValueError):
+    """The streamed text can no longer become a valid instance of the schema."""
+
+
+@dataclass
+class _Frame:
+    kind: str  # "{" or "["
+    expect_key: bool = False
+    key: str | None = None
+
+
+@dataclass
+class ArrayItemScanner:
+    """Yield complete elements of `field` from a streamed top-level JSON object.
+
+    `allowed_keys`, when given, is the set of top-level keys the schema knows;
+    any other key raises `OffSchemaStream`. A leading Markdown code fence is
+    tolerated.
+    """
+
+    field: str
+    allowed_keys: frozenset[str] | None = None
+    text: str = ""
+    _pos: int = 0
+    _started: bool = False
+    _done: bool = False
+    _stack: list[_Frame] = field(default_factory=list)
+    _in_str: bool = False
+    _escape: bool = False
+    _str_start: int = 0
+    _in_items: bool = False
+    _await_items: bool = False  # after `"field":`, before its value
+    _item_start: int = 0
+
+    def feed(self, chunk: str) -> list[str]:
+        """Append `chunk`; return the source of every element it completed."""
+        self.text += chunk
+        done: list[str] = []
+        while self._pos < len(self.text) and not self._done:
+            if not self._started:
+                if not self._skip_preamble():
+                    break
+                continue
+            item = self._step(self.text[self._pos])
+            self._pos += 1
+            if item is not None:
+                done.append(item)
+        return done
+
+    def _skip_preamble(self) -> bool:
+        """Consume whitespace / a code fence before the opening brace.
+
+        Returns False when more text is needed to decide.
+        """
+        rest = self.text[self._pos:]
+        stripped = rest.lstrip()
+        if not stripped:
+            self._pos = len(self.text)
+            return False
+        offset = len(rest) - len(stripped)
+        if stripped.startswith("`"):
+            newline = stripped.find("\n")
+            if newline < 0:
+                if len(stripped) > 16:
+                    raise OffSchemaStream("code fence without a newline")
+                return False
+            self._pos += offset + newline + 1
+            return True
+        if stripped[0] != "{":
+            raise OffSchemaStream(f"response starts with {stripped[:20]!r}, not a JSON object")
+        self._pos += offset
+        self._started = True
+        return True
+
+    def _step(self, c: str) -> str | None:
+        if self._in_str:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_str = False
+                self._end_string()
+            return None
+
+        top = self._stack[-1] if self._stack else None
+        if self._await_items and c not in " \t\r\n":
+            if c != "[":
+                raise OffSchemaStream(f"{self.field} is not an array")
+            self._await_items = False
+        if (self._in_items and len(self._stack) == 2
+                and c not in " \t\r\n,]{"):
+            raise OffSchemaStream(f"{self.field} element is not an object")
+        if c == '"':
+            self._in_str = True
+            self._str_start = self._pos
+        elif c in "{[":
+            if c == "[" and len(self._stack) == 1 and top.key == self.field:
+                self._in_items = True
+            elif c == "{" and self._in_items and len(self._stack) == 2:
+                self._item_start = self._pos
+            self._stack.append(_Frame(kind=c, expect_key=(c == "{")))
+        elif c in "}]":
+            if not self._stack:
+                raise OffSchemaStream("unbalanced closing bracket")
+            closed = self._stack.pop()
+            if closed.kind == "{" and self._in_items and len(self._stack) == 2:
+                return self.text[self._item_start:self._pos + 1]
+            if closed.kind == "[" and self._in_items and len(self._stack) == 1:
+                self._in_items = False
+            if not self._stack:
+                self._done = True
+        elif c == ":" and top is not None:
+            top.expect_key = False
+            self._await_items = len(self._stack) == 1 and top.key == self.field
+        elif c == "," and top is not None and top.kind == "{":
+            top.expect_key = True
+        return None
+
+    def _end_string(self) -> None:
+        top = self._stack[-1]
+        if len(self._stack) != 1 or not top.expect_key:
+            return
+        key = json.loads(self.text[self._str_start:self._pos + 1])
+        if self.allowed_keys is not None and key not in self.allowed_keys:
+            raise OffSchemaStream(f"unexpected top-level key {key!r}")
+        top.key = key
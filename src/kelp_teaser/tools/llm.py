@@ -1,26 +1,142 @@
-"""Gemini client wrapper with cost tracking and bounded retries.
+"""LLM client wrapper with cost tracking and bounded retries.
 
-LLM-touching code lives here. Agents call `complete_text` or `complete_json`.
+LLM-touching code lives here. Agents call `complete_text` or `complete_json`,
+or their coroutine twins `acomplete_text` / `acomplete_json` when fanning out
+many calls on one event loop. `stream_json` streams a JSON response and hands
+out the elements of one array field as they complete.
+
+Agents pass `agent=<name>` so the call is routed to the provider configured
+for that agent (tools/llm_providers.py): Gemini by default, or an
+OpenAI-compatible HTTP server.
 """
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import itertools
 import json
 import logging
 import threading
 import time
+import typing
+import weakref
 from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Any, Awaitable, Callable, Iterator
 
 from google import genai
 from google.genai import types as genai_types
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from kelp_teaser.config import (
+    AGENT_TOKEN_BUDGETS,
     GEMINI_API_KEY,
+    LLM_AGENT_PROVIDERS,
+    LLM_DEFAULT_PROVIDER,
+    OPENAI_COMPAT_API_KEY,
+    OPENAI_COMPAT_BASE_URL,
+    OPENAI_COMPAT_MODEL,
+    OPENAI_COMPAT_MODELS,
+    OPENAI_COMPAT_TIMEOUT_S,
+    LLM_CACHE_DIR,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_TTL_S,
+    LLM_CHAT_RETRY,
+    LLM_COMPACT_WIRE_AGENTS,
+    LLM_CONTEXT_CACHE_BACKEND,
+    LLM_CONTEXT_CACHE_MIN_TOKENS,
+    LLM_CONTEXT_CACHE_REFRESH_S,
+    LLM_CONTEXT_CACHE_RETRY_S,
+    LLM_CONTEXT_CACHE_TTL_S,
+    LLM_FIELD_REASK,
+    LLM_HEDGE_AGENTS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_MODEL,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_WINDOW,
+    LLM_FIELD_REASK_MAX_PATHS,
+    LLM_JSON_REPAIR,
+    LLM_ASYNC_CONCURRENCY,
+    LLM_ASYNC_CONCURRENCY_DEFAULT,
+    LLM_BATCH_BACKEND,
+    LLM_BATCH_DIR,
+    LLM_BATCH_POLL_S,
     LLM_MAX_ATTEMPTS,
+    LLM_MAX_OUTPUT_TOKENS,
+    LLM_NEAR_DUP_ENABLED,
+    LLM_NEAR_DUP_MAX_ENTRIES,
+    LLM_NEAR_DUP_THRESHOLD,
+    LLM_RATE_LIMITS,
+    LLM_REQUEST_MAX_COST_USD,
+    LLM_REQUEST_MAX_ELAPSED_S,
+    LLM_SINGLE_FLIGHT,
+    LLM_STRUCTURED_OUTPUT,
+    LLM_THINKING_BUDGETS,
     COST_SOFT_WARNING,
     COST_HARD_ABORT,
+    MODEL_FAST,
+    MODEL_ROUTER_CASCADE_AGENTS,
+    MODEL_ROUTER_ENABLED,
+    MODEL_ROUTER_EXPECTED_OUTPUT_TOKENS,
+    MODEL_ROUTER_FAST_ATTEMPTS,
+    MODEL_ROUTER_SMALL_PROMPT_TOKENS,
+    MODEL_SMART,
+)
+from kelp_teaser.schemas.wire import WIRE_SCHEMAS
+from kelp_teaser.tools.compact_wire import compact_model, from_compact, is_compact
+from kelp_teaser.tools.context_cache import (
+    ContextRegistry,
+    GeminiContextCacheBackend,
+    LocalContextCacheBackend,
+    SharedContext,
+    cache_gone,
+)
+from kelp_teaser.tools.llm_batch import (
+    BatchExecutor,
+    BatchRequest,
+    BatchResult,
+    GeminiBatchBackend,
+    LocalFileBatchBackend,
+)
+from kelp_teaser.tools.hedge import (
+    HedgedStream,
+    HedgeRecord,
+    LatencyWindow,
+    ahedge_call,
+    hedge_call,
+)
+from kelp_teaser.tools.json_repair import (
+    FieldReask,
+    Repair,
+    RepairFailed,
+    field_reask,
+    repair_json,
+)
+from kelp_teaser.tools.json_stream import ArrayItemScanner, OffSchemaStream
+from kelp_teaser.tools.llm_cache import ResponseCache, cache_key
+from kelp_teaser.tools.model_router import ModelRouter, RoutePolicy, RoutingDecision
+from kelp_teaser.tools.near_dup_cache import NearDupCache, NearDupKey
+from kelp_teaser.tools.llm_providers import (
+    Completion,
+    GeminiProvider,
+    LLMProvider,
+    LLMRequest,
+    OpenAICompatProvider,
+    Turn,
+    Usage,
+)
+from kelp_teaser.tools.rate_limit import RateLimiter, retry_after_s
+from kelp_teaser.tools.response_schema import to_response_schema
+from kelp_teaser.tools.retry import ErrorKind, RetryBudget, classify
+from kelp_teaser.tools.single_flight import SingleFlight
+from kelp_teaser.tools.token_budget import (
+    FitReport,
+    Source,
+    TokenBudget,
+    TokenEstimator,
+    fit_sources,
+    fit_text,
 )
 
 log = logging.getLogger(__name__)
@@ -32,14 +148,41 @@ _PRICING_USD_PER_1M: dict[str, tuple[float, float]] = {
     "gemini-2.5-flash": (0.075, 0.30),
     "gemini-2.5-pro": (1.25, 10.00),
 }
+# Context caching: prompt tokens served from a cache bill at a reduced input
+# rate, and the cache itself bills storage per token-hour while it lives.
+_CACHED_INPUT_USD_PER_1M: dict[str, float] = {
+    "gemini-2.5-flash": 0.01875,
+    "gemini-2.5-pro": 0.3125,
+}
+_CACHE_STORAGE_USD_PER_1M_HOUR: dict[str, float] = {
+    "gemini-2.5-flash": 1.00,
+    "gemini-2.5-pro": 4.50,
+}
 
 
-def estimate_cost_usd(model: str, prompt_tokens: int, output_tokens: int) -> float:
+def estimate_cost_usd(model: str, prompt_tokens: int, output_tokens: int,
+                      cached_tokens: int = 0, thinking_tokens: int = 0) -> float:
+    """Cost of one call. `cached_tokens` is the part of `prompt_tokens` served
+    from a context cache (Gemini reports it inside prompt_token_count);
+    `thinking_tokens` bill at the output rate on top of `output_tokens`."""
     rates = _PRICING_USD_PER_1M.get(model)
     if rates is None:
         return 0.0
     in_rate, out_rate = rates
-    return (prompt_tokens / 1_000_000) * in_rate + (output_tokens / 1_000_000) * out_rate
+    cached_rate = _CACHED_INPUT_USD_PER_1M.get(model, in_rate)
+    fresh = max(prompt_tokens - cached_tokens, 0)
+    return ((fresh / 1_000_000) * in_rate
+            + (cached_tokens / 1_000_000) * cached_rate
+            + ((output_tokens + thinking_tokens) / 1_000_000) * out_rate)
+
+
+# Batch jobs bill at a flat discount off interactive rates.
+_BATCH_PRICE_FACTOR = 0.5
+
+
+def estimate_cache_storage_usd(model: str, tokens: int, ttl_s: float) -> float:
+    rate = _CACHE_STORAGE_USD_PER_1M_HOUR.get(model, 0.0)
+    return (tokens / 1_000_000) * rate * (ttl_s / 3600)
 
 
 @dataclass
@@ -48,19 +191,142 @@ class GeminiCall:
     prompt_tokens: int
     output_tokens: int
     elapsed_s: float = 0.0
+    cached: bool = False
+    cached_tokens: int = 0
+    storage_usd: float = 0.0
+    batch: bool = False
+    route_id: int | None = None
+    hedge_id: int | None = None
+    hedge_role: str | None = None  # "primary" | "backup"
+    agent: str | None = None
+    thinking_tokens: int = 0
+    # A complete_json re-ask after a response failed validation.
+    retry: bool = False
+
+    @property
+    def token_cost_usd(self) -> float:
+        """Token cost at interactive rates: no storage, no batch discount."""
+        return estimate_cost_usd(self.model, self.prompt_tokens, self.output_tokens,
+                                 self.cached_tokens, self.thinking_tokens)
 
 
 @dataclass
 class CostTracker:
     calls: list[GeminiCall] = field(default_factory=list)
     by_model: dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    cache_hits: int = 0
+    cache_misses: int = 0
+    rate_limit_wait_s: float = 0.0
+    schema_tokens_saved: int = 0
+    context_cached_tokens: int = 0
+    streams_cancelled: int = 0
+    coalesced: int = 0
+    routes: list[RoutingDecision] = field(default_factory=list)
+    json_repairs: list[dict[str, str]] = field(default_factory=list)
+    json_repair_failed: int = 0
+    field_reasks: list[dict[str, Any]] = field(default_factory=list)
+    hedges: list[HedgeRecord] = field(default_factory=list)
+    errors_by_kind: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    token_fits: list[tuple[str, FitReport]] = field(default_factory=list)
+    compact_wire: dict[str, dict[str, int]] = field(default_factory=dict)
+    near_dup: dict[str, dict[str, Any]] = field(default_factory=dict)
     _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
 
     def record(self, call: GeminiCall) -> None:
-        cost = estimate_cost_usd(call.model, call.prompt_tokens, call.output_tokens)
+        cost = call.token_cost_usd + call.storage_usd
+        if call.batch:
+            cost *= _BATCH_PRICE_FACTOR
         with self._lock:
             self.calls.append(call)
             self.by_model[call.model] += cost
+            self.context_cached_tokens += call.cached_tokens
+
+    def record_cache_hit(self, model: str) -> None:
+        """A response served from the on-disk cache: a zero-cost call."""
+        with self._lock:
+            self.calls.append(GeminiCall(model, 0, 0, 0.0, cached=True))
+            self.by_model[model] += 0.0
+            self.cache_hits += 1
+
+    def record_cache_miss(self) -> None:
+        with self._lock:
+            self.cache_misses += 1
+
+    def record_rate_limit_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.rate_limit_wait_s += seconds
+
+    def record_schema_tokens_saved(self, tokens: int) -> None:
+        """Estimated prompt tokens not sent because the schema went native."""
+        with self._lock:
+            self.schema_tokens_saved += tokens
+
+    def record_coalesced(self, model: str) -> None:
+        """A call that shared an identical in-flight request's result."""
+        with self._lock:
+            self.calls.append(GeminiCall(model, 0, 0, 0.0, cached=True))
+            self.by_model[model] += 0.0
+            self.coalesced += 1
+
+    def record_route(self, decision: RoutingDecision) -> None:
+        with self._lock:
+            self.routes.append(decision)
+
+    def record_json_repairs(self, schema: str, repairs: list[Repair]) -> None:
+        """A response fixed locally instead of re-asked."""
+        with self._lock:
+            self.json_repairs.extend({"schema": schema, **r.to_dict()} for r in repairs)
+
+    def record_json_repair_failed(self) -> None:
+        with self._lock:
+            self.json_repair_failed += 1
+
+    def record_field_reask(self, schema: str, paths: list[str], *, ok: bool) -> None:
+        """A retry that asked only for replacements of the invalid sub-objects."""
+        with self._lock:
+            self.field_reasks.append({"schema": schema, "paths": paths, "ok": ok})
+
+    def record_hedge(self, record: HedgeRecord) -> None:
+        """A call eligible for hedging; `record` is updated with the outcome."""
+        with self._lock:
+            self.hedges.append(record)
+
+    def record_error(self, kind: ErrorKind) -> None:
+        """A failed provider call or unusable response, by tools.retry kind."""
+        with self._lock:
+            self.errors_by_kind[kind.value] += 1
+
+    def record_token_fit(self, agent: str, report: FitReport) -> None:
+        """A prompt input cut down to the agent's token budget."""
+        with self._lock:
+            self.token_fits.append((agent, report))
+
+    def record_compact_wire(self, agent: str, compact_tokens: int,
+                            verbose_tokens: int) -> None:
+        """A compact-wire response, with estimated tokens as sent and as it
+        would have been with full key names."""
+        with self._lock:
+            stats = self.compact_wire.setdefault(
+                agent, {"responses": 0, "compact_tokens": 0, "verbose_tokens": 0})
+            stats["responses"] += 1
+            stats["compact_tokens"] += compact_tokens
+            stats["verbose_tokens"] += verbose_tokens
+
+    def record_near_dup(self, agent: str | None, *, hit: bool, saved_tokens: int = 0,
+                        saved_usd: float = 0.0) -> None:
+        """A near-duplicate cache lookup; a hit carries the estimated tokens
+        and cost of the call it replaced."""
+        with self._lock:
+            stats = self.near_dup.setdefault(agent or "-", {
+                "lookups": 0, "hits": 0, "saved_tokens": 0, "saved_usd": 0.0})
+            stats["lookups"] += 1
+            stats["hits"] += hit
+            stats["saved_tokens"] += saved_tokens
+            stats["saved_usd"] += saved_usd
+
+    def record_stream_cancelled(self) -> None:
+        with self._lock:
+            self.streams_cancelled += 1
 
     @property
     def total_calls(self) -> int:
@@ -72,6 +338,128 @@ class CostTracker:
         with self._lock:
             return sum(self.by_model.values())
 
+    def summary(self) -> dict[str, Any]:
+        """JSON-ready rollup for trace.json."""
+        with self._lock:
+            return {
+                "total_calls": len(self.calls),
+                "total_cost_usd": round(sum(self.by_model.values()), 6),
+                "by_model_usd": {m: round(c, 6) for m, c in self.by_model.items()},
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "rate_limit_wait_s": round(self.rate_limit_wait_s, 3),
+                "schema_tokens_saved": self.schema_tokens_saved,
+                "context_cached_tokens": self.context_cached_tokens,
+                "batch_calls": sum(1 for c in self.calls if c.batch),
+                "streams_cancelled": self.streams_cancelled,
+                "coalesced": self.coalesced,
+                "routing": [self._route_summary(d) for d in self.routes],
+                "json_repairs": list(self.json_repairs),
+                "json_repair_failed": self.json_repair_failed,
+                "field_reasks": list(self.field_reasks),
+                "hedging": self._hedge_summary(),
+                "errors_by_kind": dict(self.errors_by_kind),
+                "token_budgets": self._token_budget_summary(),
+                "thinking_tokens": sum(c.thinking_tokens for c in self.calls),
+                "thinking": self._thinking_summary(),
+                "retries": self._retry_summary(),
+                "compact_wire": {
+                    agent: {**s, "saved_tokens": s["verbose_tokens"] - s["compact_tokens"],
+                            "reduction": round(1 - s["compact_tokens"]
+                                               / max(s["verbose_tokens"], 1), 3)}
+                    for agent, s in self.compact_wire.items()},
+                "near_dup": {
+                    agent: {**s, "saved_usd": round(s["saved_usd"], 6),
+                            "hit_rate": round(s["hits"] / s["lookups"], 3)}
+                    for agent, s in self.near_dup.items()},
+            }
+
+    def _thinking_summary(self) -> dict[str, dict[str, Any]]:
+        """Per agent: thinking budget, thinking tokens used and what they cost."""
+        out: dict[str, dict[str, Any]] = {}
+        for c in self.calls:
+            if c.cached or c.agent is None:
+                continue
+            stats = out.setdefault(c.agent, {
+                "budget": LLM_THINKING_BUDGETS.get(c.agent), "calls": 0,
+                "thinking_tokens": 0, "max_thinking_tokens": 0, "cost_usd": 0.0})
+            stats["calls"] += 1
+            stats["thinking_tokens"] += c.thinking_tokens
+            stats["max_thinking_tokens"] = max(stats["max_thinking_tokens"],
+                                               c.thinking_tokens)
+            stats["cost_usd"] += estimate_cost_usd(c.model, 0, 0,
+                                                   thinking_tokens=c.thinking_tokens)
+        for stats in out.values():
+            stats["cost_usd"] = round(stats["cost_usd"], 6)
+        return out
+
+    def _retry_summary(self) -> dict[str, Any]:
+        """Tokens and cost of validation re-asks, in total and per agent."""
+        retries = [c for c in self.calls if c.retry]
+        by_agent: dict[str, dict[str, Any]] = {}
+        for c in retries:
+            stats = by_agent.setdefault(c.agent or "-", {"calls": 0, "cost_usd": 0.0})
+            stats["calls"] += 1
+            stats["cost_usd"] += c.token_cost_usd
+        for stats in by_agent.values():
+            stats["cost_usd"] = round(stats["cost_usd"], 6)
+        return {
+            "calls": len(retries),
+            "prompt_tokens": sum(c.prompt_tokens for c in retries),
+            "cached_tokens": sum(c.cached_tokens for c in retries),
+            "output_tokens": sum(c.output_tokens for c in retries),
+            "cost_usd": round(sum(c.token_cost_usd for c in retries), 6),
+            "by_agent": by_agent,
+        }
+
+    def _token_budget_summary(self) -> dict[str, dict[str, Any]]:
+        """Per budgeted agent: budget vs. the largest reported prompt / output,
+        calls over budget, and the truncations applied to fit."""
+        out: dict[str, dict[str, Any]] = {}
+        for agent, budget in TOKEN_BUDGETS.items():
+            calls = [c for c in self.calls if c.agent == agent and not c.cached]
+            fits = [r.to_dict() for a, r in self.token_fits if a == agent]
+            if not calls and not fits:
+                continue
+            out[agent] = {
+                "input_budget": budget.input_tokens,
+                "output_budget": budget.output_tokens,
+                "calls": len(calls),
+                "max_prompt_tokens": max((c.prompt_tokens for c in calls), default=0),
+                "max_output_tokens": max((c.output_tokens for c in calls), default=0),
+                "over_input": sum(c.prompt_tokens > budget.input_tokens for c in calls),
+                "over_output": sum(c.output_tokens > budget.output_tokens for c in calls),
+                "truncations": fits,
+            }
+        return out
+
+    def _hedge_summary(self) -> dict[str, dict[str, Any]]:
+        """Per agent: eligible calls, how many were hedged, backup wins, and
+        the cost of the losing requests."""
+        out: dict[str, dict[str, Any]] = {}
+        for r in self.hedges:
+            stats = out.setdefault(r.agent, {"calls": 0, "hedged": 0, "hedge_wins": 0,
+                                             "extra_cost_usd": 0.0})
+            stats["calls"] += 1
+            if not r.hedged:
+                continue
+            stats["hedged"] += 1
+            stats["hedge_wins"] += r.winner == "backup"
+            loser = "primary" if r.winner == "backup" else "backup"
+            stats["extra_cost_usd"] += sum(
+                c.token_cost_usd
+                for c in self.calls if c.hedge_id == r.id and c.hedge_role == loser)
+        for stats in out.values():
+            stats["hedge_rate"] = round(stats["hedged"] / stats["calls"], 3)
+            stats["extra_cost_usd"] = round(stats["extra_cost_usd"], 6)
+        return out
+
+    def _route_summary(self, decision: RoutingDecision) -> dict[str, Any]:
+        calls = [c for c in self.calls if c.route_id == decision.id]
+        cost = sum(c.token_cost_usd for c in calls)
+        return {**decision.to_dict(), "calls": len(calls),
+                "cost_usd": round(cost, 6)}
+
 
 class CostExceeded(RuntimeError):
     pass
@@ -105,85 +493,1549 @@ def _get_client() -> genai.Client:
     return _client
 
 
+def _build_providers() -> dict[str, LLMProvider]:
+    return {
+        "gemini": GeminiProvider(lambda: _get_client()),
+        "openai": OpenAICompatProvider(
+            OPENAI_COMPAT_BASE_URL,
+            api_key=OPENAI_COMPAT_API_KEY,
+            models=OPENAI_COMPAT_MODELS,
+            default_model=OPENAI_COMPAT_MODEL,
+            timeout_s=OPENAI_COMPAT_TIMEOUT_S,
+        ),
+    }
+
+
+PROVIDERS: dict[str, LLMProvider] = _build_providers()
+
+
+def route(agent: str | None, model: str) -> tuple[LLMProvider, str]:
+    """Return (provider, backend model id) for a call from `agent`."""
+    name = LLM_AGENT_PROVIDERS.get(agent, LLM_DEFAULT_PROVIDER) if agent \
+        else LLM_DEFAULT_PROVIDER
+    provider = PROVIDERS.get(name)
+    if provider is None:
+        raise ValueError(f"unknown LLM provider {name!r} (known: {sorted(PROVIDERS)})")
+    return provider, provider.model_for(model)
+
+
+def _routed(agent: str | None, model: str, context: SharedContext | None,
+            ) -> tuple[LLMProvider, str, SharedContext | None]:
+    provider, routed = route(agent, model)
+    if context is not None and context.model != routed and context.model == model:
+        context = SharedContext(model=routed, prefix=context.prefix)
+    return provider, routed, context
+
+
+def _build_model_router() -> ModelRouter:
+    policies = {
+        agent: RoutePolicy(small_prompt_tokens=tokens,
+                           cascade=agent in MODEL_ROUTER_CASCADE_AGENTS,
+                           fast_attempts=MODEL_ROUTER_FAST_ATTEMPTS)
+        for agent, tokens in MODEL_ROUTER_SMALL_PROMPT_TOKENS.items()
+    } if MODEL_ROUTER_ENABLED else {}
+    return ModelRouter(policies, fast=MODEL_FAST, smart=MODEL_SMART,
+                       soft_budget_usd=COST_SOFT_WARNING,
+                       hard_budget_usd=COST_HARD_ABORT,
+                       cost_fn=estimate_cost_usd,
+                       expected_output_tokens=MODEL_ROUTER_EXPECTED_OUTPUT_TOKENS)
+
+
+MODEL_ROUTER = _build_model_router()
+
+# The routing decision the current call belongs to; every GeminiCall recorded
+# while it is set is attributed to it in the routing summary.
+_ROUTE_ID: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "llm_route_id", default=None)
+
+
+def _choose_model(agent: str | None, model: str, prompt: str,
+                  context: SharedContext | None,
+                  tracker: CostTracker | None) -> RoutingDecision | None:
+    decision = MODEL_ROUTER.choose(
+        agent, model, estimate_tokens(_keyed_prompt(prompt, context)),
+        tracker.total_cost_usd if tracker is not None else 0.0,
+    )
+    if decision is not None:
+        log.info("Routing %s: %s -> %s (%s)", decision.agent, decision.requested,
+                 decision.chosen, decision.reason)
+        if tracker is not None:
+            tracker.record_route(decision)
+    return decision
+
+
+def _retarget(context: SharedContext | None, model: str) -> SharedContext | None:
+    """The same shared prefix, for the model the router picked."""
+    if context is None or context.model == model:
+        return context
+    return SharedContext(model=model, prefix=context.prefix)
+
+
+def _is_validation_failure(exc: Exception) -> bool:
+    """complete_json gave up because the output never validated (vs. transport)."""
+    return isinstance(exc.__cause__, ValueError)
+
+
+def _fast_attempts(decision: RoutingDecision) -> int:
+    return MODEL_ROUTER.policies[decision.agent].fast_attempts
+
+
+def _note_escalation(decision: RoutingDecision) -> None:
+    decision.escalated = True
+    log.warning("Escalating %s to %s: %s output failed validation",
+                decision.agent, decision.requested, decision.chosen)
+
+
+# Recent per-model latencies (every GeminiCall.elapsed_s) that set the hedge delay.
+LATENCY = LatencyWindow(LLM_HEDGE_WINDOW)
+_HEDGE_IDS = itertools.count(1)
+# (hedge id, "primary" | "backup") of the request running in this context.
+_HEDGE: contextvars.ContextVar[tuple[int, str] | None] = contextvars.ContextVar(
+    "llm_hedge", default=None)
+
+_T = typing.TypeVar("_T")
+
+
+def _hedge_plan(agent: str | None, model: str,
+                tracker: CostTracker | None) -> HedgeRecord | None:
+    """A hedge for this call, or None (agent not hedged, latency not known yet,
+    or already inside a hedged request)."""
+    if agent not in LLM_HEDGE_AGENTS or _HEDGE.get() is not None:
+        return None
+    delay = LATENCY.percentile(model, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES)
+    if delay is None:
+        return None
+    backup = MODEL_FAST if LLM_HEDGE_MODEL == "fast" else model
+    record = HedgeRecord(next(_HEDGE_IDS), agent or "", model, backup, delay)
+    if tracker is not None:
+        tracker.record_hedge(record)
+    return record
+
+
+def _note_hedge(record: HedgeRecord, hedged: bool, winner: str) -> None:
+    record.hedged, record.winner = hedged, winner
+    if hedged:
+        log.info("Hedged %s call on %s after %.1fs; %s won", record.agent,
+                 record.backup_model, record.delay_s, winner)
+
+
+def _tagged(tag: tuple[int, str], fn: Callable[[], _T]) -> Callable[[], _T]:
+    def run() -> _T:
+        token = _HEDGE.set(tag)
+        try:
+            return fn()
+        finally:
+            _HEDGE.reset(token)
+    return run
+
+
+def _atagged(tag: tuple[int, str],
+             fn: Callable[[], Awaitable[_T]]) -> Callable[[], Awaitable[_T]]:
+    async def run() -> _T:
+        token = _HEDGE.set(tag)
+        try:
+            return await fn()
+        finally:
+            _HEDGE.reset(token)
+    return run
+
+
+def _hedged(agent: str | None, model: str, provider: LLMProvider,
+            context: SharedContext | None, tracker: CostTracker | None,
+            call: Callable[[str, LLMProvider, SharedContext | None], _T], *,
+            accept: Callable[[_T], bool] | None = None) -> _T:
+    """`call(model, provider, context)`, with a backup request if it runs long."""
+    plan = _hedge_plan(agent, model, tracker)
+    if plan is None:
+        return call(model, provider, context)
+    b_provider, b_model, b_context = _routed(agent, plan.backup_model,
+                                             _retarget(context, plan.backup_model))
+    outcome = hedge_call(
+        _tagged((plan.id, "primary"), lambda: call(model, provider, context)),
+        _tagged((plan.id, "backup"), lambda: call(b_model, b_provider, b_context)),
+        plan.delay_s, accept=accept,
+    )
+    _note_hedge(plan, outcome.hedged, outcome.winner)
+    return outcome.value
+
+
+async def _ahedged(agent: str | None, model: str, provider: LLMProvider,
+                   context: SharedContext | None, tracker: CostTracker | None,
+                   call: Callable[[str, LLMProvider, SharedContext | None], Awaitable[_T]],
+                   *, accept: Callable[[_T], bool] | None = None) -> _T:
+    plan = _hedge_plan(agent, model, tracker)
+    if plan is None:
+        return await call(model, provider, context)
+    b_provider, b_model, b_context = _routed(agent, plan.backup_model,
+                                             _retarget(context, plan.backup_model))
+    outcome = await ahedge_call(
+        _atagged((plan.id, "primary"), lambda: call(model, provider, context)),
+        _atagged((plan.id, "backup"), lambda: call(b_model, b_provider, b_context)),
+        plan.delay_s, accept=accept,
+    )
+    _note_hedge(plan, outcome.hedged, outcome.winner)
+    return outcome.value
+
+
+# Process-wide: every thread and event loop shares one RPM/TPM budget per model.
+RATE_LIMITER = RateLimiter(LLM_RATE_LIMITS)
+
+
+# chars/token per model, calibrated from the prompt token counts providers report.
+TOKENS = TokenEstimator()
+
+
+def estimate_tokens(text: str, model: str | None = None) -> int:
+    """Cheap pre-call token estimate: ~4 chars/token for English prose until
+    calls to `model` have calibrated its ratio."""
+    return TOKENS.estimate(text, model)
+
+
+def _calibrate(model: str, text: str, usage: Usage) -> None:
+    if usage.prompt_tokens > 0:
+        TOKENS.observe(model, len(text), usage.prompt_tokens)
+
+
+TOKEN_BUDGETS: dict[str, TokenBudget] = {
+    agent: TokenBudget(input_tokens=int(b["input"]), output_tokens=int(b["output"]),
+                       strategy=str(b.get("strategy", "head")),
+                       per_source_tokens=b.get("per_source"))
+    for agent, b in AGENT_TOKEN_BUDGETS.items()
+}
+
+
+def token_budget(agent: str) -> TokenBudget | None:
+    return TOKEN_BUDGETS.get(agent)
+
+
+def budget_text(agent: str, text: str, *, reserve_tokens: int = 0,
+                model: str | None = None, label: str = "text",
+                tracker: CostTracker | None = None) -> str:
+    """Cut `text` to the agent's input budget less `reserve_tokens` (the rest
+    of the prompt), using the agent's strategy. Unbudgeted agents: unchanged."""
+    budget = TOKEN_BUDGETS.get(agent)
+    if budget is None:
+        return text
+    strategy = "head" if budget.strategy == "drop_low_priority" else budget.strategy
+    out, report = fit_text(text, max(budget.input_tokens - reserve_tokens, 0), strategy,
+                           lambda t: estimate_tokens(t, model), label=label)
+    _note_fit(agent, report, tracker)
+    return out
+
+
+def budget_sources(agent: str, sources: list[Source], *, reserve_tokens: int = 0,
+                   model: str | None = None,
+                   tracker: CostTracker | None = None) -> list[Source]:
+    """Fit `sources` into the agent's input budget less `reserve_tokens`:
+    per-source caps first, then the lowest-priority sources are dropped."""
+    budget = TOKEN_BUDGETS.get(agent)
+    if budget is None:
+        return sources
+    kept, report = fit_sources(sources, max(budget.input_tokens - reserve_tokens, 0),
+                               lambda t: estimate_tokens(t, model),
+                               per_source_tokens=budget.per_source_tokens)
+    _note_fit(agent, report, tracker)
+    return kept
+
+
+def _note_fit(agent: str, report: FitReport, tracker: CostTracker | None) -> None:
+    if not report.changed:
+        return
+    log.info("%s: prompt cut from ~%d to ~%d tokens (truncated %s, dropped %s)",
+             agent, report.before_tokens, report.after_tokens,
+             report.truncated or "-", report.dropped or "-")
+    tracker = tracker if tracker is not None else CURRENT_TRACKER
+    if tracker is not None:
+        tracker.record_token_fit(agent, report)
+
+
+# gemini-2.5-pro cannot turn thinking off; 128 tokens is its smallest budget.
+_MIN_THINKING_BUDGET: dict[str, int] = {"gemini-2.5-pro": 128}
+
+
+def thinking_budget(agent: str | None, model: str) -> int | None:
+    """The agent's LLM_THINKING_BUDGETS entry, raised to `model`'s minimum;
+    None (model default) for unlisted agents."""
+    budget = LLM_THINKING_BUDGETS.get(agent) if agent is not None else None
+    if budget is None or budget < 0:
+        return budget
+    return max(budget, _MIN_THINKING_BUDGET.get(model, 0))
+
+
+def _max_output_tokens(schema: type[BaseModel] | None) -> int | None:
+    return LLM_MAX_OUTPUT_TOKENS.get(schema.__name__) if schema is not None else None
+
+
+class _RetriesExhausted(RuntimeError):
+    """A provider call gave up; the request's retry budget is spent for it."""
+
+
+def _new_budget(max_attempts: int = LLM_MAX_ATTEMPTS) -> RetryBudget:
+    return RetryBudget(max_attempts=max_attempts, max_cost_usd=LLM_REQUEST_MAX_COST_USD,
+                       max_elapsed_s=LLM_REQUEST_MAX_ELAPSED_S)
+
+
+def _backoff_after_failure(model: str, exc: Exception, budget: RetryBudget,
+                           tracker: CostTracker | None) -> tuple[ErrorKind, float | None]:
+    """Classify a failure and return (kind, seconds to sleep before the next
+    attempt), or (kind, None) when the request must give up.
+
+    A server retry hint pauses the model in the shared limiter instead of
+    sleeping, so every concurrent caller waits for it rather than hammering
+    a 429.
+    """
+    kind = classify(exc, fatal=(CostExceeded,))
+    if tracker is not None:
+        tracker.record_error(kind)
+    delay = budget.after_failure(kind)
+    hint = retry_after_s(exc) if kind is ErrorKind.quota else None
+    if hint is not None:
+        RATE_LIMITER.pause(model, hint)
+        return kind, None if delay is None else 0.0
+    return kind, delay
+
+
+def _build_context_registry() -> ContextRegistry:
+    backend = {
+        "gemini": lambda: GeminiContextCacheBackend(lambda: _get_client()),
+        "local": LocalContextCacheBackend,
+    }.get(LLM_CONTEXT_CACHE_BACKEND, lambda: None)()
+    return ContextRegistry(backend, min_tokens=LLM_CONTEXT_CACHE_MIN_TOKENS,
+                           ttl_s=LLM_CONTEXT_CACHE_TTL_S,
+                           token_counter=estimate_tokens,
+                           refresh_s=LLM_CONTEXT_CACHE_REFRESH_S,
+                           retry_s=LLM_CONTEXT_CACHE_RETRY_S)
+
+
+CONTEXT_REGISTRY = _build_context_registry()
+
+
+def shared_context(model: str, prefix: str) -> SharedContext:
+    """Mark `prefix` as shared by several calls to `model` in this run.
+
+    Pass the result as `context=` to complete_text / complete_json; the prompt
+    then carries only the call-specific part. Cheap: no request is made until
+    the first call that uses it.
+    """
+    return SharedContext(model=model, prefix=prefix)
+
+
+def release_shared_contexts() -> None:
+    """Drop every context cache created this run. Called by the CLI at the end."""
+    CONTEXT_REGISTRY.release_all()
+
+
+def _apply_context(
+    model: str,
+    prompt: str,
+    context: SharedContext | None,
+    tracker: CostTracker | None,
+    provider: LLMProvider | None = None,
+) -> tuple[str, str | None]:
+    """Return (contents, cached_content_name) for a request.
+
+    Without a usable cache (or on a provider without context caching) the
+    prefix is inlined ahead of the prompt, so the model sees the same text
+    either way.
+    """
+    if context is None:
+        return prompt, None
+    if context.model != model:
+        raise ValueError(f"shared context is for {context.model}, not {model}")
+    if provider is not None and not provider.supports_context_cache:
+        return f"{context.prefix}\n\n{prompt}", None
+    name, created_tokens = CONTEXT_REGISTRY.resolve(context)
+    if created_tokens and tracker is not None:
+        tracker.record(GeminiCall(
+            model, created_tokens, 0,
+            storage_usd=estimate_cache_storage_usd(model, created_tokens,
+                                                   LLM_CONTEXT_CACHE_TTL_S),
+        ))
+    if name is None:
+        return f"{context.prefix}\n\n{prompt}", None
+    return prompt, name
+
+
+def _context_lost(exc: Exception, context: SharedContext | None,
+                  cached_content: str | None) -> bool:
+    """True (after evicting it) when `exc` says the referenced context cache
+    is gone; the caller then re-sends the request with the prefix inlined."""
+    if cached_content is None or context is None or not cache_gone(exc):
+        return False
+    CONTEXT_REGISTRY.invalidate(context, cached_content)
+    return True
+
+
+def _keyed_prompt(prompt: str, context: SharedContext | None) -> str:
+    """The full text the model sees, for response-cache keys."""
+    return prompt if context is None else f"{context.prefix}\n\n{prompt}"
+
+
+# Identical requests in flight at the same moment (across threads and event
+# loops) share one network call; keys are the response-cache keys.
+_IN_FLIGHT = SingleFlight()
+
+
+def _shared_copy(result: Any, shared: bool) -> Any:
+    """Followers get their own copy so no caller can mutate another's result."""
+    if shared and isinstance(result, BaseModel):
+        return result.model_copy(deep=True)
+    return result
+
+
+def _single_flight(key: str, model: str, tracker: CostTracker | None,
+                   fn: Callable[[], Any]) -> Any:
+    if not LLM_SINGLE_FLIGHT:
+        return fn()
+    result, shared = _IN_FLIGHT.do(key, fn)
+    if shared and tracker is not None:
+        tracker.record_coalesced(model)
+    return _shared_copy(result, shared)
+
+
+async def _asingle_flight(key: str, model: str, tracker: CostTracker | None,
+                          fn: Callable[[], Awaitable[Any]]) -> Any:
+    if not LLM_SINGLE_FLIGHT:
+        return await fn()
+    result, shared = await _IN_FLIGHT.ado(key, fn)
+    if shared and tracker is not None:
+        tracker.record_coalesced(model)
+    return _shared_copy(result, shared)
+
+
+_cache: ResponseCache | None = None
+
+
+def _get_cache() -> ResponseCache | None:
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ResponseCache(LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES,
+                               ttl_s=LLM_CACHE_TTL_S)
+    return _cache
+
+
+_near_dup: NearDupCache | None = None
+
+
+def _get_near_dup_cache() -> NearDupCache | None:
+    global _near_dup
+    if not (LLM_CACHE_ENABLED and LLM_NEAR_DUP_ENABLED):
+        return None
+    if _near_dup is None:
+        _near_dup = NearDupCache(LLM_CACHE_DIR / "near_dup",
+                                 threshold=LLM_NEAR_DUP_THRESHOLD, ttl_s=LLM_CACHE_TTL_S,
+                                 max_entries=LLM_NEAR_DUP_MAX_ENTRIES)
+    return _near_dup
+
+
+def note_near_dup_reuse(model: str, prompt: str, text: str, *,
+                        tracker: CostTracker | None = None,
+                        agent: str | None = None) -> None:
+    """Record `text` as reused for `prompt` in place of a call to `model`."""
+    if tracker is None:
+        tracker = CURRENT_TRACKER
+    if tracker is None:
+        return
+    prompt_tokens = estimate_tokens(prompt, model)
+    output_tokens = estimate_tokens(text, model)
+    tracker.record_near_dup(agent, hit=True, saved_tokens=prompt_tokens + output_tokens,
+                            saved_usd=estimate_cost_usd(model, prompt_tokens, output_tokens))
+
+
+def near_dup_lookup(model: str, prompt: str, key: NearDupKey, *,
+                    tracker: CostTracker | None = None,
+                    agent: str | None = None) -> str | None:
+    """A stored response for a near-identical `key.text` in `key.scope`, or
+    None. Hits and misses are counted on the tracker."""
+    cache = _get_near_dup_cache()
+    if cache is None:
+        return None
+    found = cache.get(key)
+    if found is None:
+        if tracker is None:
+            tracker = CURRENT_TRACKER
+        if tracker is not None:
+            tracker.record_near_dup(agent, hit=False)
+        return None
+    text, sim = found
+    log.info("Near-duplicate cache hit for %s (similarity %.2f)", agent or model, sim)
+    note_near_dup_reuse(model, prompt, text, tracker=tracker, agent=agent)
+    return text
+
+
+def near_dup_store(key: NearDupKey, text: str) -> None:
+    cache = _get_near_dup_cache()
+    if cache is not None:
+        cache.put(key, text)
+
+
+def _cache_lookup_text(cache: ResponseCache | None, key: str, model: str,
+                       tracker: CostTracker | None) -> str | None:
+    if cache is None:
+        return None
+    hit = cache.get(key)
+    if tracker is not None:
+        if hit is not None:
+            tracker.record_cache_hit(model)
+        else:
+            tracker.record_cache_miss()
+    return hit["text"] if hit is not None else None
+
+
+def _cache_lookup_json(cache: ResponseCache | None, key: str, model: str,
+                       schema: type[BaseModel],
+                       tracker: CostTracker | None) -> BaseModel | None:
+    if cache is None:
+        return None
+    hit = cache.get(key)
+    result: BaseModel | None = None
+    if hit is not None:
+        try:
+            result = schema.model_validate_json(hit["text"])
+        except Exception as e:  # noqa: BLE001 - stale entry; treat as a miss
+            log.warning("Discarding unparseable cached %s: %s", schema.__name__, e)
+    if tracker is not None:
+        if result is not None:
+            tracker.record_cache_hit(model)
+        else:
+            tracker.record_cache_miss()
+    return result
+
+
+def _record_usage(usage: Usage | None, model: str, elapsed: float,
+                  tracker: CostTracker | None, route_id: int | None = None,
+                  hedge: tuple[int, str] | None = None,
+                  agent: str | None = None, retry: bool = False) -> Usage:
+    """Charge one call's usage to the tracker and return it (zeros if unknown)."""
+    usage = usage or Usage()
+    if elapsed > 0:
+        LATENCY.record(model, elapsed)
+    hedge = hedge or _HEDGE.get()
+    if tracker is not None:
+        tracker.record(GeminiCall(
+            model, usage.prompt_tokens, usage.output_tokens, elapsed,
+            cached_tokens=usage.cached_tokens,
+            thinking_tokens=usage.thinking_tokens,
+            route_id=route_id if route_id is not None else _ROUTE_ID.get(),
+            hedge_id=hedge[0] if hedge else None,
+            hedge_role=hedge[1] if hedge else None,
+            agent=agent,
+            retry=retry,
+        ))
+        check_cost_budget(
+            tracker,
+            soft_warning=COST_SOFT_WARNING,
+            hard_abort=COST_HARD_ABORT,
+        )
+    return usage
+
+
+def _request(model: str, contents: str, temperature: float,
+             response_schema: genai_types.Schema | None,
+             cached_content: str | None,
+             max_output_tokens: int | None = None,
+             thinking_budget: int | None = None,
+             turns: list[Turn] | None = None) -> LLMRequest:
+    json_schema = None
+    if response_schema is not None:
+        json_schema = response_schema.json_schema.model_dump(
+            mode="json", exclude_none=True, by_alias=True)
+    return LLMRequest(model=model, contents=contents, temperature=temperature,
+                      response_schema=response_schema, json_schema=json_schema,
+                      cached_content=cached_content,
+                      max_output_tokens=max_output_tokens,
+                      thinking_budget=thinking_budget, turns=list(turns or []))
+
+
+def _generate(
+    model: str,
+    prompt: str,
+    *,
+    temperature: float,
+    tracker: CostTracker | None,
+    response_schema: genai_types.Schema | None = None,
+    context: SharedContext | None = None,
+    provider: LLMProvider | None = None,
+    budget: RetryBudget | None = None,
+    agent: str | None = None,
+    max_output_tokens: int | None = None,
+    turns: list[Turn] | None = None,
+    retry: bool = False,
+) -> str:
+    """One LLM request: rate-limited, retried, cost-tracked.
+
+    No response cache here; `context` is resolved to a context cache (or
+    inlined) before the first attempt. `provider` defaults to Gemini.
+    Attempts draw on `budget`, shared with the caller's own retries; a
+    standalone call gets a fresh one. `turns` continue a conversation after
+    `prompt`; `retry` marks the call as a validation re-ask in the tracker.
+    """
+    provider = provider or PROVIDERS["gemini"]
+    contents, cached_content = _apply_context(model, prompt, context, tracker, provider)
+    sent = contents if cached_content is None else _keyed_prompt(prompt, context)
+    sent += "".join(t.text for t in turns or [])
+    est_tokens = estimate_tokens(sent, model)
+    req = _request(model, contents, temperature, response_schema, cached_content,
+                   max_output_tokens, thinking_budget(agent, model), turns)
+    budget = budget or _new_budget()
+    while True:
+        attempt = budget.start_attempt()
+        try:
+            waited = RATE_LIMITER.acquire(model, est_tokens)
+            if waited and tracker is not None:
+                tracker.record_rate_limit_wait(waited)
+            start = time.monotonic()
+            completion = provider.generate(req)
+            usage = _record_usage(completion.usage, model, time.monotonic() - start,
+                                  tracker, agent=agent, retry=retry)
+            _calibrate(model, sent, usage)
+            budget.charge(estimate_cost_usd(model, usage.prompt_tokens, usage.output_tokens,
+                                            usage.cached_tokens, usage.thinking_tokens))
+            RATE_LIMITER.reconcile(model, est_tokens, usage.prompt_tokens)
+            return completion.text
+        except Exception as e:  # noqa: BLE001 - provider SDKs raise many types
+            if _context_lost(e, context, cached_content):
+                contents, cached_content = _keyed_prompt(prompt, context), None
+                sent = contents + "".join(t.text for t in turns or [])
+                est_tokens = estimate_tokens(sent, model)
+                req = _request(model, contents, temperature, response_schema, None,
+                               max_output_tokens, thinking_budget(agent, model), turns)
+                continue
+            kind, delay = _backoff_after_failure(model, e, budget, tracker)
+            log.warning("%s call failed (%s, attempt %d/%d): %s", provider.name,
+                        kind.value, attempt, budget.max_attempts, e)
+            if kind is ErrorKind.fatal:
+                raise
+            if delay is None:
+                raise _RetriesExhausted(
+                    f"{provider.name} call failed after {attempt} attempts") from e
+            if delay:
+                time.sleep(delay)
+
+
 def complete_text(
     model: str,
     prompt: str,
     *,
     temperature: float = 0.2,
     tracker: CostTracker | None = None,
+    context: SharedContext | None = None,
+    agent: str | None = None,
+    near_dup: NearDupKey | None = None,
 ) -> str:
-    """Single text completion with bounded retries. Raises on persistent failure."""
+    """Single text completion with bounded retries. Raises on persistent failure.
+
+    Responses are served from / written to the on-disk cache when enabled,
+    and identical concurrent calls share one request. With `near_dup`, a
+    response stored for a near-identical `near_dup.text` in the same scope
+    is reused (tools/near_dup_cache.py).
+    """
     if tracker is None:
         tracker = CURRENT_TRACKER
-    last_exc: Exception | None = None
-    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+    provider, model, context = _routed(agent, model, context)
+    key = cache_key(model, _keyed_prompt(prompt, context), temperature=temperature)
+
+    def run() -> str:
+        cache = _get_cache()
+        cached = _cache_lookup_text(cache, key, model, tracker)
+        if cached is not None:
+            return cached
+        if near_dup is not None:
+            reused = near_dup_lookup(model, prompt, near_dup, tracker=tracker, agent=agent)
+            if reused is not None:
+                return reused
+        text = _hedged(agent, model, provider, context, tracker,
+                       lambda m, p, c: _generate(m, prompt, temperature=temperature,
+                                                 tracker=tracker, context=c, provider=p,
+                                                 agent=agent))
+        if cache is not None:
+            cache.put(key, {"model": model, "text": text})
+        if near_dup is not None:
+            near_dup_store(near_dup, text)
+        return text
+
+    return _single_flight(key, model, tracker, run)
+
+
+def complete_json(
+    model: str,
+    prompt: str,
+    schema: type[BaseModel],
+    *,
+    temperature: float = 0.2,
+    tracker: CostTracker | None = None,
+    context: SharedContext | None = None,
+    agent: str | None = None,
+) -> BaseModel:
+    """Completion that must return JSON matching the given Pydantic schema.
+
+    With LLM_STRUCTURED_OUTPUT on, the schema travels as the request's
+    `response_schema` instead of as prompt text; schemas Gemini can't express
+    fall back to the inline hint. On parse/validation failure, retries up to
+    LLM_MAX_ATTEMPTS: with LLM_CHAT_RETRY the first request is resent as is
+    and followed by the rejected response and its errors, otherwise the
+    errors are appended to a rebuilt prompt. Re-asks are reported under
+    `retries` in the tracker summary. Raises on persistent failure.
+    Validated results are cached on disk under a key that includes the
+    schema, so a schema change never replays stale JSON.
+
+    For agents with a routing policy, MODEL_SMART calls may run on
+    MODEL_FAST instead, escalating to MODEL_SMART if Flash output fails
+    validation (see tools/model_router.py).
+
+    Where the agent has a slimmed wire schema for `schema`
+    (schemas/wire.py), or uses the compact wire format (short keys, see
+    tools/compact_wire.py), that is what the model is asked for; the result
+    is converted back to `schema`.
+    """
+    if tracker is None:
+        tracker = CURRENT_TRACKER
+    wire = _wire_schema(agent, schema)
+    if wire is not None:
+        result = complete_json(model, prompt, wire, temperature=temperature,
+                               tracker=tracker, context=context, agent=agent)
+        return _from_wire(result, agent, tracker)
+    decision = _choose_model(agent, model, prompt, context, tracker)
+    if decision is None:
+        return _complete_json(model, prompt, schema, temperature=temperature,
+                              tracker=tracker, context=context, agent=agent)
+
+    def run_on(chosen: str, max_attempts: int = LLM_MAX_ATTEMPTS) -> BaseModel:
+        return _complete_json(chosen, prompt, schema, temperature=temperature,
+                              tracker=tracker, context=_retarget(context, chosen),
+                              agent=agent, max_attempts=max_attempts)
+
+    token = _ROUTE_ID.set(decision.id)
+    start = time.monotonic()
+    try:
+        if not decision.cascade:
+            return run_on(decision.chosen)
         try:
-            start = time.monotonic()
-            client = _get_client()
-            resp = client.models.generate_content(
-                model=model,
-                contents=prompt,
-                config=genai_types.GenerateContentConfig(temperature=temperature),
+            return run_on(decision.chosen, _fast_attempts(decision))
+        except Exception as e:  # noqa: BLE001
+            if not _is_validation_failure(e):
+                raise
+            _note_escalation(decision)
+        return run_on(decision.requested)
+    finally:
+        decision.elapsed_s = time.monotonic() - start
+        _ROUTE_ID.reset(token)
+
+
+def _complete_json(
+    model: str,
+    prompt: str,
+    schema: type[BaseModel],
+    *,
+    temperature: float,
+    tracker: CostTracker | None,
+    context: SharedContext | None,
+    agent: str | None,
+    max_attempts: int = LLM_MAX_ATTEMPTS,
+    streamed: str | None = None,
+) -> BaseModel:
+    # `streamed` is a response already received (a finished JsonStream): it
+    # is parsed as the first reply, so a failure is recovered with a re-ask
+    # that follows up on it instead of a fresh request.
+    provider, model, context = _routed(agent, model, context)
+    json_schema = schema.model_json_schema()
+    key = cache_key(model, _keyed_prompt(prompt, context), temperature=temperature,
+                    schema=json_schema)
+
+    def run() -> BaseModel:
+        cache = _get_cache()
+        cached = _cache_lookup_json(cache, key, model, schema, tracker)
+        if cached is not None:
+            return cached
+        response_schema, schema_hint, hint_tokens = _schema_delivery(schema, json_schema)
+        augmented = prompt + schema_hint
+        max_output = _max_output_tokens(schema)
+        last_exc: Exception | None = None
+        reask: FieldReask | None = None
+        reasked = False
+        followup: list[Turn] | None = None
+        raw = ""
+        budget = _new_budget(max_attempts)
+        first_reply = streamed
+        while True:
+            try:
+                if first_reply is not None:
+                    budget.start_attempt()
+                    raw, first_reply = first_reply, None
+                    if hint_tokens and tracker is not None:
+                        tracker.record_schema_tokens_saved(hint_tokens)
+                    result = _parse_json(raw, schema, tracker)
+                elif reask is not None:
+                    reasked = True
+                    reply = _generate(model, reask.prompt(prompt), temperature=temperature,
+                                      tracker=tracker, context=context, provider=provider,
+                                      budget=budget, agent=agent,
+                                      max_output_tokens=max_output, retry=True)
+                    result = _merge_field_reask(reask, reply, tracker)
+                elif followup is not None:
+                    raw = _generate(model, augmented, temperature=temperature,
+                                    tracker=tracker, response_schema=response_schema,
+                                    context=context, provider=provider, budget=budget,
+                                    agent=agent, max_output_tokens=max_output,
+                                    turns=followup, retry=True)
+                    result = _parse_json(raw, schema, tracker)
+                else:
+                    raw = _hedged(
+                        agent, model, provider, context, tracker,
+                        lambda m, p, c: _generate(m, augmented, temperature=temperature,
+                                                  tracker=tracker,
+                                                  response_schema=response_schema,
+                                                  context=c, provider=p,
+                                                  budget=budget, agent=agent,
+                                                  max_output_tokens=max_output,
+                                                  retry=last_exc is not None),
+                        accept=lambda text: _validates(text, schema))
+                    if hint_tokens and tracker is not None:
+                        tracker.record_schema_tokens_saved(hint_tokens)
+                    result = _parse_json(raw, schema, tracker)
+                if cache is not None:
+                    cache.put(key, {"model": model, "schema": schema.__name__,
+                                    "text": result.model_dump_json()})
+                return result
+            except Exception as e:  # noqa: BLE001
+                last_exc = e
+                if isinstance(e, CostExceeded):
+                    raise
+                if isinstance(e, _RetriesExhausted):
+                    break
+                kind, delay = _backoff_after_failure(model, e, budget, tracker)
+                log.warning("complete_json failed (%s, attempt %d/%d): %s",
+                            kind.value, budget.attempts, budget.max_attempts, e)
+                if delay is None:
+                    break
+                if delay:
+                    time.sleep(delay)
+                # A failed field re-ask keeps the follow-up built for the last
+                # full response, `raw`, with that response's own error.
+                failed_reask = reask is not None
+                reask = None if reasked else _plan_field_reask(raw, schema, e)
+                if failed_reask or not isinstance(e, ValueError):
+                    continue
+                if LLM_CHAT_RETRY:
+                    followup = _retry_turns(raw, e) or followup
+                else:
+                    augmented = _retry_prompt(prompt, schema_hint, e)
+        raise RuntimeError(
+            f"complete_json failed after {budget.attempts} attempts") from last_exc
+
+    return _single_flight(key, model, tracker, run)
+
+
+def _schema_delivery(
+    schema: type[BaseModel],
+    json_schema: dict[str, Any],
+) -> tuple[genai_types.Schema | None, str, int]:
+    """Decide how the schema reaches the model.
+
+    Returns (response_schema, prompt_hint, hint_tokens_saved_per_call): either
+    a native schema with an empty hint, or no native schema and the text hint.
+    """
+    hint = _schema_hint(json_schema)
+    native = to_response_schema(schema) if LLM_STRUCTURED_OUTPUT else None
+    if native is None:
+        return None, hint, 0
+    return native, "", estimate_tokens(hint)
+
+
+def _generate_stream(
+    model: str,
+    prompt: str,
+    *,
+    temperature: float,
+    tracker: CostTracker | None,
+    response_schema: genai_types.Schema | None = None,
+    context: SharedContext | None = None,
+    provider: LLMProvider | None = None,
+    route_id: int | None = None,
+    hedge: tuple[int, str] | None = None,
+    agent: str | None = None,
+    max_output_tokens: int | None = None,
+) -> Iterator[str]:
+    """Stream one request's text chunks. Rate-limited, not retried.
+
+    Usage is charged when the stream ends or is closed early, from the last
+    usage reported (or a text-length estimate if none arrived yet).
+    """
+    provider = provider or PROVIDERS["gemini"]
+    contents, cached_content = _apply_context(model, prompt, context, tracker, provider)
+    sent = contents if cached_content is None else _keyed_prompt(prompt, context)
+    est_tokens = estimate_tokens(sent, model)
+    req = _request(model, contents, temperature, response_schema, cached_content,
+                   max_output_tokens, thinking_budget(agent, model))
+    waited = RATE_LIMITER.acquire(model, est_tokens)
+    if waited and tracker is not None:
+        tracker.record_rate_limit_wait(waited)
+    start = time.monotonic()
+    usage: Usage | None = None
+    received: list[str] = []
+    try:
+        for chunk in provider.stream(req):
+            usage = chunk.usage or usage
+            if chunk.text:
+                received.append(chunk.text)
+                yield chunk.text
+    except Exception as e:  # noqa: BLE001 - streams are not retried here
+        _context_lost(e, context, cached_content)
+        raise
+    finally:
+        if usage is None:
+            usage = Usage(prompt_tokens=est_tokens,
+                          output_tokens=estimate_tokens("".join(received), model))
+        else:
+            _calibrate(model, sent, usage)
+        _record_usage(usage, model, time.monotonic() - start, tracker, route_id, hedge,
+                      agent)
+        RATE_LIMITER.reconcile(model, est_tokens, usage.prompt_tokens)
+
+
+def _wire_schema(agent: str | None, schema: type[BaseModel]) -> type[BaseModel] | None:
+    """The schema the model is asked for in place of `schema`: the agent's
+    slimmed wire schema, in compact form for compact-wire agents. None when
+    `schema` is sent as is."""
+    if agent is None or hasattr(schema, "__compact_of__"):
+        return None
+    wire = WIRE_SCHEMAS.get((agent, schema))
+    if agent in LLM_COMPACT_WIRE_AGENTS:
+        wire = compact_model(wire or schema)
+    return wire
+
+
+def _from_wire(result: BaseModel, agent: str | None,
+               tracker: CostTracker | None) -> BaseModel:
+    """Undo `_wire_schema`: expand compact keys, then convert to canonical."""
+    if is_compact(result):
+        expanded = from_compact(result)
+        if tracker is not None and agent is not None:
+            tracker.record_compact_wire(
+                agent, estimate_tokens(result.model_dump_json(by_alias=True)),
+                estimate_tokens(expanded.model_dump_json()))
+        result = expanded
+    to_canonical = getattr(result, "to_canonical", None)
+    return to_canonical() if to_canonical is not None else result
+
+
+def _array_item_schema(schema: type[BaseModel], item_field: str) -> type[BaseModel]:
+    """`X` for a `list[X]` field of `schema`."""
+    annotation = schema.model_fields[item_field].annotation
+    args = typing.get_args(annotation)
+    if typing.get_origin(annotation) is not list or not args:
+        raise TypeError(f"{schema.__name__}.{item_field} is not a list field")
+    return args[0]
+
+
+class JsonStream:
+    """Iterate to receive each element of `item_field` as soon as it is complete.
+
+    After iteration, `result` holds the whole validated object. Only a
+    structural violation (not a JSON object, an unknown key, a non-object
+    element) cancels the stream; the request is then re-run through
+    `complete_json`. Each element gets the same local repair as a whole
+    response (tools/json_repair.py); one that still fails validation stops
+    further elements from being handed out, but the stream runs to the end
+    and the finished text goes through `complete_json`'s repair and re-ask
+    (a field re-ask or chat follow-up on that text, not a fresh request).
+    Either way, the elements not yet handed out are yielded from that
+    result. Elements that were already yielded may therefore differ from
+    `result`; callers that act on them early should compare against
+    `result` once iteration ends.
+
+    With a wire schema for (agent, schema), the request uses it and both the
+    elements and `result` are converted back to the canonical models.
+    """
+
+    def __init__(self, model: str, prompt: str, schema: type[BaseModel], *,
+                 item_field: str, temperature: float = 0.2,
+                 tracker: CostTracker | None = None,
+                 context: SharedContext | None = None,
+                 agent: str | None = None) -> None:
+        self.agent = agent
+        self.model = model
+        self.prompt = prompt
+        self.wire = _wire_schema(agent, schema)
+        self.schema = self.wire or schema
+        self.item_field = item_field
+        self.temperature = temperature
+        self.tracker = tracker if tracker is not None else CURRENT_TRACKER
+        self.context = context
+        self.result: BaseModel | None = None
+        self.cancelled = False
+
+    @classmethod
+    def from_result(cls, result: BaseModel, item_field: str) -> "JsonStream":
+        """A stream that replays an already-complete object."""
+        stream = cls("", "", type(result), item_field=item_field)
+        stream.result = result
+        return stream
+
+    def __iter__(self) -> Iterator[BaseModel]:
+        if self.wire is None or self.result is not None:
+            yield from self._iter()
+            return
+        try:
+            for item in self._iter():
+                yield _from_wire(item, self.agent, None)
+        finally:
+            if isinstance(self.result, self.wire):
+                self.result = _from_wire(self.result, self.agent, self.tracker)
+
+    def _iter(self) -> Iterator[BaseModel]:
+        if self.result is not None:
+            yield from getattr(self.result, self.item_field)
+            return
+        decision = _choose_model(self.agent, self.model, self.prompt, self.context,
+                                 self.tracker)
+        chosen = decision.chosen if decision is not None else self.model
+        route_id = decision.id if decision is not None else None
+        provider, model, context = _routed(self.agent, chosen,
+                                           _retarget(self.context, chosen))
+        json_schema = self.schema.model_json_schema()
+        cache = _get_cache()
+        key = cache_key(model, _keyed_prompt(self.prompt, context),
+                        temperature=self.temperature, schema=json_schema) if cache else ""
+        cached = _cache_lookup_json(cache, key, model, self.schema, self.tracker)
+        if cached is not None:
+            self.result = cached
+            yield from getattr(cached, self.item_field)
+            return
+
+        item_schema = _array_item_schema(self.schema, self.item_field)
+        response_schema, schema_hint, hint_tokens = _schema_delivery(self.schema, json_schema)
+        fields = self.schema.model_fields
+        scanner = ArrayItemScanner(
+            fields[self.item_field].alias or self.item_field,
+            allowed_keys=frozenset(fields) | {f.alias for f in fields.values() if f.alias})
+        yielded = 0
+        # Set once an element fails validation: later elements are held back
+        # until the whole response has been recovered.
+        invalid: str | None = None
+        finished = False
+        started = time.monotonic()
+        try:
+            plan = _hedge_plan(self.agent, model, self.tracker)
+            chunks = _generate_stream(
+                model, self.prompt + schema_hint, temperature=self.temperature,
+                tracker=self.tracker, response_schema=response_schema,
+                context=context, provider=provider, route_id=route_id,
+                hedge=(plan.id, "primary") if plan is not None else None,
+                agent=self.agent, max_output_tokens=_max_output_tokens(self.schema),
             )
-            elapsed = time.monotonic() - start
-            text = resp.text or ""
-            usage = getattr(resp, "usage_metadata", None)
-            prompt_tokens = getattr(usage, "prompt_token_count", 0) if usage else 0
-            output_tokens = getattr(usage, "candidates_token_count", 0) if usage else 0
-            if tracker is not None:
-                tracker.record(GeminiCall(model, prompt_tokens, output_tokens, elapsed))
-                check_cost_budget(
-                    tracker,
-                    soft_warning=COST_SOFT_WARNING,
-                    hard_abort=COST_HARD_ABORT,
+            source = chunks if plan is None else HedgedStream(
+                chunks, _tagged((plan.id, "backup"), lambda: _complete_json(
+                    plan.backup_model, self.prompt, self.schema,
+                    temperature=self.temperature, tracker=self.tracker,
+                    context=_retarget(self.context, plan.backup_model),
+                    agent=self.agent)),
+                plan.delay_s)
+            reader = iter(source)
+            try:
+                for chunk in reader:
+                    for raw in scanner.feed(chunk):
+                        if invalid is not None:
+                            continue
+                        try:
+                            # Repairs are recorded once, when the whole
+                            # response is parsed at the end.
+                            item = _parse_json(raw, item_schema)
+                        except ValueError as e:
+                            invalid = f"{self.item_field}[{yielded}] invalid: {e}"
+                            continue
+                        yielded += 1
+                        yield item
+            finally:
+                reader.close()
+            if isinstance(source, HedgedStream):
+                _note_hedge(plan, source.hedged, source.winner)
+                if source.winner == "backup":
+                    self.result = source.backup_result
+                    yield from getattr(self.result, self.item_field)[yielded:]
+                    return
+            if invalid is not None:
+                log.info("Streamed %s has an %s; recovering from the finished "
+                         "response", self.schema.__name__, invalid)
+            # Parse the streamed text; a failure is re-asked as a follow-up.
+            finished = True
+            token = _ROUTE_ID.set(route_id)
+            try:
+                self.result = _complete_json(
+                    model, self.prompt, self.schema, temperature=self.temperature,
+                    tracker=self.tracker, context=context, agent=self.agent,
+                    streamed=scanner.text)
+            finally:
+                _ROUTE_ID.reset(token)
+            yield from getattr(self.result, self.item_field)[yielded:]
+        except CostExceeded:
+            raise
+        except Exception as e:  # noqa: BLE001 - fall back to the retried path
+            if finished and (decision is None or not decision.cascade):
+                raise
+            if isinstance(e, OffSchemaStream):
+                self.cancelled = True
+                if self.tracker is not None:
+                    self.tracker.record_stream_cancelled()
+            log.warning("Streaming %s stopped after %d %s (%s); falling back to "
+                        "complete_json", self.schema.__name__, yielded,
+                        self.item_field, e)
+            fallback = chosen
+            if decision is not None and decision.cascade:
+                _note_escalation(decision)
+                fallback = decision.requested
+            token = _ROUTE_ID.set(route_id)
+            try:
+                self.result = _complete_json(
+                    fallback, self.prompt, self.schema, temperature=self.temperature,
+                    tracker=self.tracker, context=_retarget(self.context, fallback),
+                    agent=self.agent,
                 )
-            return text
-        except Exception as e:  # noqa: BLE001 - Gemini SDK can raise many types
-            last_exc = e
-            log.warning("Gemini call failed (attempt %d/%d): %s", attempt, LLM_MAX_ATTEMPTS, e)
-            time.sleep(min(2 ** attempt, 5))
-    raise RuntimeError(f"Gemini call failed after {LLM_MAX_ATTEMPTS} attempts") from last_exc
+            finally:
+                _ROUTE_ID.reset(token)
+            yield from getattr(self.result, self.item_field)[yielded:]
+        finally:
+            if decision is not None:
+                decision.elapsed_s = time.monotonic() - started
 
 
-def complete_json(
+def stream_json(
+    model: str,
+    prompt: str,
+    schema: type[BaseModel],
+    *,
+    item_field: str,
+    temperature: float = 0.2,
+    tracker: CostTracker | None = None,
+    context: SharedContext | None = None,
+    agent: str | None = None,
+) -> JsonStream:
+    """Streaming `complete_json`: see `JsonStream`. Nothing is sent until
+    iteration starts."""
+    return JsonStream(model, prompt, schema, item_field=item_field,
+                      temperature=temperature, tracker=tracker, context=context,
+                      agent=agent)
+
+
+# Per-event-loop, per-model semaphores. asyncio primitives bind to the loop
+# they are first used on, so each loop (e.g. one `asyncio.run` per agent)
+# gets its own set; entries vanish with the loop.
+_async_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]
+] = weakref.WeakKeyDictionary()
+
+
+def _model_semaphore(model: str) -> asyncio.Semaphore:
+    per_loop = _async_semaphores.setdefault(asyncio.get_running_loop(), {})
+    sem = per_loop.get(model)
+    if sem is None:
+        sem = asyncio.Semaphore(
+            LLM_ASYNC_CONCURRENCY.get(model, LLM_ASYNC_CONCURRENCY_DEFAULT))
+        per_loop[model] = sem
+    return sem
+
+
+async def _agenerate(
+    model: str,
+    prompt: str,
+    *,
+    temperature: float,
+    tracker: CostTracker | None,
+    response_schema: genai_types.Schema | None = None,
+    context: SharedContext | None = None,
+    provider: LLMProvider | None = None,
+    budget: RetryBudget | None = None,
+    agent: str | None = None,
+    max_output_tokens: int | None = None,
+    turns: list[Turn] | None = None,
+    retry: bool = False,
+) -> str:
+    """Coroutine twin of `_generate`, bounded by the per-model semaphore."""
+    provider = provider or PROVIDERS["gemini"]
+    contents, cached_content = await asyncio.to_thread(
+        _apply_context, model, prompt, context, tracker, provider)
+    sent = contents if cached_content is None else _keyed_prompt(prompt, context)
+    sent += "".join(t.text for t in turns or [])
+    est_tokens = estimate_tokens(sent, model)
+    req = _request(model, contents, temperature, response_schema, cached_content,
+                   max_output_tokens, thinking_budget(agent, model), turns)
+    budget = budget or _new_budget()
+    while True:
+        attempt = budget.start_attempt()
+        try:
+            waited = await RATE_LIMITER.aacquire(model, est_tokens)
+            if waited and tracker is not None:
+                tracker.record_rate_limit_wait(waited)
+            async with _model_semaphore(model):
+                start = time.monotonic()
+                completion = await provider.agenerate(req)
+                elapsed = time.monotonic() - start
+            usage = _record_usage(completion.usage, model, elapsed, tracker,
+                                  agent=agent, retry=retry)
+            _calibrate(model, sent, usage)
+            budget.charge(estimate_cost_usd(model, usage.prompt_tokens, usage.output_tokens,
+                                            usage.cached_tokens, usage.thinking_tokens))
+            RATE_LIMITER.reconcile(model, est_tokens, usage.prompt_tokens)
+            return completion.text
+        except Exception as e:  # noqa: BLE001 - provider SDKs raise many types
+            if _context_lost(e, context, cached_content):
+                contents, cached_content = _keyed_prompt(prompt, context), None
+                sent = contents + "".join(t.text for t in turns or [])
+                est_tokens = estimate_tokens(sent, model)
+                req = _request(model, contents, temperature, response_schema, None,
+                               max_output_tokens, thinking_budget(agent, model), turns)
+                continue
+            kind, delay = _backoff_after_failure(model, e, budget, tracker)
+            log.warning("%s call failed (%s, attempt %d/%d): %s", provider.name,
+                        kind.value, attempt, budget.max_attempts, e)
+            if kind is ErrorKind.fatal:
+                raise
+            if delay is None:
+                raise _RetriesExhausted(
+                    f"{provider.name} call failed after {attempt} attempts") from e
+            if delay:
+                await asyncio.sleep(delay)
+
+
+async def acomplete_text(
+    model: str,
+    prompt: str,
+    *,
+    temperature: float = 0.2,
+    tracker: CostTracker | None = None,
+    context: SharedContext | None = None,
+    agent: str | None = None,
+    near_dup: NearDupKey | None = None,
+) -> str:
+    """Coroutine twin of `complete_text`.
+
+    At most LLM_ASYNC_CONCURRENCY[model] calls per model are in flight on a
+    loop at once; backoff between attempts yields to the loop.
+    """
+    if tracker is None:
+        tracker = CURRENT_TRACKER
+    provider, model, context = _routed(agent, model, context)
+    key = cache_key(model, _keyed_prompt(prompt, context), temperature=temperature)
+
+    async def run() -> str:
+        cache = _get_cache()
+        cached = _cache_lookup_text(cache, key, model, tracker)
+        if cached is not None:
+            return cached
+        if near_dup is not None:
+            reused = await asyncio.to_thread(near_dup_lookup, model, prompt, near_dup,
+                                             tracker=tracker, agent=agent)
+            if reused is not None:
+                return reused
+        text = await _ahedged(agent, model, provider, context, tracker,
+                              lambda m, p, c: _agenerate(m, prompt, temperature=temperature,
+                                                         tracker=tracker, context=c,
+                                                         provider=p, agent=agent))
+        if cache is not None:
+            cache.put(key, {"model": model, "text": text})
+        if near_dup is not None:
+            near_dup_store(near_dup, text)
+        return text
+
+    return await _asingle_flight(key, model, tracker, run)
+
+
+async def acomplete_json(
     model: str,
     prompt: str,
     schema: type[BaseModel],
     *,
     temperature: float = 0.2,
     tracker: CostTracker | None = None,
+    context: SharedContext | None = None,
+    agent: str | None = None,
 ) -> BaseModel:
-    """Completion that must return JSON matching the given Pydantic schema.
+    """Coroutine twin of `complete_json`; same retries, caching, routing,
+    wire schemas and accounting."""
+    if tracker is None:
+        tracker = CURRENT_TRACKER
+    wire = _wire_schema(agent, schema)
+    if wire is not None:
+        result = await acomplete_json(model, prompt, wire, temperature=temperature,
+                                      tracker=tracker, context=context, agent=agent)
+        return _from_wire(result, agent, tracker)
+    decision = _choose_model(agent, model, prompt, context, tracker)
+    if decision is None:
+        return await _acomplete_json(model, prompt, schema, temperature=temperature,
+                                     tracker=tracker, context=context, agent=agent)
+
+    async def run_on(chosen: str, max_attempts: int = LLM_MAX_ATTEMPTS) -> BaseModel:
+        return await _acomplete_json(chosen, prompt, schema, temperature=temperature,
+                                     tracker=tracker, context=_retarget(context, chosen),
+                                     agent=agent, max_attempts=max_attempts)
+
+    token = _ROUTE_ID.set(decision.id)
+    start = time.monotonic()
+    try:
+        if not decision.cascade:
+            return await run_on(decision.chosen)
+        try:
+            return await run_on(decision.chosen, _fast_attempts(decision))
+        except Exception as e:  # noqa: BLE001
+            if not _is_validation_failure(e):
+                raise
+            _note_escalation(decision)
+        return await run_on(decision.requested)
+    finally:
+        decision.elapsed_s = time.monotonic() - start
+        _ROUTE_ID.reset(token)
+
+
+async def _acomplete_json(
+    model: str,
+    prompt: str,
+    schema: type[BaseModel],
+    *,
+    temperature: float,
+    tracker: CostTracker | None,
+    context: SharedContext | None,
+    agent: str | None,
+    max_attempts: int = LLM_MAX_ATTEMPTS,
+) -> BaseModel:
+    provider, model, context = _routed(agent, model, context)
+    json_schema = schema.model_json_schema()
+    key = cache_key(model, _keyed_prompt(prompt, context), temperature=temperature,
+                    schema=json_schema)
+
+    async def run() -> BaseModel:
+        cache = _get_cache()
+        cached = _cache_lookup_json(cache, key, model, schema, tracker)
+        if cached is not None:
+            return cached
+        response_schema, schema_hint, hint_tokens = _schema_delivery(schema, json_schema)
+        augmented = prompt + schema_hint
+        max_output = _max_output_tokens(schema)
+        last_exc: Exception | None = None
+        reask: FieldReask | None = None
+        reasked = False
+        followup: list[Turn] | None = None
+        raw = ""
+        budget = _new_budget(max_attempts)
+        while True:
+            try:
+                if reask is not None:
+                    reasked = True
+                    reply = await _agenerate(model, reask.prompt(prompt),
+                                             temperature=temperature, tracker=tracker,
+                                             context=context, provider=provider,
+                                             budget=budget, agent=agent,
+                                             max_output_tokens=max_output, retry=True)
+                    result = _merge_field_reask(reask, reply, tracker)
+                elif followup is not None:
+                    raw = await _agenerate(model, augmented, temperature=temperature,
+                                           tracker=tracker,
+                                           response_schema=response_schema,
+                                           context=context, provider=provider,
+                                           budget=budget, agent=agent,
+                                           max_output_tokens=max_output,
+                                           turns=followup, retry=True)
+                    result = _parse_json(raw, schema, tracker)
+                else:
+                    raw = await _ahedged(
+                        agent, model, provider, context, tracker,
+                        lambda m, p, c: _agenerate(m, augmented, temperature=temperature,
+                                                   tracker=tracker,
+                                                   response_schema=response_schema,
+                                                   context=c, provider=p,
+                                                   budget=budget, agent=agent,
+                                                   max_output_tokens=max_output,
+                                                   retry=last_exc is not None),
+                        accept=lambda text: _validates(text, schema))
+                    if hint_tokens and tracker is not None:
+                        tracker.record_schema_tokens_saved(hint_tokens)
+                    result = _parse_json(raw, schema, tracker)
+                if cache is not None:
+                    cache.put(key, {"model": model, "schema": schema.__name__,
+                                    "text": result.model_dump_json()})
+                return result
+            except Exception as e:  # noqa: BLE001
+                last_exc = e
+                if isinstance(e, CostExceeded):
+                    raise
+                if isinstance(e, _RetriesExhausted):
+                    break
+                kind, delay = _backoff_after_failure(model, e, budget, tracker)
+                log.warning("acomplete_json failed (%s, attempt %d/%d): %s",
+                            kind.value, budget.attempts, budget.max_attempts, e)
+                if delay is None:
+                    break
+                if delay:
+                    await asyncio.sleep(delay)
+                # A failed field re-ask keeps the follow-up built for the last
+                # full response, `raw`, with that response's own error.
+                failed_reask = reask is not None
+                reask = None if reasked else _plan_field_reask(raw, schema, e)
+                if failed_reask or not isinstance(e, ValueError):
+                    continue
+                if LLM_CHAT_RETRY:
+                    followup = _retry_turns(raw, e) or followup
+                else:
+                    augmented = _retry_prompt(prompt, schema_hint, e)
+        raise RuntimeError(
+            f"complete_json failed after {budget.attempts} attempts") from last_exc
+
+    return await _asingle_flight(key, model, tracker, run)
 
-    On parse/validation failure, retries up to LLM_MAX_ATTEMPTS with a reminder appended.
-    Raises on persistent failure.
+
+def batch_executor(*, tracker: CostTracker | None = None,
+                   backend: Any = None) -> BatchExecutor:
+    """A BatchExecutor wired to this module's cache and cost accounting.
+
+    Usage:
+        with llm.batch_executor() as batch:
+            futures = [batch.submit_text(MODEL_FAST, p) for p in prompts]
+        texts = [f.result() for f in futures]
     """
     if tracker is None:
         tracker = CURRENT_TRACKER
-    schema_hint = (
+    if backend is None:
+        backend = (LocalFileBatchBackend(LLM_BATCH_DIR) if LLM_BATCH_BACKEND == "local"
+                   else GeminiBatchBackend(lambda: _get_client()))
+    cache = _get_cache()
+
+    def _key(req: BatchRequest) -> str:
+        return cache_key(req.model, req.prompt, temperature=req.temperature,
+                         schema=req.json_schema)
+
+    def lookup(req: BatchRequest) -> str | None:
+        hit = cache.get(_key(req)) if cache is not None else None
+        if tracker is not None and cache is not None:
+            if hit is not None:
+                tracker.record_cache_hit(req.model)
+            else:
+                tracker.record_cache_miss()
+        return hit["text"] if hit is not None else None
+
+    def before_submit(model: str, requests: list[BatchRequest]) -> None:
+        if tracker is not None:
+            _check_batch_budget(tracker, model, requests)
+
+    def on_result(req: BatchRequest, result: BatchResult) -> None:
+        if cache is not None:
+            cache.put(_key(req), {"model": req.model, "text": result.text})
+        if tracker is not None:
+            tracker.record(GeminiCall(req.model, result.prompt_tokens,
+                                      result.output_tokens, batch=True,
+                                      thinking_tokens=result.thinking_tokens))
+            check_cost_budget(tracker, soft_warning=COST_SOFT_WARNING,
+                              hard_abort=COST_HARD_ABORT)
+
+    return BatchExecutor(backend=backend, lookup=lookup, before_submit=before_submit,
+                         on_result=on_result,
+                         parse=lambda text, schema: _parse_json(text, schema, tracker),
+                         poll_interval_s=LLM_BATCH_POLL_S)
+
+
+def _check_batch_budget(tracker: CostTracker, model: str,
+                        requests: list[BatchRequest]) -> None:
+    """Refuse a batch job whose prompts alone would take the run past the hard
+    abort threshold. Output tokens are unknown until the job returns, so the
+    estimate is a floor; `on_result` checks again with the billed usage."""
+    estimate = _BATCH_PRICE_FACTOR * sum(
+        estimate_cost_usd(model, estimate_tokens(r.prompt, model), 0) for r in requests)
+    projected = tracker.total_cost_usd + estimate
+    if projected > COST_HARD_ABORT:
+        raise CostExceeded(
+            f"Batch of {len(requests)} {model} requests (~${estimate:.2f}) would take "
+            f"run cost to ${projected:.2f}, over hard abort threshold ${COST_HARD_ABORT:.2f}"
+        )
+    check_cost_budget(tracker, soft_warning=COST_SOFT_WARNING, hard_abort=COST_HARD_ABORT)
+
+
+def _schema_hint(json_schema: dict[str, Any]) -> str:
+    return (
         "\n\nRespond ONLY with valid JSON. No markdown fences. "
         "The JSON MUST validate against this schema:\n"
-        f"{json.dumps(schema.model_json_schema(), indent=2)}"
+        f"{json.dumps(json_schema, indent=2)}"
+    )
+
+
+def _retry_message(error: Exception) -> str:
+    return (
+        "Your previous response failed validation with these errors:\n"
+        + f"{error}\n\n"
+        + "Fix ONLY these specific issues and respond with strictly valid JSON."
     )
-    augmented = prompt + schema_hint
-    last_exc: Exception | None = None
-    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+
+
+def _retry_prompt(prompt: str, schema_hint: str, error: Exception) -> str:
+    return prompt + schema_hint + "\n\n" + _retry_message(error)
+
+
+def _retry_turns(raw: str, error: Exception) -> list[Turn] | None:
+    """The follow-up for a conversational re-ask: the rejected response and
+    what was wrong with it. None when there is no response to follow up on."""
+    if not raw.strip():
+        return None
+    return [Turn("model", raw), Turn("user", _retry_message(error))]
+
+
+def _validates(raw: str, schema: type[BaseModel]) -> bool:
+    try:
+        schema.model_validate(json.loads(_strip_code_fences(raw)))
+    except ValueError:
+        return False
+    return True
+
+
+def _plan_field_reask(raw: str, schema: type[BaseModel],
+                      exc: Exception) -> FieldReask | None:
+    """A re-ask of just the invalid sub-objects of `raw`, when that is possible."""
+    if not LLM_FIELD_REASK or not isinstance(exc, ValidationError):
+        return None
+    try:
+        data = json.loads(_strip_code_fences(raw))
+    except ValueError:
+        return None
+    reask = field_reask(data, schema, exc, LLM_FIELD_REASK_MAX_PATHS)
+    if reask is not None:
+        log.info("Re-asking %s for %s only", schema.__name__, ", ".join(reask.paths))
+    return reask
+
+
+def _merge_field_reask(reask: FieldReask, reply: str,
+                       tracker: CostTracker | None) -> BaseModel:
+    try:
+        result = reask.merge(json.loads(_strip_code_fences(reply)))
+    except ValueError:
+        if tracker is not None:
+            tracker.record_field_reask(reask.schema.__name__, reask.paths, ok=False)
+        raise
+    if tracker is not None:
+        tracker.record_field_reask(reask.schema.__name__, reask.paths, ok=True)
+    return result
+
+
+def _parse_json(raw: str, schema: type[BaseModel],
+                tracker: CostTracker | None = None) -> BaseModel:
+    """Parse and validate `raw`; on failure try a local repair (tools/json_repair.py)
+    before giving up. Raises the original error when the repair fails too, so
+    the re-ask prompt carries what the model actually got wrong."""
+    try:
+        data: Any = json.loads(_strip_code_fences(raw))
+        return schema.model_validate(data)
+    except ValueError as e:
+        if not LLM_JSON_REPAIR:
+            raise
         try:
-            raw = complete_text(model, augmented, temperature=temperature, tracker=tracker)
-            cleaned = _strip_code_fences(raw)
-            data: Any = json.loads(cleaned)
-            return schema.model_validate(data)
-        except Exception as e:  # noqa: BLE001
-            last_exc = e
-            log.warning("complete_json failed (attempt %d/%d): %s",
-                        attempt, LLM_MAX_ATTEMPTS, e)
-            augmented = (
-                prompt + schema_hint
-                + "\n\nYour previous response failed validation with these errors:\n"
-                + f"{e}\n\n"
-                + "Fix ONLY these specific issues and respond with strictly valid JSON."
-            )
-    raise RuntimeError(f"complete_json failed after {LLM_MAX_ATTEMPTS} attempts") from last_exc
+            result, repairs = repair_json(raw, schema)
+        except RepairFailed as repair_err:
+            log.info("Local JSON repair failed for %s: %s", schema.__name__, repair_err)
+            if tracker is not None:
+                tracker.record_json_repair_failed()
+            raise e
+        log.info("Repaired %s locally: %s", schema.__name__,
+                 ", ".join(f"{r.action}@{r.path}" if r.path else r.action for r in repairs))
+        if tracker is not None:
+            tracker.record_json_repairs(schema.__name__, repairs)
+        return result
 
 
 def _strip_code_fences(text: str) -> str:
@@ -0,0 +1,306 @@
+"""Batch-job execution for non-interactive LLM work.
+
+`BatchExecutor` collects many text / JSON requests, submits them as one job
+per model, polls until the job finishes and resolves a `Future` per request.
+Batch jobs trade latency (minutes to hours) for discounted pricing, so this
+suits overnight runs, not interactive ones.
+
+Backends:
+- `GeminiBatchBackend` — Gemini Batch API with inlined requests.
+- `LocalFileBatchBackend` — writes `requests.jsonl` under a directory and
+  reads `responses.jsonl` back; an optional `worker` fills in responses,
+  standing in for the remote service in tests.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Protocol
+
+from google.genai import types as genai_types
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchRequest:
+    key: str
+    model: str
+    prompt: str
+    temperature: float = 0.2
+    json_schema: dict[str, Any] | None = None
+    thinking_budget: int | None = None
+
+
+@dataclass
+class BatchResult:
+    key: str
+    text: str = ""
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    thinking_tokens: int = 0
+    error: str | None = None
+
+
+class BatchJobFailed(RuntimeError):
+    pass
+
+
+class BatchBackend(Protocol):
+    def submit(self, model: str, requests: list[BatchRequest]) -> str:
+        """Submit one job; return its id."""
+
+    def poll(self, job_id: str) -> list[BatchResult] | None:
+        """Return results once the job is done, None while it is running.
+
+        Raises BatchJobFailed when the job as a whole failed.
+        """
+
+
+_TERMINAL_FAILURES = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+class GeminiBatchBackend:
+    def __init__(self, client_factory: Callable[[], Any]) -> None:
+        self._client_factory = client_factory
+        self._keys: dict[str, list[str]] = {}
+
+    def submit(self, model: str, requests: list[BatchRequest]) -> str:
+        inlined = []
+        for r in requests:
+            config: dict[str, Any] = {"temperature": r.temperature}
+            if r.json_schema is not None:
+                config["response_mime_type"] = "application/json"
+                config["response_json_schema"] = r.json_schema
+            if r.thinking_budget is not None:
+                config["thinking_config"] = {"thinking_budget": r.thinking_budget}
+            inlined.append(genai_types.InlinedRequest(
+                contents=r.prompt, config=config, metadata={"key": r.key},
+            ))
+        job = self._client_factory().batches.create(
+            model=model, src=inlined,
+            config={"display_name": f"kelp-teaser-{uuid.uuid4().hex[:8]}"},
+        )
+        self._keys[job.name] = [r.key for r in requests]
+        return job.name
+
+    def poll(self, job_id: str) -> list[BatchResult] | None:
+        job = self._client_factory().batches.get(name=job_id)
+        state = getattr(job.state, "name", str(job.state))
+        if state in _TERMINAL_FAILURES:
+            raise BatchJobFailed(f"batch job {job_id} ended in {state}: {job.error}")
+        if state not in ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"):
+            return None
+        responses = job.dest.inlined_responses if job.dest else None
+        results: list[BatchResult] = []
+        for key, item in zip(self._keys.pop(job_id, []), responses or []):
+            if item.error is not None or item.response is None:
+                results.append(BatchResult(key=key, error=str(item.error)))
+                continue
+            usage = item.response.usage_metadata
+            results.append(BatchResult(
+                key=key,
+                text=item.response.text or "",
+                prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+                output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+                thinking_tokens=getattr(usage, "thoughts_token_count", 0) or 0,
+            ))
+        return results
+
+
+@dataclass
+class LocalFileBatchBackend:
+    """File-based stand-in for a batch service.
+
+    `submit` writes `<root>/<job_id>/requests.jsonl`. `poll` returns None
+    until `responses.jsonl` exists next to it; if a `worker` is given, the
+    first poll runs it over every request and writes that file itself.
+    """
+
+    root: Path
+    worker: Callable[[BatchRequest], str] | None = None
+
+    def submit(self, model: str, requests: list[BatchRequest]) -> str:
+        job_id = f"local-{uuid.uuid4().hex[:12]}"
+        job_dir = self.root / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        with (job_dir / "requests.jsonl").open("w", encoding="utf-8") as fh:
+            for r in requests:
+                fh.write(json.dumps(asdict(r), ensure_ascii=False) + "\n")
+        return job_id
+
+    def poll(self, job_id: str) -> list[BatchResult] | None:
+        job_dir = self.root / job_id
+        out = job_dir / "responses.jsonl"
+        if not out.exists() and self.worker is not None:
+            self._run_worker(job_dir)
+        if not out.exists():
+            return None
+        return [BatchResult(**json.loads(line))
+                for line in out.read_text(encoding="utf-8").splitlines() if line]
+
+    def _run_worker(self, job_dir: Path) -> None:
+        assert self.worker is not None
+        lines = (job_dir / "requests.jsonl").read_text(encoding="utf-8").splitlines()
+        results: list[BatchResult] = []
+        for line in lines:
+            req = BatchRequest(**json.loads(line))
+            try:
+                text = self.worker(req)
+                results.append(BatchResult(key=req.key, text=text,
+                                           prompt_tokens=len(req.prompt) // 4,
+                                           output_tokens=len(text) // 4))
+            except Exception as e:  # noqa: BLE001 - per-request failure
+                results.append(BatchResult(key=req.key, error=str(e)))
+        tmp = job_dir / "responses.jsonl.tmp"
+        tmp.write_text("".join(json.dumps(asdict(r)) + "\n" for r in results),
+                       encoding="utf-8")
+        tmp.replace(job_dir / "responses.jsonl")
+
+
+@dataclass
+class _Pending:
+    request: BatchRequest
+    future: Future
+    schema: type[BaseModel] | None = None
+
+
+def _parse_json(text: str, schema: type[BaseModel]) -> BaseModel:
+    return schema.model_validate_json(text)
+
+
+@dataclass
+class BatchExecutor:
+    """Queue requests, then `run()` (or leave the `with` block) to execute them.
+
+    Hooks (all optional):
+    - `lookup(request)` returns a stored response text to resolve a request
+      without submitting it (e.g. the on-disk response cache);
+    - `before_submit(model, requests)` runs before each job is submitted and
+      may raise to veto it (e.g. the run's cost cap); the job's futures then
+      fail with that error;
+    - `on_result(request, result)` sees every completed request, so the
+      caller can charge the tracker and populate caches; if it raises, the
+      request's future fails with that error;
+    - `parse(text, schema)` turns a JSON response into the schema instance.
+    JSON requests that come back invalid resolve with the validation error.
+    """
+
+    backend: BatchBackend
+    lookup: Callable[[BatchRequest], str | None] | None = None
+    before_submit: Callable[[str, list[BatchRequest]], None] | None = None
+    on_result: Callable[[BatchRequest, BatchResult], None] | None = None
+    parse: Callable[[str, type[BaseModel]], BaseModel] = _parse_json
+    poll_interval_s: float = 30.0
+    max_wait_s: float = 24 * 3600
+    sleep: Callable[[float], None] = time.sleep
+    _pending: list[_Pending] = field(default_factory=list, repr=False)
+
+    def __enter__(self) -> "BatchExecutor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.run()
+
+    def submit_text(self, model: str, prompt: str, *,
+                    temperature: float = 0.2,
+                    thinking_budget: int | None = None) -> Future:
+        return self._enqueue(BatchRequest(key=uuid.uuid4().hex, model=model,
+                                          prompt=prompt, temperature=temperature,
+                                          thinking_budget=thinking_budget))
+
+    def submit_json(self, model: str, prompt: str, schema: type[BaseModel], *,
+                    temperature: float = 0.2) -> Future:
+        req = BatchRequest(key=uuid.uuid4().hex, model=model, prompt=prompt,
+                           temperature=temperature,
+                           json_schema=schema.model_json_schema())
+        return self._enqueue(req, schema)
+
+    def _enqueue(self, request: BatchRequest,
+                 schema: type[BaseModel] | None = None) -> Future:
+        fut: Future = Future()
+        stored = self.lookup(request) if self.lookup is not None else None
+        if stored is not None:
+            self._set_from_text(fut, stored, schema)
+        else:
+            self._pending.append(_Pending(request, fut, schema))
+        return fut
+
+    def run(self) -> None:
+        """Submit everything queued (one job per model) and resolve futures."""
+        pending, self._pending = self._pending, []
+        by_model: dict[str, list[_Pending]] = {}
+        for p in pending:
+            by_model.setdefault(p.request.model, []).append(p)
+
+        jobs: dict[str, tuple[str, dict[str, _Pending]]] = {}
+        for model, items in sorted(by_model.items()):
+            requests = [p.request for p in items]
+            try:
+                if self.before_submit is not None:
+                    self.before_submit(model, requests)
+                job_id = self.backend.submit(model, requests)
+            except Exception as e:  # noqa: BLE001
+                for p in items:
+                    p.future.set_exception(e)
+                continue
+            log.info("Submitted batch job %s: %d %s requests", job_id, len(items), model)
+            jobs[job_id] = (model, {p.request.key: p for p in items})
+
+        deadline = time.monotonic() + self.max_wait_s
+        while jobs:
+            for job_id in list(jobs):
+                model, items = jobs[job_id]
+                try:
+                    results = self.backend.poll(job_id)
+                except Exception as e:  # noqa: BLE001 - whole job failed
+                    for p in items.values():
+                        p.future.set_exception(e)
+                    del jobs[job_id]
+                    continue
+                if results is None:
+                    continue
+                for result in results:
+                    p = items.pop(result.key, None)
+                    if p is not None:
+                        self._resolve(p, result)
+                for p in items.values():
+                    p.future.set_exception(BatchJobFailed(
+                        f"batch job {job_id} returned no result for {p.request.key}"))
+                del jobs[job_id]
+            if jobs:
+                if time.monotonic() > deadline:
+                    for _, items in jobs.values():
+                        for p in items.values():
+                            p.future.set_exception(TimeoutError("batch job timed out"))
+                    return
+                self.sleep(self.poll_interval_s)
+
+    def _resolve(self, p: _Pending, result: BatchResult) -> None:
+        if result.error is not None:
+            p.future.set_exception(BatchJobFailed(result.error))
+            return
+        if self.on_result is not None:
+            try:
+                self.on_result(p.request, result)
+            except Exception as e:  # noqa: BLE001
+                p.future.set_exception(e)
+                return
+        self._set_from_text(p.future, result.text, p.schema)
+
+    def _set_from_text(self, fut: Future, text: str,
+                       schema: type[BaseModel] | None) -> None:
+        if schema is None:
+            fut.set_result(text)
+            return
+        try:
+            fut.set_result(self.parse(text, schema))
+        except Exception as e:  # noqa: BLE001
+            fut.set_exception(e)
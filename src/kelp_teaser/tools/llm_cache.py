@@ -0,0 +1,188 @@
+"""Content-addressed on-disk cache for LLM responses.
+
+Entries live at `<cache_dir>/<sha[:2]>/<sha>.json`, where `sha` hashes the
+model, full rendered prompt, temperature and target schema. A hit refreshes
+the file's mtime, so eviction by oldest mtime is LRU. Entries older than the
+TTL are treated as misses and removed.
+
+The cache keeps a running byte total, so a write only scans the directory
+when it pushes the total over `max_bytes`; eviction then goes down to a
+low-water mark so the next few writes do not scan again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+# Bump when the entry layout changes so stale entries are never misread.
+_CACHE_FORMAT_VERSION = 1
+# Eviction frees space down to this share of max_bytes.
+_LOW_WATER = 0.9
+
+
+def cache_key(model: str, prompt: str, *, temperature: float,
+              schema: dict[str, Any] | None = None) -> str:
+    """Stable sha256 over everything that determines the model's answer."""
+    payload = json.dumps(
+        {
+            "v": _CACHE_FORMAT_VERSION,
+            "model": model,
+            "prompt": prompt,
+            "temperature": round(float(temperature), 4),
+            "schema": schema,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+@dataclass
+class CacheStats:
+    entries: int
+    total_bytes: int
+    oldest_s: float | None
+    newest_s: float | None
+
+
+class ResponseCache:
+    """Size-bounded LRU response store with a TTL.
+
+    Safe to share across threads. Concurrent processes may race on the same
+    entry, but writes are atomic (temp file + rename) so readers never see a
+    partial entry.
+    """
+
+    def __init__(self, cache_dir: Path, *, max_bytes: int, ttl_s: float) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # Bytes on disk as this process sees it; None until the first scan.
+        # Other processes sharing the directory make it drift, so every
+        # eviction scan resets it.
+        self._total: int | None = None
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        path = self._path_for(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning("LLM cache entry %s unreadable, dropping: %s", path.name, e)
+            self._drop(path)
+            return None
+        if time.time() - entry.get("created_at", 0) > self.ttl_s:
+            self._drop(path)
+            return None
+        try:
+            os.utime(path)  # LRU touch
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, entry: dict[str, Any]) -> None:
+        path = self._path_for(key)
+        payload = {**entry, "created_at": time.time()}
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            added = tmp.stat().st_size
+            replaced = _size(path)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning("LLM cache write failed for %s: %s", path.name, e)
+            tmp.unlink(missing_ok=True)
+            return
+        with self._lock:
+            if self._total is not None:
+                self._total += added - replaced
+        self._evict_over_size()
+
+    def _drop(self, path: Path) -> None:
+        size = _size(path)
+        path.unlink(missing_ok=True)
+        with self._lock:
+            if self._total is not None:
+                self._total = max(0, self._total - size)
+
+    def _entries(self) -> list[tuple[Path, os.stat_result]]:
+        out: list[tuple[Path, os.stat_result]] = []
+        if not self.cache_dir.exists():
+            return out
+        for p in self.cache_dir.glob("*/*.json"):
+            try:
+                out.append((p, p.stat()))
+            except FileNotFoundError:
+                continue
+        return out
+
+    def _evict_over_size(self) -> None:
+        with self._lock:
+            if self._total is not None and self._total <= self.max_bytes:
+                return
+            entries = self._entries()
+            total = sum(st.st_size for _, st in entries)
+            if total > self.max_bytes:
+                target = int(self.max_bytes * _LOW_WATER)
+                for p, st in sorted(entries, key=lambda e: e[1].st_mtime):
+                    p.unlink(missing_ok=True)
+                    total -= st.st_size
+                    if total <= target:
+                        break
+            self._total = total
+
+    def prune(self, *, clear: bool = False) -> int:
+        """Drop expired entries (or everything when `clear`), then enforce size.
+
+        Returns the number of entries removed.
+        """
+        removed = 0
+        now = time.time()
+        for p, _ in self._entries():
+            expired = clear
+            if not expired:
+                try:
+                    created = json.loads(p.read_text(encoding="utf-8")).get("created_at", 0)
+                    expired = now - created > self.ttl_s
+                except (OSError, ValueError):
+                    expired = True
+            if expired:
+                p.unlink(missing_ok=True)
+                removed += 1
+        with self._lock:
+            self._total = None
+        before = len(self._entries())
+        self._evict_over_size()
+        return removed + before - len(self._entries())
+
+    def stats(self) -> CacheStats:
+        entries = self._entries()
+        mtimes = [st.st_mtime for _, st in entries]
+        return CacheStats(
+            entries=len(entries),
+            total_bytes=sum(st.st_size for _, st in entries),
+            oldest_s=min(mtimes) if mtimes else None,
+            newest_s=max(mtimes) if mtimes else None,
+        )
@@ -0,0 +1,271 @@
+"""LLM provider backends behind `tools.llm`.
+
+`tools.llm` owns caching, retries, rate limiting and cost tracking; a provider
+only turns one `LLMRequest` into one `Completion` (or a stream of them).
+
+- `GeminiProvider` — google-genai client; supports context caching, batch
+  jobs and native response schemas.
+- `OpenAICompatProvider` — any OpenAI-compatible `/chat/completions` server
+  (vLLM, llama.cpp server, Ollama, ...), e.g. a local CPU box for throughput
+  tests and air-gapped runs. Structured output goes out as
+  `response_format: json_schema`.
+
+Which provider serves which agent is configured in `config.LLM_AGENT_PROVIDERS`.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Protocol
+
+import requests
+from google.genai import types as genai_types
+
+log = logging.getLogger(__name__)
+
+
+class SafetyBlocked(RuntimeError):
+    """The provider refused the prompt or withheld the response on safety grounds."""
+
+
+@dataclass
+class Usage:
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    # Reasoning tokens, billed as output but not part of output_tokens.
+    thinking_tokens: int = 0
+
+
+@dataclass
+class Turn:
+    """One chat message after the request's first user message."""
+
+    role: str  # "user" | "model"
+    text: str
+
+
+@dataclass
+class LLMRequest:
+    model: str
+    # The first user message; `turns` continue the conversation from it.
+    contents: str
+    temperature: float
+    # Gemini-native schema and the plain JSON Schema it was derived from;
+    # both None when the schema travels as a prompt hint instead.
+    response_schema: genai_types.Schema | None = None
+    json_schema: dict[str, Any] | None = None
+    cached_content: str | None = None
+    max_output_tokens: int | None = None
+    # Gemini thinking budget in tokens: 0 off, -1 dynamic, None model default.
+    thinking_budget: int | None = None
+    turns: list[Turn] = field(default_factory=list)
+
+
+@dataclass
+class Completion:
+    """A response, or one streamed delta of it. `usage` is None when the
+    backend has not reported token counts (yet)."""
+
+    text: str
+    usage: Usage | None = None
+
+
+class LLMProvider(Protocol):
+    name: str
+    supports_context_cache: bool
+    supports_batch: bool
+
+    def model_for(self, model: str) -> str:
+        """Map a configured model id (MODEL_FAST / MODEL_SMART) to this backend's."""
+
+    def generate(self, req: LLMRequest) -> Completion: ...
+
+    async def agenerate(self, req: LLMRequest) -> Completion: ...
+
+    def stream(self, req: LLMRequest) -> Iterator[Completion]: ...
+
+
+def _gemini_usage(usage: Any) -> Usage | None:
+    if usage is None:
+        return None
+    return Usage(
+        prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+        output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        cached_tokens=getattr(usage, "cached_content_token_count", 0) or 0,
+        thinking_tokens=getattr(usage, "thoughts_token_count", 0) or 0,
+    )
+
+
+_GEMINI_BLOCK_REASONS = {"SAFETY", "PROHIBITED_CONTENT", "BLOCKLIST", "SPII",
+                         "IMAGE_SAFETY"}
+
+
+def _gemini_check_blocked(resp: Any) -> None:
+    """Raise SafetyBlocked for a blocked prompt or a safety-stopped, empty answer."""
+    reason = getattr(getattr(resp, "prompt_feedback", None), "block_reason", None)
+    if reason:
+        raise SafetyBlocked(f"prompt blocked: {getattr(reason, 'name', reason)}")
+    candidates = getattr(resp, "candidates", None) or []
+    if candidates and not resp.text:
+        finish = getattr(candidates[0], "finish_reason", None)
+        name = getattr(finish, "name", str(finish))
+        if name in _GEMINI_BLOCK_REASONS:
+            raise SafetyBlocked(f"response blocked: {name}")
+
+
+class GeminiProvider:
+    name = "gemini"
+    supports_context_cache = True
+    supports_batch = True
+
+    def __init__(self, client_factory: Callable[[], Any]) -> None:
+        self._client_factory = client_factory
+
+    def model_for(self, model: str) -> str:
+        return model
+
+    @staticmethod
+    def _config(req: LLMRequest) -> genai_types.GenerateContentConfig:
+        kwargs: dict[str, Any] = {"temperature": req.temperature}
+        if req.response_schema is not None:
+            kwargs["response_mime_type"] = "application/json"
+            kwargs["response_schema"] = req.response_schema
+        if req.cached_content is not None:
+            kwargs["cached_content"] = req.cached_content
+        if req.max_output_tokens is not None:
+            kwargs["max_output_tokens"] = req.max_output_tokens
+        if req.thinking_budget is not None:
+            kwargs["thinking_config"] = genai_types.ThinkingConfig(
+                thinking_budget=req.thinking_budget)
+        return genai_types.GenerateContentConfig(**kwargs)
+
+    @staticmethod
+    def _contents(req: LLMRequest) -> Any:
+        if not req.turns:
+            return req.contents
+        return [genai_types.Content(role=role, parts=[genai_types.Part(text=text)])
+                for role, text in [("user", req.contents),
+                                   *((t.role, t.text) for t in req.turns)]]
+
+    def generate(self, req: LLMRequest) -> Completion:
+        resp = self._client_factory().models.generate_content(
+            model=req.model, contents=self._contents(req), config=self._config(req),
+        )
+        _gemini_check_blocked(resp)
+        return Completion(resp.text or "",
+                          _gemini_usage(getattr(resp, "usage_metadata", None)))
+
+    async def agenerate(self, req: LLMRequest) -> Completion:
+        resp = await self._client_factory().aio.models.generate_content(
+            model=req.model, contents=self._contents(req), config=self._config(req),
+        )
+        _gemini_check_blocked(resp)
+        return Completion(resp.text or "",
+                          _gemini_usage(getattr(resp, "usage_metadata", None)))
+
+    def stream(self, req: LLMRequest) -> Iterator[Completion]:
+        chunks = self._client_factory().models.generate_content_stream(
+            model=req.model, contents=self._contents(req), config=self._config(req),
+        )
+        for chunk in chunks:
+            yield Completion(chunk.text or "",
+                             _gemini_usage(getattr(chunk, "usage_metadata", None)))
+
+
+class OpenAICompatProvider:
+    """Chat-completions over plain HTTP. No context caching or batch jobs:
+    shared contexts are inlined and batch mode falls back to direct calls."""
+
+    name = "openai"
+    supports_context_cache = False
+    supports_batch = False
+
+    def __init__(self, base_url: str, *, api_key: str | None = None,
+                 models: dict[str, str] | None = None,
+                 default_model: str | None = None,
+                 timeout_s: float = 120.0,
+                 post: Callable[..., Any] = requests.post) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.models = models or {}
+        self.default_model = default_model
+        self.timeout_s = timeout_s
+        self._post = post
+
+    def model_for(self, model: str) -> str:
+        return self.models.get(model) or self.default_model or model
+
+    def _payload(self, req: LLMRequest, *, stream: bool) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "model": req.model,
+            "messages": [{"role": "user", "content": req.contents}] + [
+                {"role": "assistant" if t.role == "model" else "user", "content": t.text}
+                for t in req.turns],
+            "temperature": req.temperature,
+        }
+        if req.max_output_tokens is not None:
+            payload["max_tokens"] = req.max_output_tokens
+        if req.json_schema is not None:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": req.json_schema.get("title", "response"),
+                                "schema": req.json_schema},
+            }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _request(self, req: LLMRequest, *, stream: bool) -> Any:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        resp = self._post(f"{self.base_url}/chat/completions",
+                          json=self._payload(req, stream=stream), headers=headers,
+                          timeout=self.timeout_s, stream=stream)
+        resp.raise_for_status()
+        return resp
+
+    @staticmethod
+    def _usage(body: dict[str, Any]) -> Usage | None:
+        usage = body.get("usage")
+        if not usage:
+            return None
+        details = usage.get("prompt_tokens_details") or {}
+        # Reasoning models count their reasoning inside completion_tokens.
+        reasoning = (usage.get("completion_tokens_details") or {}).get(
+            "reasoning_tokens", 0) or 0
+        return Usage(prompt_tokens=usage.get("prompt_tokens", 0) or 0,
+                     output_tokens=(usage.get("completion_tokens", 0) or 0) - reasoning,
+                     cached_tokens=details.get("cached_tokens", 0) or 0,
+                     thinking_tokens=reasoning)
+
+    def generate(self, req: LLMRequest) -> Completion:
+        body = self._request(req, stream=False).json()
+        choices = body.get("choices") or []
+        if choices and choices[0].get("finish_reason") == "content_filter":
+            raise SafetyBlocked("response blocked: content_filter")
+        text = (choices[0].get("message") or {}).get("content") if choices else None
+        return Completion(text or "", self._usage(body))
+
+    async def agenerate(self, req: LLMRequest) -> Completion:
+        return await asyncio.to_thread(self.generate, req)
+
+    def stream(self, req: LLMRequest) -> Iterator[Completion]:
+        resp = self._request(req, stream=True)
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                body = json.loads(data)
+                choices = body.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                yield Completion(delta or "", self._usage(body))
+        finally:
+            resp.close()
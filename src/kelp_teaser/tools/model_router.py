@@ -0,0 +1,93 @@
+"""Per-call Flash/Pro choice for agents that default to MODEL_SMART.
+
+`ModelRouter.choose` looks at the estimated prompt size, what the run has
+spent so far, and the agent's `RoutePolicy`, and returns a
+`RoutingDecision`. A decision with `cascade=True` means "try the fast model
+first and escalate to the requested one only if its output fails schema
+validation"; `tools.llm` runs the cascade and fills in the outcome.
+
+Decisions land in `CostTracker.summary()["routing"]` (and so in trace.json)
+with their cost and wall time.
+"""
+from __future__ import annotations
+
+import itertools
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Callable
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    # Prompts at or under this many estimated tokens start on the fast model.
+    small_prompt_tokens: int = 0
+    # Start every call on the fast model, whatever its size.
+    cascade: bool = False
+    # complete_json attempts on the fast model before escalating.
+    fast_attempts: int = 1
+
+
+@dataclass
+class RoutingDecision:
+    id: int
+    agent: str
+    requested: str
+    chosen: str
+    reason: str
+    prompt_tokens: int
+    cascade: bool = False
+    escalated: bool = False
+    elapsed_s: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        out = asdict(self)
+        out["elapsed_s"] = round(self.elapsed_s, 3)
+        return out
+
+
+class ModelRouter:
+    """Chooses between `fast` and `smart` for agents listed in `policies`.
+
+    `cost_fn(model, prompt_tokens, output_tokens)` prices a prospective call;
+    `expected_output_tokens` is the output assumed when projecting the cost
+    of a smart call against the hard budget.
+    """
+
+    def __init__(self, policies: dict[str, RoutePolicy], *, fast: str, smart: str,
+                 soft_budget_usd: float, hard_budget_usd: float,
+                 cost_fn: Callable[[str, int, int], float],
+                 expected_output_tokens: int = 2000) -> None:
+        self.policies = policies
+        self.fast = fast
+        self.smart = smart
+        self.soft_budget_usd = soft_budget_usd
+        self.hard_budget_usd = hard_budget_usd
+        self.cost_fn = cost_fn
+        self.expected_output_tokens = expected_output_tokens
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def choose(self, agent: str | None, model: str, prompt_tokens: int,
+               spent_usd: float) -> RoutingDecision | None:
+        """None when the call is not routed (unknown agent, or not a smart call)."""
+        policy = self.policies.get(agent or "")
+        if policy is None or model != self.smart or self.fast == self.smart:
+            return None
+
+        def decide(chosen: str, reason: str, cascade: bool = False) -> RoutingDecision:
+            with self._lock:
+                rid = next(self._ids)
+            return RoutingDecision(id=rid, agent=agent or "", requested=model,
+                                   chosen=chosen, reason=reason,
+                                   prompt_tokens=prompt_tokens, cascade=cascade)
+
+        if spent_usd >= self.soft_budget_usd:
+            return decide(self.fast, "over_soft_budget")
+        projected = self.cost_fn(self.smart, prompt_tokens, self.expected_output_tokens)
+        if spent_usd + projected >= self.hard_budget_usd:
+            return decide(self.fast, "budget_headroom")
+        if prompt_tokens <= policy.small_prompt_tokens:
+            return decide(self.fast, "small_prompt", cascade=True)
+        if policy.cascade:
+            return decide(self.fast, "cascade", cascade=True)
+        return decide(self.smart, "default")
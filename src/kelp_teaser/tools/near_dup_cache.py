@@ -0,0 +1,198 @@
+"""Near-duplicate response cache keyed by MinHash fingerprints.
+
+The exact response cache (tools/llm_cache.py) misses whenever one byte of
+the prompt changes. Tavily returns the same article with a slightly
+different `content` excerpt from query to query and run to run, so the
+Researcher would pay for a fresh summary of a page it has already
+summarized. This cache stores a response together with a MinHash
+signature of the text it was derived from. A later lookup with a
+near-identical text, i.e. one whose estimated Jaccard similarity over
+word 5-shingles is at least the threshold, gets the stored response back.
+
+Entries are grouped by `scope`: only texts whose prompts are otherwise
+identical (same model, template and company) may share a response. Each
+scope is one JSON-lines file under the cache directory. Lookups go
+through an LSH band index, so they cost the same however many entries
+there are.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+_SHINGLE_WORDS = 5
+_PRIME = (1 << 61) - 1
+_WORD = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class NearDupKey:
+    """What a response is keyed on: a scope that must match exactly, and the
+    text that only needs to match approximately."""
+
+    scope: str
+    text: str
+
+
+def _shingles(text: str) -> set[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= _SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + _SHINGLE_WORDS])
+            for i in range(len(words) - _SHINGLE_WORDS + 1)}
+
+
+class MinHasher:
+    """MinHash signatures over word 5-shingles; `num_perm` hash functions
+    of the form (a*x + b) mod p, fixed by `seed`."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1) -> None:
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self._coeffs = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+                        for _ in range(num_perm)]
+
+    def signature(self, text: str) -> list[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(),
+                                 "big")
+                  for s in _shingles(text)]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._coeffs]
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+@dataclass
+class _Scope:
+    entries: list[tuple[list[int], str]] = field(default_factory=list)
+    bands: dict[tuple[int, tuple[int, ...]], list[int]] = field(default_factory=dict)
+
+
+class NearDupCache:
+    """Response store looked up by approximate text match within a scope.
+
+    Safe to share across threads. Files are append-only; expired and
+    surplus entries are dropped when a scope is next loaded.
+    """
+
+    def __init__(self, cache_dir: Path, *, threshold: float, ttl_s: float,
+                 max_entries: int = 2000, hasher: MinHasher | None = None,
+                 bands: int = 16) -> None:
+        self.cache_dir = cache_dir
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"num_perm {self.hasher.num_perm} not divisible by {bands} bands")
+        self.rows = self.hasher.num_perm // bands
+        self._scopes: dict[str, _Scope] = {}
+        self._lock = threading.Lock()
+
+    def _path_for(self, scope: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(scope.encode('utf-8')).hexdigest()[:32]}.jsonl"
+
+    def _band_keys(self, sig: list[int]) -> list[tuple[int, tuple[int, ...]]]:
+        return [(i, tuple(sig[i * self.rows:(i + 1) * self.rows]))
+                for i in range(len(sig) // self.rows)]
+
+    def _index(self, scope: _Scope, sig: list[int], value: str) -> None:
+        scope.entries.append((sig, value))
+        for band in self._band_keys(sig):
+            scope.bands.setdefault(band, []).append(len(scope.entries) - 1)
+
+    def _load(self, key: str) -> _Scope:
+        scope = self._scopes.get(key)
+        if scope is not None:
+            return scope
+        scope = self._scopes[key] = _Scope()
+        path = self._path_for(key)
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return scope
+        except OSError as e:
+            log.warning("Near-duplicate cache %s unreadable: %s", path.name, e)
+            return scope
+        now = time.time()
+        kept: list[str] = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if now - entry.get("created_at", 0) > self.ttl_s:
+                continue
+            if len(entry.get("sig", ())) != self.hasher.num_perm:
+                continue
+            kept.append(line)
+        kept = kept[-self.max_entries:]
+        for line in kept:
+            entry = json.loads(line)
+            self._index(scope, entry["sig"], entry["value"])
+        if len(kept) != len(lines):
+            try:
+                path.write_text("".join(f"{line}\n" for line in kept), encoding="utf-8")
+            except OSError as e:
+                log.warning("Near-duplicate cache %s not compacted: %s", path.name, e)
+        return scope
+
+    def get(self, key: NearDupKey) -> tuple[str, float] | None:
+        """The stored response for the most similar text in `key.scope`, and
+        that similarity, if it reaches the threshold."""
+        sig = self.hasher.signature(key.text)
+        with self._lock:
+            scope = self._load(key.scope)
+            candidates = {i for band in self._band_keys(sig)
+                          for i in scope.bands.get(band, ())}
+            best: tuple[str, float] | None = None
+            for i in candidates:
+                stored, value = scope.entries[i]
+                sim = similarity(sig, stored)
+                if sim >= self.threshold and (best is None or sim > best[1]):
+                    best = (value, sim)
+        return best
+
+    def put(self, key: NearDupKey, value: str) -> None:
+        sig = self.hasher.signature(key.text)
+        line = json.dumps({"sig": sig, "value": value, "created_at": time.time()},
+                          ensure_ascii=False)
+        with self._lock:
+            self._index(self._load(key.scope), sig, value)
+            path = self._path_for(key.scope)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with path.open("a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                log.warning("Near-duplicate cache write failed for %s: %s", path.name, e)
+
+
+def group_near_duplicates(texts: list[str], threshold: float,
+                          hasher: MinHasher | None = None) -> list[int]:
+    """For each text, the index of the first earlier text it nearly
+    duplicates (itself if none): one representative per group."""
+    hasher = hasher or MinHasher()
+    sigs = [hasher.signature(t) for t in texts]
+    leaders: list[int] = []
+    out: list[int] = []
+    for i, sig in enumerate(sigs):
+        match = next((j for j in leaders if similarity(sig, sigs[j]) >= threshold), None)
+        if match is None:
+            leaders.append(i)
+            match = i
+        out.append(match)
+    return out
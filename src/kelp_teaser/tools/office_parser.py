@@ -0,0 +1,60 @@
+"""Word and PowerPoint text extraction (python-docx, python-pptx)."""
+from __future__ import annotations
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import docx
+from docx.table import Table
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+# Bump when the extracted text changes, so cached parses are redone
+# (tools/doc_cache.py).
+PARSER_VERSION = 1
+
+
+def _row_lines(rows: Iterator[list[str]]) -> list[str]:
+    out: list[str] = []
+    for cells in rows:
+        cells = [" ".join(c.split()) for c in cells]
+        if any(cells):
+            out.append(" | ".join(cells))
+    return out
+
+
+def extract_docx(path: Path) -> str:
+    """Paragraphs and tables in document order; table rows as " | " lines."""
+    document = docx.Document(str(path))
+    parts: list[str] = []
+    for block in document.iter_inner_content():
+        if isinstance(block, Table):
+            parts.extend(_row_lines([cell.text for cell in row.cells]
+                                    for row in block.rows))
+        elif block.text.strip():
+            parts.append(block.text.strip())
+    return "\n".join(parts)
+
+
+def _shape_lines(shape) -> list[str]:
+    if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+        return [line for s in shape.shapes for line in _shape_lines(s)]
+    if shape.has_table:
+        return _row_lines([cell.text for cell in row.cells] for row in shape.table.rows)
+    if shape.has_text_frame:
+        return [p.strip() for p in shape.text_frame.text.splitlines() if p.strip()]
+    return []
+
+
+def extract_pptx(path: Path) -> tuple[str, int]:
+    """Text of every slide under a "[Slide n]" header, and the slide count.
+    Slides without text are left out."""
+    presentation = Presentation(str(path))
+    parts: list[str] = []
+    for i, slide in enumerate(presentation.slides, start=1):
+        lines = [line for shape in slide.shapes for line in _shape_lines(shape)]
+        if lines:
+            parts.append(f"[Slide {i}]")
+            parts.extend(lines)
+            parts.append("")
+    return "\n".join(parts), len(presentation.slides)
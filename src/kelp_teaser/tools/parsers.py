@@ -0,0 +1,262 @@
+"""Parser registry: sniffed MIME type -> ordered parsing strategies.
+
+A file's type comes from its leading bytes, not its name: "%PDF-" is a PDF,
+a zip holding word/document.xml is a Word file whatever its suffix. Only
+plain-text formats, which have no signature, fall back to the suffix.
+
+Each type lists strategies to try in order, cheap local extractors before
+cloud parsers. A strategy may carry a quality check; when its output fails
+the check (or is empty, or the strategy raises) the next one runs. PDFs
+are read from their text layer with pypdf and only go to LlamaParse when
+that text is too sparse or too garbled to use. If no strategy passes, the
+longest output any of them produced is kept.
+
+`parse_file` takes a path string and returns a picklable `ParseOutcome`,
+so the Ingestor can run it in a process pool.
+"""
+from __future__ import annotations
+
+import logging
+import mimetypes
+import re
+import time
+import unicodedata
+import zipfile
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from kelp_teaser.config import (
+    EXCEL_MAX_CELLS,
+    EXCEL_MAX_ROWS,
+    EXCEL_SUMMARY,
+    EXCEL_SUMMARY_ROWS,
+    PDF_LOCAL_ENABLED,
+    PDF_LOCAL_MAX_GARBAGE,
+    PDF_LOCAL_MIN_CHARS_PER_PAGE,
+)
+from kelp_teaser.tools import excel_parser, office_parser, pdf_parser
+from kelp_teaser.tools.doc_cache import ParserId
+from kelp_teaser.tools.excel_parser import (
+    flatten_csv,
+    flatten_legacy_workbook,
+    flatten_workbook,
+)
+from kelp_teaser.tools.office_parser import extract_docx, extract_pptx
+from kelp_teaser.tools.pdf_parser import extract_text_layer, parse_pdf
+
+log = logging.getLogger(__name__)
+
+PDF = "application/pdf"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PPTX = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLS = "application/vnd.ms-excel"
+CSV = "text/csv"
+MARKDOWN = "text/markdown"
+PLAIN = "text/plain"
+
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# Office Open XML types by the part that only that format contains.
+_ZIP_PARTS = (("word/document.xml", DOCX), ("ppt/presentation.xml", PPTX),
+              ("xl/workbook.xml", XLSX))
+_PAGE_MARKER = re.compile(r"^\[Page \d+\]$", re.MULTILINE)
+_SUFFIX_TYPES = {".md": MARKDOWN, ".txt": PLAIN, ".csv": CSV, ".xls": XLS,
+                 ".xlsx": XLSX, ".pdf": PDF, ".docx": DOCX, ".pptx": PPTX}
+
+
+@dataclass
+class Extraction:
+    text: str
+    pages: int = 0  # pages or slides, for formats that have them
+
+
+@dataclass(frozen=True)
+class Strategy:
+    name: str
+    extract: Callable[[Path], Extraction]
+    version: int = 1
+    options: Mapping[str, Any] = field(default_factory=dict)
+    # Why the output is too poor to keep, or None when it is usable.
+    check: Callable[[Extraction], str | None] | None = None
+
+
+@dataclass(frozen=True)
+class FileType:
+    mime: str
+    kind: str  # short label for logs and the trace
+    strategies: tuple[Strategy, ...]
+    # Where the Ingestor runs it: "process" (CPU-bound), "thread" (waits on
+    # a cloud parser) or "inline".
+    pool: str = "inline"
+    # Whether parses are worth a parsed-doc cache entry.
+    cached: bool = True
+
+    @property
+    def parser_id(self) -> ParserId:
+        return ParserId(self.mime, 1, {s.name: {"version": s.version, **s.options}
+                                       for s in self.strategies})
+
+
+@dataclass
+class ParseOutcome:
+    text: str = ""
+    strategy: str = ""
+    # True when the kept text passed its strategy's check; False for a
+    # best-effort fallback, which is not worth caching.
+    accepted: bool = False
+    attempts: list[dict] = field(default_factory=list)
+    seconds: float = 0.0
+    error: str | None = None
+
+
+REGISTRY: dict[str, FileType] = {}
+
+
+def register(file_type: FileType) -> None:
+    """Add or replace the strategies for `file_type.mime`."""
+    REGISTRY[file_type.mime] = file_type
+
+
+def sniff_mime(path: Path) -> str | None:
+    """The file's MIME type from its signature, else from its suffix."""
+    try:
+        with path.open("rb") as f:
+            head = f.read(8)
+    except OSError:
+        return None
+    if head.startswith(b"%PDF-"):
+        return PDF
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(path) as z:
+                names = set(z.namelist())
+        except (zipfile.BadZipFile, OSError):
+            return "application/zip"
+        return next((mime for part, mime in _ZIP_PARTS if part in names),
+                    "application/zip")
+    if head.startswith(_OLE_MAGIC):
+        # Legacy Office container; only workbooks are supported.
+        return XLS if path.suffix.lower() == ".xls" else "application/x-ole-storage"
+    suffix = path.suffix.lower()
+    return _SUFFIX_TYPES.get(suffix) or mimetypes.guess_type(path.name)[0]
+
+
+def file_type(path: Path) -> FileType | None:
+    mime = sniff_mime(path)
+    return REGISTRY.get(mime) if mime else None
+
+
+def parse_file(path: str) -> ParseOutcome:
+    """Run the file's strategies in order until one's output passes.
+
+    Runs in worker processes: errors are recorded in the outcome, not raised.
+    """
+    start = time.monotonic()
+    f = Path(path)
+    ft = file_type(f)
+    if ft is None:
+        return ParseOutcome(error=f"unsupported type {sniff_mime(f)}")
+    out = ParseOutcome()
+    for strategy in ft.strategies:
+        t0 = time.monotonic()
+        attempt: dict[str, Any] = {"strategy": strategy.name}
+        out.attempts.append(attempt)
+        try:
+            ex = strategy.extract(f)
+        except Exception as e:  # noqa: BLE001
+            attempt.update(seconds=round(time.monotonic() - t0, 3),
+                           error=f"{type(e).__name__}: {e}")
+            out.error = attempt["error"]
+            continue
+        attempt.update(seconds=round(time.monotonic() - t0, 3), chars=len(ex.text))
+        poor = "empty" if not ex.text.strip() else (
+            strategy.check(ex) if strategy.check else None)
+        if poor is None:
+            out.text, out.strategy, out.accepted, out.error = ex.text, strategy.name, True, None
+            break
+        attempt["rejected"] = poor
+        if len(ex.text.strip()) > len(out.text.strip()):
+            out.text, out.strategy = ex.text, strategy.name
+    if out.text:
+        out.error = None
+    out.seconds = time.monotonic() - start
+    return out
+
+
+def garbage_ratio(text: str) -> float:
+    """Share of non-space characters that are unprintable, U+FFFD, private
+    use or unassigned: what a text layer with a broken font encoding yields."""
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    bad = sum(c == "\ufffd" or unicodedata.category(c) in ("Cc", "Cf", "Co", "Cs", "Cn")
+              for c in chars)
+    return bad / len(chars)
+
+
+def pdf_text_quality(ex: Extraction) -> str | None:
+    """Why a PDF text layer should go to LlamaParse instead, if it should."""
+    per_page = len("".join(_PAGE_MARKER.sub("", ex.text).split())) / max(ex.pages, 1)
+    if per_page < PDF_LOCAL_MIN_CHARS_PER_PAGE:
+        return f"{per_page:.0f} chars/page < {PDF_LOCAL_MIN_CHARS_PER_PAGE:g}"
+    garbage = garbage_ratio(ex.text)
+    if garbage > PDF_LOCAL_MAX_GARBAGE:
+        return f"garbage ratio {garbage:.2f} > {PDF_LOCAL_MAX_GARBAGE:g}"
+    return None
+
+
+def _read_text(path: Path) -> Extraction:
+    try:
+        return Extraction(path.read_text(encoding="utf-8"))
+    except UnicodeDecodeError:
+        return Extraction(path.read_text(encoding="latin-1", errors="replace"))
+
+
+def _pdf_text_layer(path: Path) -> Extraction:
+    pages = extract_text_layer(path)
+    text = "\n".join(f"[Page {i}]\n{t.strip()}\n"
+                     for i, t in enumerate(pages, start=1) if t.strip())
+    return Extraction(text, pages=len(pages))
+
+
+def _pptx(path: Path) -> Extraction:
+    text, slides = extract_pptx(path)
+    return Extraction(text, pages=slides)
+
+
+def _register_defaults() -> None:
+    text = Strategy("text", _read_text)
+    for mime in (MARKDOWN, PLAIN):
+        register(FileType(mime, "text", (text,), cached=False))
+    register(FileType(CSV, "csv", (Strategy("csv", lambda p: Extraction(flatten_csv(p)),
+                                            excel_parser.CSV_PARSER_VERSION,
+                                            {"max_rows": EXCEL_MAX_ROWS,
+                                             "max_cells": EXCEL_MAX_CELLS}),),
+                      cached=False))
+    workbook = Strategy("openpyxl-stream", lambda p: Extraction(flatten_workbook(str(p))),
+                        excel_parser.PARSER_VERSION,
+                        {"max_rows": EXCEL_MAX_ROWS, "max_cells": EXCEL_MAX_CELLS,
+                         "summary": EXCEL_SUMMARY, "summary_rows": EXCEL_SUMMARY_ROWS})
+    register(FileType(XLSX, "excel", (workbook,), pool="process"))
+    register(FileType(XLS, "excel", (Strategy(
+        "pandas", lambda p: Extraction(flatten_legacy_workbook(str(p))),
+        excel_parser.XLS_PARSER_VERSION),), pool="process"))
+    register(FileType(DOCX, "docx", (Strategy("python-docx",
+                                              lambda p: Extraction(extract_docx(p)),
+                                              office_parser.PARSER_VERSION),)))
+    register(FileType(PPTX, "pptx", (Strategy("python-pptx", _pptx,
+                                              office_parser.PARSER_VERSION),)))
+    pdf: list[Strategy] = []
+    if PDF_LOCAL_ENABLED:
+        pdf.append(Strategy("pypdf", _pdf_text_layer, pdf_parser.TEXT_LAYER_VERSION,
+                            {"min_chars_per_page": PDF_LOCAL_MIN_CHARS_PER_PAGE,
+                             "max_garbage": PDF_LOCAL_MAX_GARBAGE},
+                            check=pdf_text_quality))
+    pdf.append(Strategy("llamaparse", lambda p: Extraction(parse_pdf(p)),
+                        pdf_parser.PARSER_VERSION, {"result_type": pdf_parser.RESULT_TYPE}))
+    register(FileType(PDF, "pdf", tuple(pdf), pool="thread"))
+
+
+_register_defaults()
@@ -1,15 +1,28 @@
-"""LlamaParse wrapper for PDF ingestion."""
+"""PDF ingestion: the local text layer (pypdf) and LlamaParse."""
 from __future__ import annotations
 
 import logging
 from pathlib import Path
 
 from llama_parse import LlamaParse
+from pypdf import PdfReader
 
 from kelp_teaser.config import LLAMA_CLOUD_API_KEY
 
 log = logging.getLogger(__name__)
 
+# Bump when the parse output changes, so cached parses are redone
+# (tools/doc_cache.py). Cache keys include RESULT_TYPE too.
+PARSER_VERSION = 1
+RESULT_TYPE = "markdown"
+TEXT_LAYER_VERSION = 1
+
+
+def extract_text_layer(file_path: Path) -> list[str]:
+    """Each page's embedded text. No OCR: scanned pages come back empty."""
+    reader = PdfReader(str(file_path))
+    return [page.extract_text() or "" for page in reader.pages]
+
 
 def parse_pdf(file_path: Path) -> str:
     """Parse a PDF file into markdown text. Returns empty string on failure (logged)."""
@@ -19,7 +32,7 @@ def parse_pdf(file_path: Path) -> str:
     try:
         parser = LlamaParse(
             api_key=LLAMA_CLOUD_API_KEY,
-            result_type="markdown",
+            result_type=RESULT_TYPE,
             verbose=False,
         )
         docs = parser.load_data(str(file_path))
@@ -1,31 +1,169 @@
-"""Load Jinja2-templated Markdown prompts from the prompts/ directory."""
+"""Load Jinja2-templated Markdown prompts from the prompts/ directory.
+
+Templates are compiled once per process by a `PromptRegistry` (one per
+prompts directory) and served from memory. An entry is recompiled when
+its file's mtime or size changes, so prompt edits take effect without a
+restart during development.
+
+`check_prompts()` runs at startup. It compiles every template and
+compares each one's variables with `PROMPT_VARIABLES`, the names its
+agent passes to `render()`, so a missing template, a syntax error or a
+variable no caller supplies fails before the first LLM call, not mid-run.
+"""
 from __future__ import annotations
 
+import logging
+import threading
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
 from pathlib import Path
 
-from jinja2 import Environment, StrictUndefined
+from jinja2 import Environment, StrictUndefined, TemplateSyntaxError, meta, nodes
 
 from kelp_teaser.config import PROMPTS_DIR as _DEFAULT_PROMPTS_DIR
+from kelp_teaser.tools.token_budget import TokenEstimator
+
+log = logging.getLogger(__name__)
 
 PROMPTS_DIR: Path = _DEFAULT_PROMPTS_DIR
 
+# The variables each agent passes to its prompt's render().
+PROMPT_VARIABLES: dict[str, frozenset[str]] = {
+    "anonymizer": frozenset({"real_name", "codename", "original_text"}),
+    "chart_designer": frozenset({"chart_kind", "heading", "data_hooks"}),
+    "composer": frozenset({"slide_index", "slide_title", "codename",
+                           "section_plans_json"}),
+    "critic": frozenset({"codename", "real_name", "sector", "composed_slides_json",
+                         "source_ids_json"}),
+    "image_curator": frozenset({"image_brief", "sector"}),
+    "planner": frozenset({"sector", "sub_sector", "brief"}),
+    "sector_classifier": frozenset({"brief"}),
+}
+
+_ESTIMATOR = TokenEstimator()
+
 
 class PromptNotFoundError(FileNotFoundError):
     pass
 
 
+class PromptError(ValueError):
+    """A template that does not compile or does not match its callers."""
+
+
 class Prompt:
-    def __init__(self, name: str, template_text: str) -> None:
+    def __init__(self, name: str, template_text: str,
+                 env: Environment | None = None) -> None:
         self.name = name
-        env = Environment(undefined=StrictUndefined, autoescape=False)
-        self._template = env.from_string(template_text)
+        env = env or _environment()
+        try:
+            ast = env.parse(template_text)
+        except TemplateSyntaxError as e:
+            raise PromptError(f"prompt {name}: line {e.lineno}: {e.message}") from e
+        self._template = env.from_string(ast)
+        # Names the template reads from the render() context.
+        self.variables: frozenset[str] = frozenset(meta.find_undeclared_variables(ast))
+        # Estimated tokens of the fixed text around the variables.
+        static = "".join(n.data for n in ast.find_all(nodes.TemplateData))
+        self.static_tokens: int = _ESTIMATOR.estimate(static)
 
     def render(self, **kwargs: object) -> str:
+        missing = self.variables - kwargs.keys()
+        if missing:
+            raise PromptError(
+                f"prompt {self.name}: missing variables {', '.join(sorted(missing))}")
         return self._template.render(**kwargs)
 
 
+def _environment() -> Environment:
+    return Environment(undefined=StrictUndefined, autoescape=False)
+
+
+@dataclass
+class _Entry:
+    stamp: tuple[int, int]  # (mtime_ns, size) of the compiled file
+    prompt: Prompt
+
+
+class PromptRegistry:
+    """Compiled prompts of one directory, recompiled when a file changes."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._env = _environment()
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Prompt:
+        path = self.directory / f"{name}.md"
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            raise PromptNotFoundError(f"prompt not found: {path}") from None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.stamp == stamp:
+                return entry.prompt
+        prompt = Prompt(name, path.read_text(encoding="utf-8"), self._env)
+        if entry is not None:
+            log.info("Reloaded prompt %s", name)
+        with self._lock:
+            self._entries[name] = _Entry(stamp, prompt)
+        return prompt
+
+    def load_all(self) -> dict[str, Prompt]:
+        """Compile every template in the directory."""
+        return {path.stem: self.get(path.stem)
+                for path in sorted(self.directory.glob("*.md"))}
+
+    def check(self, expected: Mapping[str, Iterable[str]]) -> dict[str, Prompt]:
+        """Compile every template and check it against `expected` (prompt
+        name -> variables its caller supplies). Raises PromptError listing
+        every problem found."""
+        problems: list[str] = []
+        prompts: dict[str, Prompt] = {}
+        for path in sorted(self.directory.glob("*.md")):
+            try:
+                prompts[path.stem] = self.get(path.stem)
+            except PromptError as e:
+                problems.append(str(e))
+        for name, supplied in expected.items():
+            prompt = prompts.get(name)
+            if prompt is None:
+                if not (self.directory / f"{name}.md").exists():
+                    problems.append(f"prompt {name}: no {name}.md in {self.directory}")
+                continue
+            undefined = prompt.variables - frozenset(supplied)
+            if undefined:
+                problems.append(f"prompt {name}: undefined variables "
+                                f"{', '.join(sorted(undefined))}")
+        if problems:
+            raise PromptError("; ".join(problems))
+        return prompts
+
+
+_REGISTRIES: dict[Path, PromptRegistry] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+def registry(directory: Path | None = None) -> PromptRegistry:
+    """The process-wide registry for `directory` (default PROMPTS_DIR)."""
+    directory = directory or PROMPTS_DIR
+    with _REGISTRIES_LOCK:
+        reg = _REGISTRIES.get(directory)
+        if reg is None:
+            reg = _REGISTRIES[directory] = PromptRegistry(directory)
+        return reg
+
+
 def load_prompt(name: str) -> Prompt:
-    path = PROMPTS_DIR / f"{name}.md"
-    if not path.exists():
-        raise PromptNotFoundError(f"prompt not found: {path}")
-    return Prompt(name=name, template_text=path.read_text(encoding="utf-8"))
+    return registry().get(name)
+
+
+def check_prompts() -> dict[str, Prompt]:
+    """Compile all prompts and verify their variables. Called at startup."""
+    prompts = registry().check(PROMPT_VARIABLES)
+    log.info("Compiled %d prompts (%s)", len(prompts), ", ".join(
+        f"{name}: ~{p.static_tokens} static tokens" for name, p in prompts.items()))
+    return prompts
@@ -0,0 +1,157 @@
+"""Process-wide token-bucket limiter for per-model RPM / TPM budgets.
+
+Each model gets two buckets that refill continuously: one counting requests
+per minute, one counting (estimated) prompt tokens per minute. A call is
+admitted only when both buckets can cover it; otherwise the caller waits for
+the refill instead of provoking a 429. Server retry hints pause a model's
+buckets outright.
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+@dataclass
+class _Bucket:
+    capacity: float
+    refill_per_s: float
+    level: float
+    updated: float
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity,
+                         self.level + (now - self.updated) * self.refill_per_s)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0.0 if it already is)."""
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_s
+
+
+@dataclass
+class _ModelState:
+    requests: _Bucket
+    tokens: _Bucket
+    paused_until: float = 0.0
+    waits: int = 0
+    waited_s: float = 0.0
+
+
+@dataclass
+class RateLimiter:
+    """Admit calls per model against `limits[model] = (rpm, tpm)`.
+
+    Models absent from `limits` are never throttled. `clock` and `sleep` are
+    injectable for tests.
+    """
+
+    limits: dict[str, tuple[int, int]]
+    clock: Callable[[], float] = time.monotonic
+    sleep: Callable[[float], None] = time.sleep
+    _states: dict[str, _ModelState] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def _state(self, model: str) -> _ModelState | None:
+        state = self._states.get(model)
+        if state is None and model in self.limits:
+            rpm, tpm = self.limits[model]
+            now = self.clock()
+            state = _ModelState(
+                requests=_Bucket(rpm, rpm / 60.0, rpm, now),
+                tokens=_Bucket(tpm, tpm / 60.0, tpm, now),
+            )
+            self._states[model] = state
+        return state
+
+    def _try_reserve(self, model: str, tokens: int) -> float:
+        """Reserve capacity and return 0.0, or return the seconds to wait."""
+        with self._lock:
+            state = self._state(model)
+            if state is None:
+                return 0.0
+            now = self.clock()
+            if now < state.paused_until:
+                return state.paused_until - now
+            state.requests.refill(now)
+            state.tokens.refill(now)
+            # A single prompt larger than the whole TPM budget can never fit;
+            # admit it against a full bucket rather than deadlock.
+            need = min(float(tokens), state.tokens.capacity)
+            wait = max(state.requests.wait_for(1.0), state.tokens.wait_for(need))
+            if wait > 0:
+                return wait
+            state.requests.level -= 1.0
+            state.tokens.level -= need
+            return 0.0
+
+    def _note_wait(self, model: str, waited: float) -> None:
+        if waited <= 0:
+            return
+        with self._lock:
+            state = self._states.get(model)
+            if state is not None:
+                state.waits += 1
+                state.waited_s += waited
+
+    def acquire(self, model: str, tokens: int) -> float:
+        """Block until the call fits the model's budget. Returns seconds waited."""
+        waited = 0.0
+        while (wait := self._try_reserve(model, tokens)) > 0:
+            self.sleep(wait)
+            waited += wait
+        self._note_wait(model, waited)
+        return waited
+
+    async def aacquire(self, model: str, tokens: int) -> float:
+        """`acquire` for coroutines: waits on the event loop, not the thread."""
+        waited = 0.0
+        while (wait := self._try_reserve(model, tokens)) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+        self._note_wait(model, waited)
+        return waited
+
+    def reconcile(self, model: str, estimated: int, actual: int) -> None:
+        """Correct the token bucket once the real prompt size is known."""
+        if not actual:
+            return
+        with self._lock:
+            state = self._states.get(model)
+            if state is not None:
+                state.tokens.level = min(state.tokens.capacity,
+                                         state.tokens.level + estimated - actual)
+
+    def pause(self, model: str, seconds: float) -> None:
+        """Hold every call to `model` for `seconds` (server retry hint)."""
+        with self._lock:
+            state = self._state(model)
+            if state is not None:
+                state.paused_until = max(state.paused_until, self.clock() + seconds)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {m: {"waits": s.waits, "waited_s": round(s.waited_s, 3)}
+                    for m, s in self._states.items()}
+
+
+_RETRY_HINT_PATTERNS = (
+    re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s"),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+)
+
+
+def retry_after_s(exc: BaseException) -> float | None:
+    """Extract a server-suggested retry delay from a 429 error, if present."""
+    text = str(exc)
+    for pattern in _RETRY_HINT_PATTERNS:
+        m = pattern.search(text)
+        if m:
+            return float(m.group(1))
+    return None
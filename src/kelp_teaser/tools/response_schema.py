@@ -0,0 +1,106 @@
+"""Convert Pydantic models into Gemini `response_schema` objects.
+
+Gemini's structured-output mode accepts an OpenAPI-style subset of JSON
+Schema: no `$ref`, no free-form maps, no `const` / `allOf`. `to_response_schema`
+inlines definitions and translates what it can; for anything outside the
+subset it returns None so callers fall back to the inline text hint.
+"""
+from __future__ import annotations
+
+import functools
+import logging
+from typing import Any
+
+from google.genai import types as genai_types
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+# JSON Schema keys copied through unchanged (Gemini spells them identically).
+_PASSTHROUGH_KEYS = (
+    "description", "enum", "minItems", "maxItems", "minLength", "maxLength",
+    "minimum", "maximum", "pattern",
+)
+# Keys with no structured-output equivalent: the schema can't be expressed.
+_UNSUPPORTED_KEYS = ("const", "allOf", "oneOf", "not", "prefixItems",
+                     "patternProperties", "if")
+
+
+class UnexpressibleSchema(ValueError):
+    """The Pydantic schema uses constructs Gemini structured output lacks."""
+
+
+@functools.lru_cache(maxsize=None)
+def to_response_schema(schema: type[BaseModel]) -> genai_types.Schema | None:
+    """Return the Gemini schema for `schema`, or None if it can't be expressed.
+
+    Cached per class: conversion runs once per process, not once per call.
+    """
+    json_schema = schema.model_json_schema()
+    try:
+        converted = _convert(json_schema, json_schema.get("$defs", {}), frozenset())
+        return genai_types.Schema.model_validate(converted)
+    except (UnexpressibleSchema, ValueError) as e:
+        log.info("Schema %s not expressible as response_schema (%s); "
+                 "using inline schema hint", schema.__name__, e)
+        return None
+
+
+def _convert(node: dict[str, Any], defs: dict[str, Any],
+             seen: frozenset[str]) -> dict[str, Any]:
+    for key in _UNSUPPORTED_KEYS:
+        if key in node:
+            raise UnexpressibleSchema(f"unsupported keyword {key!r}")
+
+    if "$ref" in node:
+        name = node["$ref"].rsplit("/", 1)[-1]
+        if name in seen:
+            raise UnexpressibleSchema(f"recursive reference to {name!r}")
+        if name not in defs:
+            raise UnexpressibleSchema(f"dangling reference {node['$ref']!r}")
+        out = _convert(defs[name], defs, seen | {name})
+        if "description" in node:
+            out["description"] = node["description"]
+        return out
+
+    if "anyOf" in node:
+        variants = [v for v in node["anyOf"] if v.get("type") != "null"]
+        nullable = len(variants) < len(node["anyOf"])
+        if len(variants) == 1:
+            out = _convert(variants[0], defs, seen)
+        else:
+            out = {"anyOf": [_convert(v, defs, seen) for v in variants]}
+        if nullable:
+            out["nullable"] = True
+        if "description" in node:
+            out["description"] = node["description"]
+        return out
+
+    out: dict[str, Any] = {}
+    json_type = node.get("type")
+    if isinstance(json_type, list):
+        raise UnexpressibleSchema(f"multi-type node {json_type!r}")
+    if json_type is not None:
+        out["type"] = json_type.upper()
+    for key in _PASSTHROUGH_KEYS:
+        if key in node:
+            out[key] = node[key]
+
+    if json_type == "object":
+        extra = node.get("additionalProperties")
+        if extra not in (None, False):
+            raise UnexpressibleSchema("free-form object (additionalProperties)")
+        props = node.get("properties", {})
+        if not props:
+            raise UnexpressibleSchema("object without declared properties")
+        out["properties"] = {k: _convert(v, defs, seen) for k, v in props.items()}
+        out["propertyOrdering"] = list(props)
+        if node.get("required"):
+            out["required"] = list(node["required"])
+    elif json_type == "array":
+        if "items" not in node:
+            raise UnexpressibleSchema("array without items")
+        out["items"] = _convert(node["items"], defs, seen)
+    elif json_type is None and "enum" not in node:
+        raise UnexpressibleSchema("untyped node")
+    return out
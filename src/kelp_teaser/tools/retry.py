@@ -0,0 +1,140 @@
+"""One retry budget per logical LLM request, with an error taxonomy.
+
+Every provider call made for one `complete_text` / `complete_json` request —
+transport retries and validation re-asks alike — draws on the same
+`RetryBudget`: a total attempt count plus optional cost and wall-time caps.
+Each failure is classified (`classify`), and its kind decides whether and
+after how long to retry:
+
+- transport  — network errors, 5xx, timeouts: exponential backoff.
+- quota      — 429 / RESOURCE_EXHAUSTED: honour the server's retry hint
+               (the caller pauses the shared rate limiter) or back off longer.
+- safety     — the provider blocked the prompt or response: one immediate
+               resample, no more.
+- validation — the response did not parse or validate: re-ask at once.
+- fatal      — the run's cost cap or this request's budget: never retried.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable
+
+from kelp_teaser.tools.llm_providers import SafetyBlocked
+from kelp_teaser.tools.rate_limit import retry_after_s
+
+
+class ErrorKind(str, Enum):
+    transport = "transport"
+    quota = "quota"
+    safety = "safety"
+    validation = "validation"
+    fatal = "fatal"
+
+
+class RetryBudgetExhausted(RuntimeError):
+    """The request's cost or time cap was reached."""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_retries: int
+    base_s: float = 0.0
+    cap_s: float = 0.0
+
+    def delay_s(self, failures: int) -> float:
+        """Backoff before retry number `failures` (1-based)."""
+        if self.base_s <= 0:
+            return 0.0
+        return min(self.base_s * 2 ** (failures - 1), self.cap_s)
+
+
+DEFAULT_POLICIES: dict[ErrorKind, RetryPolicy] = {
+    ErrorKind.transport: RetryPolicy(max_retries=2, base_s=2.0, cap_s=5.0),
+    ErrorKind.quota: RetryPolicy(max_retries=2, base_s=10.0, cap_s=30.0),
+    ErrorKind.safety: RetryPolicy(max_retries=1),
+    ErrorKind.validation: RetryPolicy(max_retries=2),
+    ErrorKind.fatal: RetryPolicy(max_retries=0),
+}
+
+_QUOTA_MARKERS = ("429", "RESOURCE_EXHAUSTED", "quota", "rate limit")
+
+
+def classify(exc: BaseException, *, fatal: tuple[type[BaseException], ...] = ()) -> ErrorKind:
+    """Map an exception from a provider call or response parse to an ErrorKind.
+
+    `fatal` adds caller-specific exception types that must never be retried.
+    """
+    if isinstance(exc, (RetryBudgetExhausted, *fatal)):
+        return ErrorKind.fatal
+    if isinstance(exc, SafetyBlocked):
+        return ErrorKind.safety
+    if isinstance(exc, ValueError):  # JSONDecodeError, ValidationError, ...
+        return ErrorKind.validation
+    text = str(exc)
+    if retry_after_s(exc) is not None or any(m in text for m in _QUOTA_MARKERS):
+        return ErrorKind.quota
+    return ErrorKind.transport
+
+
+@dataclass
+class RetryBudget:
+    """Attempts, spend and time for one logical request. Thread-safe, so
+    hedged requests can share it."""
+
+    max_attempts: int
+    max_cost_usd: float | None = None
+    max_elapsed_s: float | None = None
+    policies: dict[ErrorKind, RetryPolicy] = field(
+        default_factory=lambda: dict(DEFAULT_POLICIES))
+    clock: Callable[[], float] = time.monotonic
+    attempts: int = 0
+    cost_usd: float = 0.0
+    failures: Counter = field(default_factory=Counter)
+    _started: float | None = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def elapsed_s(self) -> float:
+        return 0.0 if self._started is None else self.clock() - self._started
+
+    def start_attempt(self) -> int:
+        """Count one provider call; returns its 1-based number. Raises
+        RetryBudgetExhausted when the cost or time cap is already reached."""
+        with self._lock:
+            if self._started is None:
+                self._started = self.clock()
+            self._check_caps()
+            self.attempts += 1
+            return self.attempts
+
+    def charge(self, usd: float) -> None:
+        with self._lock:
+            self.cost_usd += usd
+
+    def after_failure(self, kind: ErrorKind) -> float | None:
+        """Record a failure of `kind`; return the seconds to wait before the
+        next attempt, or None when the request must give up."""
+        with self._lock:
+            self.failures[kind] += 1
+            policy = self.policies[kind]
+            if self.failures[kind] > policy.max_retries or self.attempts >= self.max_attempts:
+                return None
+            delay = policy.delay_s(self.failures[kind])
+            try:
+                self._check_caps(extra_s=delay)
+            except RetryBudgetExhausted:
+                return None
+            return delay
+
+    def _check_caps(self, extra_s: float = 0.0) -> None:
+        if self.max_cost_usd is not None and self.cost_usd >= self.max_cost_usd:
+            raise RetryBudgetExhausted(
+                f"request cost ${self.cost_usd:.4f} reached its ${self.max_cost_usd:.2f} cap")
+        if (self.max_elapsed_s is not None and self._started is not None
+                and self.clock() - self._started + extra_s > self.max_elapsed_s):
+            raise RetryBudgetExhausted(
+                f"request ran {self.clock() - self._started:.1f}s of its "
+                f"{self.max_elapsed_s:.0f}s cap")
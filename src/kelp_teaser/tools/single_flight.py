@@ -0,0 +1,101 @@
+"""Coalesce identical concurrent calls into one execution.
+
+The first caller for a key (the leader) runs the work; callers arriving with
+the same key while it is in flight wait for, and share, the leader's result
+or exception. Once the leader finishes the key is forgotten, so later calls
+run again (the response cache, not this module, serves repeats over time).
+
+Threads and coroutines share one table: a coroutine can wait on a thread's
+call and vice versa. A blocking `do` must not wait on a leader running on
+its own thread's event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    exc: BaseException | None = None
+    waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = field(
+        default_factory=list)
+
+
+def _settle(fut: asyncio.Future, result: Any, exc: BaseException | None) -> None:
+    if fut.done():
+        return
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(result)
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: str) -> tuple[_Call, bool]:
+        """Return (call, is_leader)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _finish(self, key: str, call: _Call, result: Any,
+                exc: BaseException | None) -> None:
+        with self._lock:
+            call.result, call.exc = result, exc
+            call.done.set()
+            del self._calls[key]
+            waiters, call.waiters = call.waiters, []
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_settle, fut, result, exc)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """Run `fn` once per in-flight `key`. Returns (result, shared)."""
+        call, leader = self._join(key)
+        if not leader:
+            call.done.wait()
+            if call.exc is not None:
+                raise call.exc
+            return call.result, True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, call, None, e)
+            raise
+        self._finish(key, call, result, None)
+        return result, False
+
+    async def ado(self, key: str,
+                  fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Coroutine twin of `do`; followers wait without blocking the loop."""
+        call, leader = self._join(key)
+        if not leader:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            with self._lock:
+                if not call.done.is_set():
+                    call.waiters.append((loop, fut))
+            if call.done.is_set():
+                _settle(fut, call.result, call.exc)
+            return await fut, True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, call, None, e)
+            raise
+        self._finish(key, call, result, None)
+        return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,149 @@
+"""Token estimates and per-agent prompt-size budgets.
+
+`TokenEstimator` approximates token counts locally from character counts,
+with a chars-per-token ratio per model that is calibrated against the
+`prompt_token_count` the provider reports for each call.
+
+`TokenBudget` is an agent's declared input / output allowance plus the
+strategy used to enforce the input side:
+
+- head / tail / head_tail — keep the start, the end, or both ends of a text;
+- drop_low_priority — cap every source at `per_source_tokens`, then drop
+  whole sources, lowest priority first, until the rest fits.
+
+`truncate` and `fit_sources` apply a strategy and return a `FitReport` that
+`tools.llm` keeps for the trace.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+STRATEGIES = ("head", "tail", "head_tail", "drop_low_priority")
+
+_TRUNCATION_MARK = "\n[... truncated ...]\n"
+
+
+class TokenEstimator:
+    """chars / tokens per model, as an exponential moving average of observed calls."""
+
+    _MIN_RATIO = 1.0
+    _MAX_RATIO = 12.0
+
+    def __init__(self, default_chars_per_token: float = 4.0, alpha: float = 0.2) -> None:
+        self.default = default_chars_per_token
+        self.alpha = alpha
+        self._ratios: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def chars_per_token(self, model: str | None = None) -> float:
+        with self._lock:
+            return self._ratios.get(model or "", self.default)
+
+    def estimate(self, text: str, model: str | None = None) -> int:
+        return int(len(text) / self.chars_per_token(model)) + 1
+
+    def observe(self, model: str, chars: int, tokens: int) -> None:
+        """Fold one call's (prompt chars, reported prompt tokens) into the ratio."""
+        if chars <= 0 or tokens <= 0:
+            return
+        # Clamped: a count that includes more than the text (a native response
+        # schema, a stale cache) must not swing every later estimate.
+        observed = min(max(chars / tokens, self._MIN_RATIO), self._MAX_RATIO)
+        with self._lock:
+            current = self._ratios.get(model)
+            self._ratios[model] = observed if current is None else (
+                (1 - self.alpha) * current + self.alpha * observed)
+
+
+@dataclass(frozen=True)
+class TokenBudget:
+    input_tokens: int
+    output_tokens: int
+    strategy: str = "head"
+    per_source_tokens: int | None = None
+
+    def __post_init__(self) -> None:
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"unknown truncation strategy {self.strategy!r}; "
+                             f"expected one of {STRATEGIES}")
+
+
+@dataclass
+class Source:
+    id: str
+    text: str
+    priority: int = 0  # higher survives longer
+
+
+@dataclass
+class FitReport:
+    strategy: str
+    budget_tokens: int
+    before_tokens: int
+    after_tokens: int
+    truncated: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.truncated or self.dropped)
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def truncate(text: str, max_tokens: int, strategy: str,
+             estimate: Callable[[str], int]) -> str:
+    """Cut `text` to about `max_tokens`, keeping the part `strategy` names."""
+    tokens = estimate(text)
+    if tokens <= max_tokens:
+        return text
+    keep = max(int(len(text) * max_tokens / tokens) - len(_TRUNCATION_MARK), 0)
+    if strategy == "tail":
+        return _TRUNCATION_MARK.lstrip() + text[len(text) - keep:]
+    if strategy == "head_tail":
+        half = keep // 2
+        return text[:half] + _TRUNCATION_MARK + text[len(text) - half:]
+    return text[:keep] + _TRUNCATION_MARK.rstrip()
+
+
+def fit_text(text: str, budget_tokens: int, strategy: str,
+             estimate: Callable[[str], int], *, label: str = "text",
+             ) -> tuple[str, FitReport]:
+    before = estimate(text)
+    out = truncate(text, budget_tokens, strategy, estimate)
+    report = FitReport(strategy, budget_tokens, before, estimate(out),
+                       truncated=[label] if out != text else [])
+    return out, report
+
+
+def fit_sources(sources: list[Source], budget_tokens: int,
+                estimate: Callable[[str], int], *,
+                per_source_tokens: int | None = None,
+                separator: str = "\n\n") -> tuple[list[Source], FitReport]:
+    """Cap each source, then drop the lowest-priority ones (later ones first
+    among equals) until the joined text fits. Order is preserved."""
+    before = estimate(separator.join(s.text for s in sources))
+    report = FitReport("drop_low_priority", budget_tokens, before, before)
+    kept: list[Source] = []
+    for s in sources:
+        if per_source_tokens is not None and estimate(s.text) > per_source_tokens:
+            s = Source(s.id, truncate(s.text, per_source_tokens, "head", estimate),
+                       s.priority)
+            report.truncated.append(s.id)
+        kept.append(s)
+    sizes = [estimate(s.text) for s in kept]
+    total = sum(sizes)
+    by_drop_order = sorted(range(len(kept)), key=lambda i: (kept[i].priority, -i))
+    dropped: set[int] = set()
+    for i in by_drop_order:
+        if total <= budget_tokens:
+            break
+        dropped.add(i)
+        total -= sizes[i]
+        report.dropped.append(kept[i].id)
+    kept = [s for i, s in enumerate(kept) if i not in dropped]
+    report.after_tokens = estimate(separator.join(s.text for s in kept))
+    return kept, report
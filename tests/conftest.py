@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_llm_cache(tmp_path, monkeypatch):
+    """Point the on-disk LLM response cache at a per-test directory so tests
+    never read or write the developer's real cache."""
+    import kelp_teaser.tools.llm as llm_module
+
+    monkeypatch.setattr(llm_module, "LLM_CACHE_DIR", tmp_path / "llm_cache")
+    monkeypatch.setattr(llm_module, "_cache", None)
+    monkeypatch.setattr(llm_module, "_near_dup", None)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_token_estimator(monkeypatch):
+    """Token-ratio calibration from one test's fake usage must not leak into
+    the estimates of the next."""
+    import kelp_teaser.tools.llm as llm_module
+    from kelp_teaser.tools.token_budget import TokenEstimator
+
+    monkeypatch.setattr(llm_module, "TOKENS", TokenEstimator())
+
+
+@pytest.fixture(autouse=True)
+def _isolated_parsed_doc_cache(tmp_path, monkeypatch):
+    """Same for the parsed-document cache. Hidden, so an Ingestor test that
+    reads tmp_path never walks into it."""
+    monkeypatch.setattr("kelp_teaser.agents.ingestor.PARSED_CACHE_DIR",
+                        tmp_path / ".parsed_cache")
@@ -0,0 +1,42 @@
+"""Test fixture: minimal PDFs with a text layer, built without a PDF library.
+
+Usage:
+    from tests.fixtures.pdfs import write_pdf
+
+    write_pdf(tmp_path / "cim.pdf", ["page one text", ""])  # "" = a blank (scanned) page
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+PROSE = "\n".join(f"Revenue grew {i}% year on year across the enterprise segment."
+                   for i in range(5))
+
+
+def write_pdf(path: Path, pages: list[str]) -> Path:
+    """A minimal PDF whose pages carry `pages` as a Helvetica text layer."""
+    n = len(pages)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+                   b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(n)), n),
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, text in enumerate(pages):
+        lines = b" T* ".join(b"(%s) Tj" % line.encode("latin-1")
+                             for line in text.splitlines()) if text else b""
+        stream = b"BT /F1 10 Tf 12 TL 40 800 Td " + lines + b" ET"
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+                       % (5 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+    return path
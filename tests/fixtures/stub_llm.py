@@ -22,21 +22,25 @@ def patch_llm(
     text_responses: list[str] | None = None,
     json_responses: list[Any] | None = None,
 ):
-    """Replace complete_text and complete_json with deterministic stubs.
+    """Replace complete_text / complete_json (their async twins, and
+    stream_json) with deterministic stubs.
 
-    Each call pops the next response. Raises IndexError if exhausted — make sure
-    you pass enough responses for what the tested code path needs.
+    Sync and async calls share the same queues. Each call pops the next
+    response. Raises IndexError if exhausted — make sure you pass enough
+    responses for what the tested code path needs.
     """
     text_q: deque[str] = deque(text_responses or [])
     json_q: deque[Any] = deque(json_responses or [])
 
-    def fake_complete_text(model, prompt, *, temperature=0.2, tracker=None):
+    def fake_complete_text(model, prompt, *, temperature=0.2, tracker=None,
+                           context=None, agent=None, near_dup=None):
         if not text_q:
             raise IndexError(f"stub_llm: text response queue exhausted "
                              f"(model={model}, prompt[:80]={prompt[:80]!r})")
         return text_q.popleft()
 
-    def fake_complete_json(model, prompt, schema, *, temperature=0.2, tracker=None):
+    def fake_complete_json(model, prompt, schema, *, temperature=0.2, tracker=None,
+                           context=None, agent=None):
         if not json_q:
             raise IndexError(f"stub_llm: json response queue exhausted "
                              f"(model={model}, schema={schema.__name__})")
@@ -46,5 +50,25 @@ def patch_llm(
             return schema.model_validate(obj)
         return obj
 
+    async def fake_acomplete_text(model, prompt, *, temperature=0.2, tracker=None,
+                                  context=None, agent=None, near_dup=None):
+        return fake_complete_text(model, prompt, temperature=temperature, tracker=tracker)
+
+    async def fake_acomplete_json(model, prompt, schema, *, temperature=0.2,
+                                  tracker=None, context=None, agent=None):
+        return fake_complete_json(model, prompt, schema, temperature=temperature,
+                                  tracker=tracker)
+
+    def fake_stream_json(model, prompt, schema, *, item_field, temperature=0.2,
+                         tracker=None, context=None, agent=None):
+        return llm_module.JsonStream.from_result(
+            fake_complete_json(model, prompt, schema, temperature=temperature,
+                               tracker=tracker),
+            item_field,
+        )
+
     monkeypatch.setattr(llm_module, "complete_text", fake_complete_text)
     monkeypatch.setattr(llm_module, "complete_json", fake_complete_json)
+    monkeypatch.setattr(llm_module, "acomplete_text", fake_acomplete_text)
+    monkeypatch.setattr(llm_module, "acomplete_json", fake_acomplete_json)
+    monkeypatch.setattr(llm_module, "stream_json", fake_stream_json)
@@ -0,0 +1,94 @@
+import json
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.schemas.plan import ChartKind, DeckPlan, SectionPlan
+from kelp_teaser.schemas.slide import ComposedSection, ComposedSlide, MetricTile
+from kelp_teaser.tools.compact_wire import compact_model, from_compact
+from kelp_teaser.tools.json_repair import repair_json
+from kelp_teaser.tools.llm import CostTracker
+
+
+def test_aliases_are_short_unique_and_described():
+    props = compact_model(MetricTile).model_json_schema()["properties"]
+    assert list(props) == ["v", "l", "su", "s"]
+    assert props["s"]["description"] == "source_id"
+
+
+def test_compact_round_trip_to_canonical():
+    compact = compact_model(SectionPlan).model_validate(
+        {"k": "chart", "dh": ["revenue"], "cs": {"ck": "revenue_growth_bar"}})
+    plan = from_compact(compact)
+    assert type(plan) is SectionPlan
+    assert plan.data_hooks == ["revenue"]
+    assert plan.chart_spec.chart_kind is ChartKind.revenue_growth_bar
+    # Full names validate too.
+    assert compact_model(SectionPlan).model_validate({"kind": "bullet_list"})
+
+
+def test_repair_hooks_work_on_compact_keys():
+    raw = json.dumps({"k": "chart", "dh": ["EBITDA margin by year"]})
+    out, repairs = repair_json(raw, compact_model(SectionPlan))
+    assert from_compact(out).chart_spec.chart_kind is ChartKind.margin_trend_line
+    assert repairs[-1].action == "fill_field"
+
+
+_DECK = {"c": "Project Halo", "s": [
+    {"t": f"Slide {i}", "sc": [{"k": "bullet_list", "dh": ["revenue"]}]} for i in range(3)]}
+
+
+class _Client:
+    def __init__(self, reply):
+        self.contents = []
+        outer = self
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                outer.contents.append(config.response_schema.model_dump_json())
+
+                class _Resp:
+                    text = reply
+                    usage_metadata = None
+                return _Resp()
+
+            def generate_content_stream(self, *, model, contents, config):
+                outer.contents.append(config.response_schema.model_dump_json())
+                for i in range(0, len(reply), 25):
+
+                    class _Chunk:
+                        text = reply[i:i + 25]
+                        usage_metadata = None
+                    yield _Chunk()
+
+        self.models = _Models()
+
+
+def test_complete_json_in_compact_mode_reports_savings(monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_COMPACT_WIRE_AGENTS", frozenset({"planner"}))
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client(json.dumps(_DECK)))
+    tracker = CostTracker()
+    plan = llm_module.complete_json("gemini-2.5-flash", "plan", DeckPlan,
+                                    tracker=tracker, agent="planner")
+    assert type(plan) is DeckPlan
+    assert plan.slides[2].sections[0].data_hooks == ["revenue"]
+    stats = tracker.summary()["compact_wire"]["planner"]
+    assert stats["responses"] == 1
+    assert stats["compact_tokens"] < stats["verbose_tokens"]
+    assert 0 < stats["reduction"] < 1
+
+
+def test_stream_json_in_compact_mode_yields_canonical_sections(monkeypatch):
+    slide = {"i": 0, "t": "Financials", "sc": [
+        {"k": "bullet_list", "b": [{"t": "Revenue ₹450 Cr", "s": "doc:x.md"}]},
+        {"k": "chart", "h": "Growth"}]}
+    client = _Client(json.dumps(slide))
+    monkeypatch.setattr(llm_module, "LLM_COMPACT_WIRE_AGENTS", frozenset({"composer"}))
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    stream = llm_module.stream_json("gemini-2.5-pro", "compose", ComposedSlide,
+                                    item_field="sections", agent="composer")
+    sections = list(stream)
+    assert len(sections) == 2
+    assert all(type(s) is ComposedSection for s in sections)
+    assert type(stream.result) is ComposedSlide
+    assert stream.result.sections[0].bullets[0].source_id == "doc:x.md"
+    assert not stream.cancelled
+    assert '"sc"' in client.contents[0]
@@ -98,3 +98,52 @@ def test_compose_slide_returns_warning_when_chart_designer_fails(
     assert out.sections[0].chart is None
     assert any("chart_missing" in w for w in warnings)
     assert any("simulated ChartDesigner failure" in w for w in warnings)
+
+
+def test_compose_slide_starts_chart_designer_while_streaming(monkeypatch, tmp_path):
+    """ChartDesigner runs for the chart section as soon as it is streamed,
+    before the remaining sections arrive, and is not re-run afterwards."""
+    import threading
+
+    import kelp_teaser.tools.llm as llm_module
+    from kelp_teaser.agents import chart_designer
+    from kelp_teaser.schemas.slide import ChartSeries, ChartSpec
+
+    chart_started = threading.Event()
+    calls: list[str] = []
+
+    def fake_design_chart(plan_sec, *, source_context):
+        calls.append(plan_sec.kind.value)
+        chart_started.set()
+        return ChartSpec(chart_kind=ChartKind.revenue_growth_bar, categories=["FY24"],
+                         series=[ChartSeries(name="Rev", values=[450])],
+                         source_id="doc:x.md")
+
+    chart_sec = ComposedSection(kind=ComponentKind.chart, heading="Revenue")
+    text_sec = ComposedSection(kind=ComponentKind.bullet_list, heading="Notes", bullets=[
+        Bullet(text="Note.", source_id="doc:x.md")])
+
+    class _Stream:
+        result = ComposedSlide(index=0, title="Financials",
+                               sections=[chart_sec, text_sec])
+
+        def __iter__(self):
+            yield chart_sec
+            assert chart_started.wait(timeout=5)
+            yield text_sec
+
+    monkeypatch.setattr(chart_designer, "design_chart", fake_design_chart)
+    monkeypatch.setattr(llm_module, "stream_json", lambda *a, **kw: _Stream())
+    out, warnings = compose_slide(
+        slide_index=0,
+        slide_plan=SlidePlan(title="Financials", sections=[
+            SectionPlan(kind=ComponentKind.chart,
+                        chart_spec=ChartSpecSkeleton(chart_kind=ChartKind.revenue_growth_bar)),
+            SectionPlan(kind=ComponentKind.bullet_list),
+        ]),
+        codename="Project Halo", docs=[], web_snippets=[], sector="SaaS",
+        out_dir=tmp_path,
+    )
+    assert out.sections[0].chart is not None
+    assert calls == ["chart"]
+    assert warnings == []
@@ -21,3 +21,15 @@ def test_model_ids_are_defined():
 
 def test_cost_guardrails_are_sane():
     assert 0 < config.COST_SOFT_WARNING < config.COST_HARD_ABORT
+
+
+def test_unknown_gemini_tier_is_rejected():
+    import os
+    import subprocess
+    import sys
+
+    env = {**os.environ, "KELP_GEMINI_TIER": "paid"}
+    proc = subprocess.run([sys.executable, "-c", "import kelp_teaser.config"],
+                          env=env, capture_output=True, text=True)
+    assert proc.returncode != 0
+    assert "KELP_GEMINI_TIER='paid' is not one of free, tier1" in proc.stderr
@@ -0,0 +1,259 @@
+import threading
+
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.tools.context_cache import (
+    ContextRegistry,
+    LocalContextCacheBackend,
+    SharedContext,
+)
+from kelp_teaser.tools.llm import CostTracker, GeminiCall, estimate_cost_usd
+
+_BIG = "### doc:x.md\n" + "Revenue ₹450 Cr. " * 2000
+
+
+class _Widget(BaseModel):
+    value: str
+
+
+def _registry(backend, min_tokens=100, **kw):
+    return ContextRegistry(backend, min_tokens={"m": min_tokens}, ttl_s=600,
+                           token_counter=lambda t: len(t) // 4, **kw)
+
+
+def test_registry_creates_each_prefix_once_across_threads():
+    backend = LocalContextCacheBackend()
+    registry = _registry(backend)
+    ctx = SharedContext(model="m", prefix=_BIG)
+    names: list[str | None] = []
+
+    def worker():
+        names.append(registry.resolve(ctx)[0])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert backend.creates == 1
+    assert len(set(names)) == 1 and names[0] is not None
+    assert backend.lookup(names[0]) == _BIG
+
+
+def test_small_prefix_is_inlined_not_cached():
+    backend = LocalContextCacheBackend()
+    registry = _registry(backend, min_tokens=10_000_000)
+    assert registry.resolve(SharedContext(model="m", prefix="tiny")) == (None, 0)
+    assert backend.creates == 0
+
+
+def test_creation_failure_falls_back_to_inline():
+    class _Broken(LocalContextCacheBackend):
+        def create(self, model, prefix, ttl_s):
+            raise RuntimeError("caching unavailable")
+
+    registry = _registry(_Broken())
+    assert registry.resolve(SharedContext(model="m", prefix=_BIG))[0] is None
+
+
+def test_failed_creation_is_retried_after_the_cooldown():
+    now = [0.0]
+
+    class _Flaky(LocalContextCacheBackend):
+        def create(self, model, prefix, ttl_s):
+            if self.creates == 0:
+                self.creates += 1
+                raise RuntimeError("503 unavailable")
+            return super().create(model, prefix, ttl_s)
+
+    backend = _Flaky()
+    registry = _registry(backend, retry_s=30, clock=lambda: now[0])
+    ctx = SharedContext(model="m", prefix=_BIG)
+    assert registry.resolve(ctx)[0] is None
+    now[0] = 10
+    assert registry.resolve(ctx)[0] is None
+    now[0] = 31
+    assert registry.resolve(ctx)[0] is not None
+    assert backend.creates == 2
+
+
+def test_cache_is_recreated_before_it_expires():
+    now = [0.0]
+    backend = LocalContextCacheBackend()
+    registry = _registry(backend, refresh_s=60, clock=lambda: now[0])
+    ctx = SharedContext(model="m", prefix=_BIG)
+    registry.resolve(ctx)
+    now[0] = 539
+    assert registry.resolve(ctx)[1] == 0  # still fresh: reused
+    now[0] = 540
+    assert registry.resolve(ctx)[1] > 0  # within the margin: created again
+    assert backend.creates == 2
+
+
+def test_invalidate_only_drops_the_named_cache():
+    backend = LocalContextCacheBackend()
+    registry = _registry(backend)
+    ctx = SharedContext(model="m", prefix=_BIG)
+    name = registry.resolve(ctx)[0]
+    registry.invalidate(ctx, "local/other")
+    assert registry.resolve(ctx) == (name, 0)
+    registry.invalidate(ctx, name)
+    assert registry.resolve(ctx)[1] > 0
+    assert backend.creates == 2
+
+
+def test_release_all_deletes_created_caches():
+    backend = LocalContextCacheBackend()
+    registry = _registry(backend)
+    registry.resolve(SharedContext(model="m", prefix=_BIG))
+    registry.release_all()
+    assert backend.entries == {}
+
+
+def test_cached_tokens_are_priced_below_fresh_input():
+    fresh = estimate_cost_usd("gemini-2.5-pro", 100_000, 0)
+    cached = estimate_cost_usd("gemini-2.5-pro", 100_000, 0, cached_tokens=90_000)
+    assert cached < fresh
+    tracker = CostTracker()
+    tracker.record(GeminiCall("gemini-2.5-pro", 100_000, 0, cached_tokens=90_000))
+    assert tracker.summary()["context_cached_tokens"] == 90_000
+    assert abs(tracker.total_cost_usd - cached) < 1e-12
+
+
+def test_complete_json_references_cache_instead_of_resending_prefix(monkeypatch):
+    backend = LocalContextCacheBackend()
+    monkeypatch.setattr(llm_module, "CONTEXT_REGISTRY", ContextRegistry(
+        backend, min_tokens={"gemini-2.5-pro": 100}, ttl_s=600,
+        token_counter=llm_module.estimate_tokens))
+    seen: list[tuple[str, str | None]] = []
+
+    class _Models:
+        def generate_content(self, *, model, contents, config):
+            seen.append((contents, config.cached_content))
+            cached = len(backend.lookup(config.cached_content) or "") // 4
+
+            class _Usage:
+                prompt_token_count = cached + 10
+                candidates_token_count = 5
+                cached_content_token_count = cached
+
+            class _Resp:
+                text = '{"value": "ok"}'
+                usage_metadata = _Usage()
+            return _Resp()
+
+    class _Client:
+        models = _Models()
+
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    tracker = CostTracker()
+    ctx = llm_module.shared_context("gemini-2.5-pro", _BIG)
+    for i in range(3):
+        llm_module.complete_json("gemini-2.5-pro", f"compose slide {i}", _Widget,
+                                 tracker=tracker, context=ctx)
+
+    assert backend.creates == 1
+    assert [c for c, _ in seen] == [f"compose slide {i}" for i in range(3)]
+    assert all(name is not None for _, name in seen)
+    assert tracker.context_cached_tokens > 0
+
+
+def test_missing_cache_is_evicted_and_the_call_inlines_the_prefix(monkeypatch):
+    backend = LocalContextCacheBackend()
+    monkeypatch.setattr(llm_module, "CONTEXT_REGISTRY", ContextRegistry(
+        backend, min_tokens={"gemini-2.5-pro": 100}, ttl_s=600,
+        token_counter=llm_module.estimate_tokens))
+    seen: list[tuple[str, str | None]] = []
+
+    class _Models:
+        def generate_content(self, *, model, contents, config):
+            seen.append((contents, config.cached_content))
+            if config.cached_content and len(seen) == 1:
+                raise RuntimeError("404 NOT_FOUND. CachedContent not found")
+
+            class _Resp:
+                text = "ok"
+                usage_metadata = None
+            return _Resp()
+
+    class _Client:
+        models = _Models()
+
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    tracker = CostTracker()
+    ctx = llm_module.shared_context("gemini-2.5-pro", _BIG)
+    assert llm_module.complete_text("gemini-2.5-pro", "q1", context=ctx,
+                                    tracker=tracker) == "ok"
+    assert seen[0][0] == "q1" and seen[0][1] is not None
+    assert seen[1] == (f"{_BIG}\n\nq1", None)
+    assert not tracker.errors_by_kind
+    llm_module.complete_text("gemini-2.5-pro", "q2", context=ctx, tracker=tracker)
+    assert seen[2][0] == "q2" and seen[2][1] is not None
+    assert backend.creates == 2
+
+
+def test_complete_text_inlines_prefix_when_caching_off(monkeypatch):
+    monkeypatch.setattr(llm_module, "CONTEXT_REGISTRY", ContextRegistry(
+        None, min_tokens={}, ttl_s=600, token_counter=llm_module.estimate_tokens))
+    seen: list[str] = []
+
+    class _Models:
+        def generate_content(self, *, model, contents, config):
+            seen.append(contents)
+
+            class _Resp:
+                text = "ok"
+                usage_metadata = None
+            return _Resp()
+
+    class _Client:
+        models = _Models()
+
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    ctx = llm_module.shared_context("gemini-2.5-flash", "SOURCES")
+    llm_module.complete_text("gemini-2.5-flash", "question", context=ctx)
+    assert seen == ["SOURCES\n\nquestion"]
+
+
+def test_composer_and_chart_designer_share_the_source_prefix(monkeypatch, tmp_path):
+    from kelp_teaser.agents.composer import build_source_context, compose_slide
+    from kelp_teaser.schemas.facts import IngestedDoc
+    from kelp_teaser.schemas.plan import (
+        ChartKind, ChartSpecSkeleton, ComponentKind, SectionPlan, SlidePlan,
+    )
+    from kelp_teaser.schemas.slide import (
+        ChartSeries, ChartSpec, ComposedSection, ComposedSlide,
+    )
+
+    contexts = []
+
+    def fake_complete_json(model, prompt, schema, *, temperature=0.2, tracker=None,
+                           context=None, agent=None):
+        contexts.append(context)
+        assert "Revenue ₹450 Cr" not in prompt
+        if schema is ComposedSlide:
+            return ComposedSlide(index=0, title="Financials", sections=[
+                ComposedSection(kind=ComponentKind.chart)])
+        return ChartSpec(chart_kind=ChartKind.revenue_growth_bar, categories=["FY24"],
+                         series=[ChartSeries(name="Rev", values=[450])],
+                         source_id="doc:x.md")
+
+    def fake_stream_json(model, prompt, schema, *, item_field, temperature=0.2,
+                         tracker=None, context=None, agent=None):
+        return llm_module.JsonStream.from_result(
+            fake_complete_json(model, prompt, schema, context=context), item_field)
+
+    monkeypatch.setattr(llm_module, "complete_json", fake_complete_json)
+    monkeypatch.setattr(llm_module, "stream_json", fake_stream_json)
+    docs = [IngestedDoc(source_id="doc:x.md", filename="x.md", text="Revenue ₹450 Cr.")]
+    compose_slide(
+        slide_index=0,
+        slide_plan=SlidePlan(title="Financials", sections=[SectionPlan(
+            kind=ComponentKind.chart,
+            chart_spec=ChartSpecSkeleton(chart_kind=ChartKind.revenue_growth_bar))]),
+        codename="Project Halo", docs=docs, web_snippets=[], sector="SaaS",
+        out_dir=tmp_path,
+    )
+    assert len(contexts) == 2
+    assert {c.prefix for c in contexts} == {build_source_context(docs, [])}
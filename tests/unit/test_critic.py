@@ -86,7 +86,7 @@ def test_critic_appends_judgment_unavailable_when_llm_raises(monkeypatch):
     only deterministic issues (which read as 'all clear')."""
     import kelp_teaser.tools.llm as llm_module
 
-    def boom(model, prompt, schema, *, temperature=0.2, tracker=None):
+    def boom(model, prompt, schema, *, temperature=0.2, tracker=None, agent=None):
         raise RuntimeError("simulated Gemini timeout")
 
     monkeypatch.setattr(llm_module, "complete_json", boom)
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.tools.hedge import (
+    HedgedStream,
+    LatencyWindow,
+    ahedge_call,
+    hedge_call,
+)
+from kelp_teaser.tools.llm import CostTracker
+
+FAST, SMART = "gemini-2.5-flash", "gemini-2.5-pro"
+
+
+def test_latency_window_percentile_needs_min_samples():
+    window = LatencyWindow(maxlen=10)
+    for s in (1.0, 2.0, 3.0, 4.0):
+        window.record("m", s)
+    assert window.percentile("m", 0.9, min_samples=5) is None
+    window.record("m", 10.0)
+    assert window.percentile("m", 0.9, min_samples=5) == 10.0
+    assert window.percentile("m", 0.5, min_samples=5) == 3.0
+    assert window.percentile("other", 0.5, min_samples=1) is None
+
+
+def test_fast_primary_is_not_hedged():
+    backup_ran = threading.Event()
+    out = hedge_call(lambda: "p", lambda: backup_ran.set() or "b", 1.0)
+    assert (out.value, out.hedged, out.winner) == ("p", False, "primary")
+    assert not backup_ran.is_set()
+
+
+def test_slow_primary_loses_to_backup():
+    release = threading.Event()
+
+    def slow():
+        release.wait(2)
+        return "p"
+
+    out = hedge_call(slow, lambda: "b", 0.05)
+    release.set()
+    assert (out.value, out.hedged, out.winner) == ("b", True, "backup")
+
+
+def test_invalid_backup_does_not_win():
+    def slow():
+        time.sleep(0.2)
+        return "good"
+
+    out = hedge_call(slow, lambda: "bad", 0.05, accept=lambda v: v == "good")
+    assert (out.value, out.winner) == ("good", "primary")
+
+
+def test_primary_error_before_delay_is_raised():
+    def boom():
+        raise ValueError("x")
+
+    with pytest.raises(ValueError):
+        hedge_call(boom, lambda: "b", 1.0)
+
+
+def test_async_hedge_cancels_loser():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(2)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "p"
+
+    async def fast():
+        return "b"
+
+    out = asyncio.run(ahedge_call(slow, fast, 0.05))
+    assert (out.value, out.winner) == ("b", "backup")
+    assert cancelled == [True]
+
+
+def test_hedged_stream_switches_to_backup():
+    closed = []
+
+    def chunks():
+        try:
+            yield "a"
+            time.sleep(0.5)
+            yield "b"
+        finally:
+            closed.append(True)
+
+    stream = HedgedStream(chunks(), lambda: "backup-result", 0.05)
+    assert list(stream) == ["a"]
+    assert (stream.hedged, stream.winner, stream.backup_result) == (
+        True, "backup", "backup-result")
+    time.sleep(0.6)
+    assert closed == [True]
+
+
+def test_hedged_stream_without_delay_passes_through():
+    stream = HedgedStream(iter(["a", "b"]), lambda: "x", 5.0)
+    assert list(stream) == ["a", "b"]
+    assert (stream.hedged, stream.winner) == (False, "primary")
+
+
+class _LatencyClient:
+    """SMART replies slowly, FAST at once."""
+
+    def __init__(self):
+        outer = self
+        self.models_called: list[str] = []
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                outer.models_called.append(model)
+                if model == SMART:
+                    time.sleep(0.5)
+
+                class _Usage:
+                    prompt_token_count = 100
+                    candidates_token_count = 10
+
+                class _Resp:
+                    text = f"from {model}"
+                    usage_metadata = _Usage()
+                return _Resp()
+
+        self.models = _Models()
+
+
+def test_complete_text_hedges_slow_call_per_agent(monkeypatch):
+    client = _LatencyClient()
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    monkeypatch.setattr(llm_module, "LLM_HEDGE_AGENTS", frozenset({"composer"}))
+    monkeypatch.setattr(llm_module, "LATENCY", LatencyWindow())
+    for _ in range(5):
+        llm_module.LATENCY.record(SMART, 0.05)
+    tracker = CostTracker()
+    text = llm_module.complete_text(SMART, "write", tracker=tracker, agent="composer")
+    assert text == f"from {FAST}"
+    time.sleep(0.6)  # let the abandoned primary finish and be charged
+    stats = tracker.summary()["hedging"]["composer"]
+    assert (stats["calls"], stats["hedged"], stats["hedge_wins"]) == (1, 1, 1)
+    assert stats["hedge_rate"] == 1.0
+    assert stats["extra_cost_usd"] == pytest.approx(
+        llm_module.estimate_cost_usd(SMART, 100, 10), abs=1e-6)
+
+
+def test_unhedged_agent_makes_one_call(monkeypatch):
+    client = _LatencyClient()
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    monkeypatch.setattr(llm_module, "LLM_HEDGE_AGENTS", frozenset({"composer"}))
+    monkeypatch.setattr(llm_module, "LATENCY", LatencyWindow())
+    for _ in range(5):
+        llm_module.LATENCY.record(SMART, 0.05)
+    tracker = CostTracker()
+    assert llm_module.complete_text(SMART, "x", tracker=tracker,
+                                    agent="critic") == f"from {SMART}"
+    assert client.models_called == [SMART]
+    assert tracker.summary()["hedging"] == {}
@@ -43,3 +43,145 @@ def test_ingestor_returns_empty_docs_when_folder_empty(tmp_path):
     state = _state(tmp_path)
     result = run_ingestor(state)
     assert result["docs"] == []
+
+
+def test_ingestor_walks_nested_folders_with_globs(tmp_path, monkeypatch):
+    (tmp_path / "finance" / "fy24").mkdir(parents=True)
+    (tmp_path / "archive").mkdir()
+    (tmp_path / ".git").mkdir()
+    (tmp_path / "b.md").write_text("top")
+    (tmp_path / "finance" / "fy24" / "notes.txt").write_text("nested")
+    (tmp_path / "archive" / "old.md").write_text("old")
+    (tmp_path / ".git" / "HEAD.md").write_text("hidden dir")
+    monkeypatch.setattr("kelp_teaser.agents.ingestor.INGEST_EXCLUDE", ("archive/*",))
+    result = run_ingestor(_state(tmp_path))
+    assert [d.source_id for d in result["docs"]] == ["doc:b.md", "doc:finance/fy24/notes.txt"]
+
+    from kelp_teaser.agents.ingestor import walk_inputs
+    assert [p.name for p in walk_inputs(tmp_path, include=("*.txt",))] == ["notes.txt"]
+
+
+def test_ingestor_parses_workbooks_in_a_process_pool_and_traces_timings(tmp_path,
+                                                                         monkeypatch):
+    import pandas as pd
+
+    from kelp_teaser.graph.trace import TraceWriter
+
+    for name, value in (("z.xlsx", 1), ("a.xlsx", 2), ("m/q.xlsx", 3)):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        pd.DataFrame({"revenue": [value * 100]}).to_excel(tmp_path / name, index=False)
+    (tmp_path / "broken.xlsx").write_text("not a workbook")
+    monkeypatch.setattr("kelp_teaser.agents.ingestor.INGEST_EXCEL_WORKERS", 2)
+    writer = TraceWriter(run_dir=None)
+    result = run_ingestor(_state(tmp_path), trace_writer=writer)
+
+    assert [d.source_id for d in result["docs"]] == [
+        "doc:a.xlsx", "doc:m/q.xlsx", "doc:z.xlsx"]
+    assert "200" in result["docs"][0].text
+    files = writer.steps[0]["data"]["files"]
+    assert [f["file"] for f in files] == ["a.xlsx", "broken.xlsx", "m/q.xlsx", "z.xlsx"]
+    assert all(f["parser"] == "excel" and f["seconds"] >= 0 for f in files)
+    assert "error" in files[1] and files[1]["chars"] == 0
+
+
+def test_ingestor_bounds_concurrent_pdf_parses(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    for i in range(6):
+        (tmp_path / f"deck{i}.pdf").write_bytes(b"%%PDF-1.4 %d" % i)
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_parse_pdf(path):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        return f"text of {path.name}"
+
+    monkeypatch.setattr("kelp_teaser.tools.parsers.parse_pdf", fake_parse_pdf)
+    monkeypatch.setattr("kelp_teaser.agents.ingestor.INGEST_PDF_CONCURRENCY", 2)
+    result = run_ingestor(_state(tmp_path))
+    assert [d.source_id for d in result["docs"]] == [f"doc:deck{i}.pdf" for i in range(6)]
+    assert peak == 2
+
+
+def test_ingestor_serves_unchanged_files_from_the_parsed_cache(tmp_path, monkeypatch):
+    from kelp_teaser.graph.trace import TraceWriter
+
+    (tmp_path / "deck.pdf").write_bytes(b"%PDF-1.4 deck")
+    (tmp_path / "renamed.pdf").write_bytes(b"%PDF-1.4 other")
+    calls: list[str] = []
+
+    def fake_parse_pdf(path):
+        calls.append(path.name)
+        return f"parsed {path.read_bytes().decode()}"
+
+    monkeypatch.setattr("kelp_teaser.tools.parsers.parse_pdf", fake_parse_pdf)
+    first = run_ingestor(_state(tmp_path))
+    assert sorted(calls) == ["deck.pdf", "renamed.pdf"]
+
+    (tmp_path / "renamed.pdf").rename(tmp_path / "moved.pdf")
+    (tmp_path / "deck.pdf").write_bytes(b"%PDF-1.4 deck v2")
+    writer = TraceWriter(run_dir=None)
+    second = run_ingestor(_state(tmp_path), trace_writer=writer)
+    assert calls[2:] == ["deck.pdf"]
+    assert [d.text for d in second["docs"]] == [
+        "parsed %PDF-1.4 deck v2", "parsed %PDF-1.4 other"]
+    assert [f["cached"] for f in writer.steps[0]["data"]["files"]] == [False, True]
+    assert first["docs"][1].text == second["docs"][1].text
+
+
+def test_ingestor_dedupes_identical_files(tmp_path):
+    from kelp_teaser.graph.trace import TraceWriter
+
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "b.md").write_text("same bytes")
+    (tmp_path / "sub" / "a copy.md").write_text("same bytes")
+    (tmp_path / "c.md").write_text("different")
+    writer = TraceWriter(run_dir=None)
+    result = run_ingestor(_state(tmp_path), trace_writer=writer)
+    assert [d.source_id for d in result["docs"]] == ["doc:b.md", "doc:c.md"]
+    assert writer.steps[0]["data"]["duplicates"] == {"sub/a copy.md": "b.md"}
+
+
+def test_ingestor_traces_the_strategy_that_parsed_each_file(tmp_path, monkeypatch):
+    import docx
+
+    from kelp_teaser.graph.trace import TraceWriter
+    from tests.fixtures.pdfs import PROSE, write_pdf
+
+    docx.Document().save(tmp_path / "empty.docx")
+    document = docx.Document()
+    document.add_paragraph("Board memo")
+    document.save(tmp_path / "memo.docx")
+    (tmp_path / "kpis.csv").write_text("metric,value\nrevenue,120\n")
+    write_pdf(tmp_path / "cim.pdf", [PROSE])
+    write_pdf(tmp_path / "scan.pdf", [""])
+    calls: list[str] = []
+
+    def fake_parse_pdf(path):
+        calls.append(path.name)
+        return ""
+
+    monkeypatch.setattr("kelp_teaser.tools.parsers.parse_pdf", fake_parse_pdf)
+    writer = TraceWriter(run_dir=None)
+    result = run_ingestor(_state(tmp_path), trace_writer=writer)
+    assert [d.source_id for d in result["docs"]] == [
+        "doc:cim.pdf", "doc:kpis.csv", "doc:memo.docx"]
+    files = {f["file"]: f for f in writer.steps[0]["data"]["files"]}
+    assert {name: f["strategy"] for name, f in files.items()} == {
+        "cim.pdf": "pypdf", "empty.docx": "", "kpis.csv": "csv",
+        "memo.docx": "python-docx", "scan.pdf": ""}
+    assert files["memo.docx"]["mime"].endswith("wordprocessingml.document")
+    assert [a["strategy"] for a in files["scan.pdf"]["attempts"]] == ["pypdf", "llamaparse"]
+    assert calls == ["scan.pdf"]
+
+    # Only parses that passed their checks are cached: the scan is retried.
+    run_ingestor(_state(tmp_path))
+    assert calls == ["scan.pdf", "scan.pdf"]
@@ -0,0 +1,257 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.schemas.plan import ChartKind, DeckPlan
+from kelp_teaser.schemas.slide import ComposedSlide
+from kelp_teaser.tools.json_repair import RepairFailed, field_reask, repair_json
+from kelp_teaser.tools.llm import CostTracker
+
+
+def _section(kind="bullet_list", **extra):
+    return {"kind": kind, "data_hooks": ["revenue"], **extra}
+
+
+def _deck(*sections):
+    slides = [{"title": f"S{i}", "sections": [_section()]} for i in range(3)]
+    if sections:
+        slides[0]["sections"] = list(sections)
+    return {"codename": "Project Kelp", "slides": slides}
+
+
+def test_trailing_commas_are_removed():
+    raw = json.dumps(_deck())[:-1] + ",}"
+    raw = raw.replace('"revenue"]', '"revenue",]')
+    plan, repairs = repair_json(raw, DeckPlan)
+    assert plan.codename == "Project Kelp"
+    assert [r.action for r in repairs] == ["trailing_commas"]
+
+
+def test_truncated_output_drops_the_partial_element():
+    deck = _deck()
+    deck["slides"][-1]["sections"] = [_section(data_hooks=["revenue", "EBITDA margin"])]
+    raw = json.dumps({"codename": deck["codename"], "slides": deck["slides"]})
+    cut = raw[:raw.index("margin")]
+    plan, repairs = repair_json(cut, DeckPlan)
+    assert plan.slides[-1].sections[0].data_hooks == ["revenue"]
+    assert repairs[-1].action == "close_truncated"
+
+
+def test_value_cut_mid_string_is_never_accepted():
+    slide = {"index": 0, "title": "Numbers", "sections": [{"kind": "bullet_list", "bullets": [
+        {"text": "Revenue grew 18%", "source_id": "doc:pack.pdf"},
+        {"source_id": "doc:pack.pdf", "text": "EBITDA margin expanded to 25%"},
+    ]}]}
+    raw = json.dumps(slide, separators=(",", ":"))
+    cut = raw[:raw.index("25%") + 1]
+    assert cut.endswith('"text":"EBITDA margin expanded to 2')
+    try:
+        out, _ = repair_json(cut, ComposedSlide)
+    except RepairFailed:
+        return
+    assert [b.text for b in out.sections[0].bullets] == ["Revenue grew 18%"]
+
+
+def test_string_cut_before_anything_complete_raises():
+    with pytest.raises(RepairFailed):
+        repair_json('{"codename": "Project Ke', DeckPlan)
+
+
+def test_truncated_after_a_key_drops_to_default():
+    raw = json.dumps(_deck())[:-1] + ', "identifier_terms"'
+    plan, repairs = repair_json(raw, DeckPlan)
+    assert plan.identifier_terms == []
+    assert [r.action for r in repairs] == ["close_truncated", "null_to_default"]
+
+
+def test_prose_around_json_is_stripped():
+    plan, repairs = repair_json("Here is the plan:\n" + json.dumps(_deck()) + "\nThanks!",
+                                DeckPlan)
+    assert plan.codename == "Project Kelp"
+    assert [r.action for r in repairs] == ["strip_preamble", "strip_trailer"]
+
+
+def test_chart_section_without_chart_spec_gets_inferred_kind():
+    raw = json.dumps(_deck(_section("chart", data_hooks=["EBITDA margin FY22-24"])))
+    plan, repairs = repair_json(raw, DeckPlan)
+    spec = plan.slides[0].sections[0].chart_spec
+    assert spec.chart_kind == ChartKind.margin_trend_line
+    assert repairs[0].action == "fill_field"
+    assert repairs[0].path == "slides[0].sections[0]"
+
+
+def test_enum_case_is_normalized():
+    raw = json.dumps(_deck(_section("Bullet List")))
+    plan, repairs = repair_json(raw, DeckPlan)
+    assert plan.slides[0].sections[0].kind.value == "bullet_list"
+    assert repairs[0].action == "normalize_enum"
+
+
+def test_empty_metric_value_is_dropped():
+    slide = {"index": 0, "title": "Numbers", "sections": [{
+        "kind": "metric_tile",
+        "metrics": [
+            {"value": "", "label": "EBITDA", "source_id": "doc:pack.pdf"},
+            {"value": "₹120 Cr", "label": "Revenue", "source_id": "doc:pack.pdf"},
+        ],
+    }]}
+    out, repairs = repair_json(json.dumps(slide), ComposedSlide)
+    assert [m.label for m in out.sections[0].metrics] == ["Revenue"]
+    assert repairs[0].action == "drop_item"
+
+
+def test_unfixable_output_raises():
+    with pytest.raises(RepairFailed):
+        repair_json(json.dumps({"codename": "X", "slides": []}), DeckPlan)
+    with pytest.raises(RepairFailed):
+        repair_json("no json here", DeckPlan)
+
+
+class _CountingClient:
+    def __init__(self, reply):
+        self.calls = 0
+        outer = self
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                outer.calls += 1
+
+                class _Resp:
+                    text = reply
+                    usage_metadata = None
+                return _Resp()
+
+        self.models = _Models()
+
+
+def test_complete_json_repairs_instead_of_reasking(monkeypatch):
+    client = _CountingClient(json.dumps(_deck())[:-1] + ",}")
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    tracker = CostTracker()
+    plan = llm_module.complete_json("gemini-2.5-flash", "plan it", DeckPlan,
+                                    tracker=tracker)
+    assert plan.codename == "Project Kelp"
+    assert client.calls == 1
+    [repair] = tracker.summary()["json_repairs"]
+    assert (repair["schema"], repair["action"]) == ("DeckPlan", "trailing_commas")
+
+
+def test_complete_json_reasks_when_repair_fails(monkeypatch):
+    client = _CountingClient('{"codename": "X", "slides": []}')
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    monkeypatch.setattr(llm_module.time, "sleep", lambda s: None)
+    tracker = CostTracker()
+    with pytest.raises(RuntimeError, match="complete_json failed"):
+        llm_module.complete_json("gemini-2.5-flash", "plan it", DeckPlan,
+                                 tracker=tracker)
+    assert client.calls == llm_module.LLM_MAX_ATTEMPTS
+    assert tracker.summary()["json_repair_failed"] == llm_module.LLM_MAX_ATTEMPTS
+
+
+def _slide_with_bad_bullet():
+    bullets = [{"text": f"Point {i}", "source_id": "doc:pack.pdf"} for i in range(4)]
+    bullets[2]["source_id"] = "pack.pdf"
+    return {"index": 0, "title": "Overview",
+            "sections": [{"kind": "bullet_list", "bullets": bullets}]}
+
+
+def test_field_reask_targets_only_the_invalid_object():
+    data = _slide_with_bad_bullet()
+    with pytest.raises(ValidationError) as exc:
+        ComposedSlide.model_validate(data)
+    reask = field_reask(data, ComposedSlide, exc.value, max_paths=8)
+    assert reask.paths == ["sections[0].bullets[2]"]
+    prompt = reask.prompt("PROMPT")
+    assert "Point 2" in prompt and "Point 1" not in prompt
+    out = reask.merge({"sections[0].bullets[2]":
+                       {"text": "Point 2", "source_id": "doc:pack.pdf"}})
+    assert [b.source_id for b in out.sections[0].bullets] == ["doc:pack.pdf"] * 4
+    with pytest.raises(ValueError):
+        reask.merge({})
+
+
+def test_field_reask_declines_top_level_failures():
+    data = {"index": 0, "title": "", "sections": []}
+    with pytest.raises(ValidationError) as exc:
+        ComposedSlide.model_validate(data)
+    assert field_reask(data, ComposedSlide, exc.value, max_paths=8) is None
+
+
+class _ScriptedClient:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts: list[str] = []
+        outer = self
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                outer.prompts.append(contents)
+
+                class _Resp:
+                    text = outer.replies.pop(0)
+                    usage_metadata = None
+                return _Resp()
+
+        self.models = _Models()
+
+
+def test_complete_json_reasks_only_invalid_fields(monkeypatch):
+    replacement = {"sections[0].bullets[2]": {"text": "Point 2", "source_id": "doc:pack.pdf"}}
+    client = _ScriptedClient([json.dumps(_slide_with_bad_bullet()), json.dumps(replacement)])
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    monkeypatch.setattr(llm_module.time, "sleep", lambda s: None)
+    tracker = CostTracker()
+    slide = llm_module.complete_json("gemini-2.5-pro", "compose", ComposedSlide,
+                                     tracker=tracker)
+    assert len(slide.sections[0].bullets) == 4
+    assert "sections[0].bullets[2]" in client.prompts[1]
+    assert tracker.summary()["field_reasks"] == [
+        {"schema": "ComposedSlide", "paths": ["sections[0].bullets[2]"], "ok": True}]
+
+
+def test_streamed_section_is_repaired_not_reasked(monkeypatch):
+    slide = {"index": 0, "title": "Numbers", "sections": [
+        {"kind": "metric_tile", "metrics": [
+            {"value": "", "label": "EBITDA", "source_id": "doc:pack.pdf"},
+            {"value": "₹120 Cr", "label": "Revenue", "source_id": "doc:pack.pdf"}]},
+        {"kind": "bullet_list", "bullets": [
+            {"text": "Point", "source_id": "doc:pack.pdf"}]},
+    ]}
+    text = json.dumps(slide, ensure_ascii=False)
+    calls: list[str] = []
+    sent: list[str] = []
+
+    class _Client:
+        class models:
+            @staticmethod
+            def generate_content_stream(**kwargs):
+                calls.append("stream")
+                for i in range(0, len(text), 40):
+                    class _Chunk:
+                        usage_metadata = None
+                    _Chunk.text = text[i:i + 40]
+                    sent.append(_Chunk.text)
+                    yield _Chunk()
+
+            @staticmethod
+            def generate_content(**kwargs):
+                calls.append("full")
+                raise AssertionError("no second request expected")
+
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    tracker = CostTracker()
+    stream = llm_module.stream_json("gemini-2.5-pro", "compose", ComposedSlide,
+                                    item_field="sections", tracker=tracker)
+    sections, received = [], []
+    for section in stream:
+        sections.append(section)
+        received.append("".join(sent))
+    assert calls == ["stream"]
+    assert received[0] != text  # handed out before the stream finished
+    assert [m.label for m in sections[0].metrics] == ["Revenue"]
+    assert len(sections) == 2 and stream.result.sections == sections
+    summary = tracker.summary()
+    assert summary["streams_cancelled"] == 0
+    assert [r["action"] for r in summary["json_repairs"]] == ["drop_item"]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from kelp_teaser.tools.json_stream import ArrayItemScanner, OffSchemaStream
+
+_DOC = json.dumps({
+    "index": 0,
+    "title": "Profile {with} [brackets]",
+    "sections": [
+        {"kind": "bullets", "heading": "A \"quoted\" }", "bullets": []},
+        {"kind": "chart", "heading": "B", "metrics": [{"label": "x"}]},
+    ],
+})
+
+
+def _feed_in_chunks(scanner: ArrayItemScanner, text: str, size: int) -> list[str]:
+    items: list[str] = []
+    for i in range(0, len(text), size):
+        items.extend(scanner.feed(text[i:i + size]))
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_yields_each_element_regardless_of_chunking(size):
+    items = _feed_in_chunks(ArrayItemScanner("sections"), _DOC, size)
+    assert [json.loads(i)["heading"] for i in items] == ['A "quoted" }', "B"]
+
+
+def test_element_is_emitted_before_the_document_ends():
+    scanner = ArrayItemScanner("sections")
+    head = _DOC[:_DOC.index('{"kind": "chart"')]
+    assert len(scanner.feed(head)) == 1
+
+
+def test_ignores_nested_arrays_with_the_same_name():
+    doc = json.dumps({"meta": {"sections": [{"x": 1}]}, "sections": [{"y": 2}]})
+    assert [json.loads(i) for i in ArrayItemScanner("sections").feed(doc)] == [{"y": 2}]
+
+
+def test_tolerates_a_leading_code_fence():
+    scanner = ArrayItemScanner("sections")
+    items = _feed_in_chunks(scanner, "```json\n" + _DOC + "\n```", 4)
+    assert len(items) == 2
+
+
+@pytest.mark.parametrize("text", [
+    "Sure! Here is the slide:",
+    '{"index": 0, "narrative": "free text"',
+    '{"sections": ["not an object"]}',
+    '{"sections": {"kind": "bullets"}}',
+])
+def test_off_schema_streams_raise(text):
+    scanner = ArrayItemScanner("sections",
+                               allowed_keys=frozenset({"index", "title", "sections"}))
+    with pytest.raises(OffSchemaStream):
+        scanner.feed(text)
@@ -32,6 +32,55 @@ class TestEstimateCost:
     def test_unknown_model_returns_zero(self):
         assert estimate_cost_usd("nonexistent-model", 1000, 1000) == 0.0
 
+    def test_thinking_tokens_bill_at_output_rate(self):
+        plain = estimate_cost_usd("gemini-2.5-pro", 1000, 1000)
+        thinking = estimate_cost_usd("gemini-2.5-pro", 1000, 1000, thinking_tokens=1000)
+        assert thinking - plain == pytest.approx(estimate_cost_usd("gemini-2.5-pro", 0, 1000))
+
+
+class TestThinkingBudget:
+    def test_budget_is_sent_and_thinking_tokens_recorded(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        configs = []
+
+        class _Usage:
+            prompt_token_count = 100
+            candidates_token_count = 10
+            thoughts_token_count = 400
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                configs.append(config)
+
+                class _Resp:
+                    text = "ok"
+                    usage_metadata = _Usage()
+                return _Resp()
+
+        class _Client:
+            models = _Models()
+
+        monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+        monkeypatch.setitem(llm_module.LLM_THINKING_BUDGETS, "anonymizer", 0)
+        tracker = CostTracker()
+        llm_module.complete_text("gemini-2.5-flash", "p", tracker=tracker,
+                                 agent="anonymizer")
+        assert configs[0].thinking_config.thinking_budget == 0
+        summary = tracker.summary()
+        assert summary["thinking_tokens"] == 400
+        assert summary["thinking"]["anonymizer"]["budget"] == 0
+        assert tracker.total_cost_usd == pytest.approx(
+            estimate_cost_usd("gemini-2.5-flash", 100, 10, thinking_tokens=400))
+
+    def test_pro_budget_is_raised_to_its_minimum(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        monkeypatch.setitem(llm_module.LLM_THINKING_BUDGETS, "critic", 0)
+        assert llm_module.thinking_budget("critic", "gemini-2.5-pro") == 128
+        assert llm_module.thinking_budget("critic", "gemini-2.5-flash") == 0
+        assert llm_module.thinking_budget("unlisted", "gemini-2.5-pro") is None
+
 
 class TestCostTrackerThreadSafety:
     def test_concurrent_record_preserves_all_calls(self):
@@ -86,11 +135,14 @@ class TestCompleteJsonRetryFeedback:
         # second response is valid.
         responses = iter(['{"value": ""}', '{"value": "ok"}'])
 
-        def fake_complete_text(model, prompt, *, temperature=0.2, tracker=None):
-            prompts_seen.append(prompt)
+        def fake_generate(model, prompt, *, temperature=0.2, tracker=None, turns=None,
+                          **_):
+            prompts_seen.append(prompt + "".join(t.text for t in turns or []))
             return next(responses)
 
-        monkeypatch.setattr(llm_module, "complete_text", fake_complete_text)
+        monkeypatch.setattr(llm_module, "_generate", fake_generate)
+        # Exercise the inline schema-hint path (native structured output off).
+        monkeypatch.setattr(llm_module, "LLM_STRUCTURED_OUTPUT", False)
 
         result = llm_module.complete_json("gemini-2.5-flash", "base prompt", _Widget)
 
@@ -106,6 +158,100 @@ class TestCompleteJsonRetryFeedback:
                 or "validation error" in prompts_seen[1].lower())
 
 
+class TestChatRetry:
+    """A validation re-ask resends the first request unchanged and adds only
+    the rejected response and its errors as follow-up turns."""
+
+    @staticmethod
+    def _client(replies, seen):
+        class _Usage:
+            prompt_token_count = 1000
+            candidates_token_count = 20
+            cached_content_token_count = 0
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                seen.append(contents)
+
+                class _Resp:
+                    text = replies.pop(0)
+                    usage_metadata = _Usage()
+                return _Resp()
+
+        class _Client:
+            models = _Models()
+        return _Client()
+
+    def test_retry_continues_the_conversation(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        seen: list = []
+        client = self._client(['{"value": ""}', '{"value": "ok"}'], seen)
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        tracker = CostTracker()
+        result = llm_module.complete_json("gemini-2.5-flash", "base prompt", _Widget,
+                                          tracker=tracker, agent="critic")
+        assert result.value == "ok"
+        first, retry = seen
+        assert first == "base prompt"
+        assert [c.role for c in retry] == ["user", "model", "user"]
+        assert retry[0].parts[0].text == first
+        assert retry[1].parts[0].text == '{"value": ""}'
+        assert "failed validation" in retry[2].parts[0].text
+        assert "base prompt" not in retry[2].parts[0].text
+
+        retries = tracker.summary()["retries"]
+        assert retries["calls"] == 1
+        assert retries["prompt_tokens"] == 1000
+        assert retries["by_agent"]["critic"]["calls"] == 1
+        assert retries["cost_usd"] == pytest.approx(tracker.total_cost_usd / 2)
+
+    def test_second_retry_sends_only_the_latest_response(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        seen: list = []
+        client = self._client(['{"value": ""}', '{"value": null}', '{"value": "ok"}'],
+                              seen)
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        tracker = CostTracker()
+        llm_module.complete_json("gemini-2.5-flash", "base", _Widget, tracker=tracker)
+        assert len(seen[2]) == 3
+        assert seen[2][1].parts[0].text == '{"value": null}'
+        assert tracker.summary()["retries"]["calls"] == 2
+
+    def test_retry_after_a_failed_field_reask_pairs_the_response_with_its_error(
+            self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        seen: list = []
+        first = '{"title": "T", "sections": [{"name": 5}]}'
+        client = self._client(
+            [first, '{"unrelated": {}}', '{"title": "T", "sections": [{"name": "a"}]}'],
+            seen)
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        monkeypatch.setattr(llm_module, "LLM_FIELD_REASK", True)
+        result = llm_module.complete_json("gemini-2.5-flash", "base", _Page)
+        assert result.sections[0].name == "a"
+        assert "sections[0]" in seen[1]  # the field re-ask, which fails
+        assert [c.role for c in seen[2]] == ["user", "model", "user"]
+        assert seen[2][1].parts[0].text == first
+        followup = seen[2][2].parts[0].text
+        assert "sections.0.name" in followup
+        assert "no replacement" not in followup
+
+    def test_disabled_rebuilds_the_prompt(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        seen: list = []
+        client = self._client(['{"value": ""}', '{"value": "ok"}'], seen)
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        monkeypatch.setattr(llm_module, "LLM_CHAT_RETRY", False)
+        tracker = CostTracker()
+        llm_module.complete_json("gemini-2.5-flash", "base", _Widget, tracker=tracker)
+        assert seen[1].startswith("base") and "failed validation" in seen[1]
+        assert tracker.summary()["retries"]["calls"] == 1
+
+
 class TestCostGuardrail:
     def test_check_cost_budget_under_warning_passes(self):
         from kelp_teaser.tools.llm import (
@@ -129,3 +275,236 @@ class TestCostGuardrail:
                                       prompt_tokens=10_000, output_tokens=10_000))
         with pytest.raises(CostExceeded):
             check_cost_budget(tracker, soft_warning=2.00, hard_abort=5.00)
+
+
+class _FakeAsyncClient:
+    """Mimics `client.aio.models.generate_content`, tracking peak concurrency."""
+
+    def __init__(self, responses=None, delay=0.01):
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self._responses = list(responses or [])
+        self._delay = delay
+        outer = self
+
+        class _Models:
+            async def generate_content(self, **kwargs):
+                import asyncio
+
+                outer.calls += 1
+                outer.in_flight += 1
+                outer.peak = max(outer.peak, outer.in_flight)
+                try:
+                    await asyncio.sleep(outer._delay)
+                    text = outer._responses.pop(0) if outer._responses else "ok"
+                    if isinstance(text, Exception):
+                        raise text
+
+                    class _Usage:
+                        prompt_token_count = 100
+                        candidates_token_count = 10
+
+                    class _Resp:
+                        usage_metadata = _Usage()
+                    _Resp.text = text
+                    return _Resp()
+                finally:
+                    outer.in_flight -= 1
+
+        class _Aio:
+            models = _Models()
+
+        self.aio = _Aio()
+
+
+class TestAsyncComplete:
+    def test_acomplete_text_records_cost(self, monkeypatch):
+        import asyncio
+        import kelp_teaser.tools.llm as llm_module
+
+        client = _FakeAsyncClient(responses=["summary"])
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        tracker = CostTracker()
+        out = asyncio.run(llm_module.acomplete_text("gemini-2.5-flash", "p",
+                                                    tracker=tracker))
+        assert out == "summary"
+        assert tracker.total_calls == 1
+        assert tracker.total_cost_usd > 0
+
+    def test_per_model_semaphore_bounds_concurrency(self, monkeypatch):
+        import asyncio
+        import kelp_teaser.tools.llm as llm_module
+
+        client = _FakeAsyncClient()
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        monkeypatch.setattr(llm_module, "LLM_ASYNC_CONCURRENCY", {"gemini-2.5-flash": 2})
+        monkeypatch.setattr(llm_module, "LLM_CACHE_ENABLED", False)
+
+        async def fan_out():
+            return await asyncio.gather(*(
+                llm_module.acomplete_text("gemini-2.5-flash", f"p{i}")
+                for i in range(10)
+            ))
+
+        assert asyncio.run(fan_out()) == ["ok"] * 10
+        assert client.calls == 10
+        assert client.peak == 2
+
+    def test_acomplete_json_retries_with_validation_feedback(self, monkeypatch):
+        import asyncio
+        import kelp_teaser.tools.llm as llm_module
+
+        prompts_seen: list[str] = []
+        responses = iter(['{"value": ""}', '{"value": "ok"}'])
+
+        async def fake_agenerate(model, prompt, *, temperature=0.2, tracker=None,
+                                 turns=None, **_):
+            prompts_seen.append(prompt + "".join(t.text for t in turns or []))
+            return next(responses)
+
+        monkeypatch.setattr(llm_module, "_agenerate", fake_agenerate)
+        monkeypatch.setattr(llm_module, "LLM_STRUCTURED_OUTPUT", False)
+        result = asyncio.run(llm_module.acomplete_json("gemini-2.5-flash", "base",
+                                                       _Widget))
+        assert result.value == "ok"
+        assert len(prompts_seen) == 2
+        assert "validation" in prompts_seen[1].lower()
+
+    def test_acomplete_text_backs_off_without_blocking(self, monkeypatch):
+        import asyncio
+        import kelp_teaser.tools.llm as llm_module
+
+        slept: list[float] = []
+        real_sleep = asyncio.sleep
+
+        async def fake_sleep(s):
+            slept.append(s)
+            await real_sleep(0)
+
+        client = _FakeAsyncClient(responses=[RuntimeError("503"), "ok"], delay=0)
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        monkeypatch.setattr(llm_module.asyncio, "sleep", fake_sleep)
+        out = asyncio.run(llm_module.acomplete_text("gemini-2.5-flash", "p"))
+        assert out == "ok"
+        assert 2 in slept
+
+
+class _FakeStreamClient:
+    """Mimics `client.models.generate_content_stream` yielding text chunks."""
+
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.consumed: list[int] = []
+        outer = self
+
+        class _Models:
+            def generate_content_stream(self, **kwargs):
+                chunks = outer.streams.pop(0)
+                index = len(outer.consumed)
+                outer.consumed.append(0)
+
+                class _Usage:
+                    prompt_token_count = 100
+                    candidates_token_count = 10
+
+                for i, text in enumerate(chunks):
+                    outer.consumed[index] = i + 1
+
+                    class _Chunk:
+                        usage_metadata = _Usage()
+                    _Chunk.text = text
+                    yield _Chunk()
+
+        self.models = _Models()
+
+
+class _Section(BaseModel):
+    name: str
+
+
+class _Page(BaseModel):
+    title: str
+    sections: list[_Section]
+
+
+class TestStreamJson:
+    def test_yields_sections_as_they_complete(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        chunks = ['{"title": "T", "sections": [{"na', 'me": "a"}, ',
+                  '{"name": "b"}', "]}"]
+        client = _FakeStreamClient([chunks])
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        tracker = CostTracker()
+        stream = llm_module.stream_json("gemini-2.5-pro", "p", _Page,
+                                        item_field="sections", tracker=tracker)
+        seen = []
+        for section in stream:
+            seen.append((section.name, client.consumed[0]))
+        # "a" arrives with chunk 2, before the stream has finished.
+        assert seen == [("a", 2), ("b", 3)]
+        assert stream.result == _Page(title="T", sections=[_Section(name="a"),
+                                                           _Section(name="b")])
+        assert tracker.total_calls == 1
+
+    def test_off_schema_stream_is_cancelled_and_falls_back(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        client = _FakeStreamClient([["I cannot produce JSON ", "because ", "..."]])
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        monkeypatch.setattr(
+            llm_module, "_complete_json",
+            lambda model, prompt, schema, **kw: _Page(
+                title="T", sections=[_Section(name="x")]))
+        tracker = CostTracker()
+        stream = llm_module.stream_json("gemini-2.5-pro", "p", _Page,
+                                        item_field="sections", tracker=tracker)
+        assert [s.name for s in stream] == ["x"]
+        assert stream.cancelled
+        assert client.consumed == [1]  # stopped reading after the first chunk
+        assert tracker.summary()["streams_cancelled"] == 1
+
+    def test_invalid_section_is_reasked_from_the_finished_stream(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        text = '{"title": "T", "sections": [{"name": "a"}, {"name": 5}, {"name": "c"}]}'
+        client = _FakeStreamClient([[text[:40], text[40:]]])
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        prompts: list[str] = []
+
+        def fake_generate(model, prompt, **kw):
+            prompts.append(prompt)
+            return '{"sections[1]": {"name": "b"}}'
+
+        monkeypatch.setattr(llm_module, "_generate", fake_generate)
+        tracker = CostTracker()
+        stream = llm_module.stream_json("gemini-2.5-pro", "p", _Page,
+                                        item_field="sections", tracker=tracker)
+        assert [s.name for s in stream] == ["a", "b", "c"]
+        assert client.consumed == [2]  # read to the end, not cancelled
+        assert not stream.cancelled
+        assert tracker.summary()["streams_cancelled"] == 0
+        assert len(prompts) == 1 and "sections[1]" in prompts[0]
+
+    def test_recovery_only_yields_sections_not_already_handed_out(self, monkeypatch):
+        import kelp_teaser.tools.llm as llm_module
+
+        text = '{"sections": [{"name": "a"}]}'  # no title
+        client = _FakeStreamClient([[text]])
+        monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+        turns_seen: list = []
+
+        def fake_generate(model, prompt, *, turns=None, **kw):
+            turns_seen.append(turns)
+            return '{"title": "T", "sections": [{"name": "a2"}, {"name": "b2"}]}'
+
+        monkeypatch.setattr(llm_module, "_generate", fake_generate)
+        monkeypatch.setattr(llm_module, "LLM_CHAT_RETRY", True)
+        stream = llm_module.stream_json("gemini-2.5-pro", "p", _Page,
+                                        item_field="sections")
+        assert [s.name for s in stream] == ["a", "b2"]
+        assert stream.result.sections[0].name == "a2"
+        # The follow-up continues from what streamed in, not a cold request.
+        assert turns_seen[0][0].text == text
+        assert "title" in turns_seen[0][1].text
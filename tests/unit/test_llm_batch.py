@@ -0,0 +1,139 @@
+import json
+
+import pytest
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.tools.llm import CostTracker
+from kelp_teaser.tools.llm_batch import (
+    BatchExecutor,
+    BatchJobFailed,
+    LocalFileBatchBackend,
+)
+
+
+class _Widget(BaseModel):
+    value: str
+
+
+def test_executor_resolves_text_and_json_futures(tmp_path):
+    def worker(req):
+        return '{"value": "ok"}' if req.json_schema else f"echo:{req.prompt}"
+
+    backend = LocalFileBatchBackend(tmp_path / "jobs", worker=worker)
+    with BatchExecutor(backend=backend, sleep=lambda s: None) as batch:
+        a = batch.submit_text("gemini-2.5-flash", "one")
+        b = batch.submit_text("gemini-2.5-flash", "two")
+        c = batch.submit_json("gemini-2.5-flash", "three", _Widget)
+    assert a.result() == "echo:one"
+    assert b.result() == "echo:two"
+    assert c.result() == _Widget(value="ok")
+    # One job for the single model, holding all three requests.
+    jobs = list((tmp_path / "jobs").iterdir())
+    assert len(jobs) == 1
+    assert len((jobs[0] / "requests.jsonl").read_text().splitlines()) == 3
+
+
+def test_executor_submits_one_job_per_model(tmp_path):
+    backend = LocalFileBatchBackend(tmp_path / "jobs", worker=lambda req: req.model)
+    with BatchExecutor(backend=backend, sleep=lambda s: None) as batch:
+        f = batch.submit_text("gemini-2.5-flash", "p")
+        p = batch.submit_text("gemini-2.5-pro", "p")
+    assert (f.result(), p.result()) == ("gemini-2.5-flash", "gemini-2.5-pro")
+    assert len(list((tmp_path / "jobs").iterdir())) == 2
+
+
+def test_executor_polls_until_responses_appear(tmp_path):
+    backend = LocalFileBatchBackend(tmp_path / "jobs")
+    polls: list[float] = []
+
+    def fake_sleep(s):
+        polls.append(s)
+        job_dir = next((tmp_path / "jobs").iterdir())
+        req = json.loads((job_dir / "requests.jsonl").read_text().splitlines()[0])
+        (job_dir / "responses.jsonl").write_text(
+            json.dumps({"key": req["key"], "text": "done"}) + "\n")
+
+    executor = BatchExecutor(backend=backend, poll_interval_s=5, sleep=fake_sleep)
+    fut = executor.submit_text("gemini-2.5-flash", "p")
+    executor.run()
+    assert fut.result() == "done"
+    assert polls == [5]
+
+
+def test_per_request_errors_and_invalid_json_fail_only_their_future(tmp_path):
+    def worker(req):
+        if req.prompt == "boom":
+            raise RuntimeError("safety block")
+        return '{"value": 3}' if req.json_schema else "fine"
+
+    backend = LocalFileBatchBackend(tmp_path / "jobs", worker=worker)
+    with BatchExecutor(backend=backend, sleep=lambda s: None) as batch:
+        ok = batch.submit_text("gemini-2.5-flash", "ok")
+        bad = batch.submit_text("gemini-2.5-flash", "boom")
+        invalid = batch.submit_json("gemini-2.5-flash", "json", _Widget)
+    assert ok.result() == "fine"
+    with pytest.raises(BatchJobFailed, match="safety block"):
+        bad.result()
+    with pytest.raises(Exception):
+        invalid.result()
+
+
+def test_llm_batch_executor_charges_discounted_cost_and_fills_cache(tmp_path):
+    tracker = CostTracker()
+    backend = LocalFileBatchBackend(tmp_path / "jobs", worker=lambda req: "x" * 400)
+    with llm_module.batch_executor(tracker=tracker, backend=backend) as batch:
+        fut = batch.submit_text("gemini-2.5-pro", "p" * 4000)
+    assert fut.result() == "x" * 400
+    interactive = llm_module.estimate_cost_usd("gemini-2.5-pro", 1000, 100)
+    assert abs(tracker.total_cost_usd - interactive / 2) < 1e-12
+    assert tracker.summary()["batch_calls"] == 1
+
+    # A second identical request is served from the response cache: no job.
+    with llm_module.batch_executor(tracker=tracker, backend=backend) as batch:
+        again = batch.submit_text("gemini-2.5-pro", "p" * 4000)
+    assert again.result() == "x" * 400
+    assert len(list((tmp_path / "jobs").iterdir())) == 1
+    assert tracker.cache_hits == 1
+
+
+def test_llm_batch_executor_checks_the_cost_cap_before_and_after_the_job(
+        tmp_path, monkeypatch):
+    tracker = CostTracker()
+    backend = LocalFileBatchBackend(tmp_path / "jobs", worker=lambda req: "x" * 4000)
+    prompt_cost = llm_module.estimate_cost_usd("gemini-2.5-pro", 1000, 0) / 2
+    monkeypatch.setattr(llm_module, "COST_HARD_ABORT", prompt_cost / 2)
+    with llm_module.batch_executor(tracker=tracker, backend=backend) as batch:
+        refused = batch.submit_text("gemini-2.5-pro", "p" * 4000)
+    with pytest.raises(llm_module.CostExceeded, match="would take run cost"):
+        refused.result()
+    assert not (tmp_path / "jobs").exists()
+
+    # The prompts fit, but the billed output takes the run over the cap.
+    monkeypatch.setattr(llm_module, "COST_HARD_ABORT", prompt_cost * 2)
+    with llm_module.batch_executor(tracker=tracker, backend=backend) as batch:
+        over = batch.submit_text("gemini-2.5-pro", "p" * 4000)
+    with pytest.raises(llm_module.CostExceeded, match="hard abort"):
+        over.result()
+    assert tracker.summary()["batch_calls"] == 1
+
+
+def test_researcher_uses_batch_mode_when_enabled(monkeypatch, tmp_path):
+    from pathlib import Path
+
+    from kelp_teaser.agents import researcher
+    from kelp_teaser.graph.state import GraphState
+    from kelp_teaser.tools.web_search import TavilyHit
+
+    monkeypatch.setattr(researcher, "LLM_BATCH_MODE", True)
+    monkeypatch.setattr(researcher.web_search, "search", lambda q, max_results=5: [
+        TavilyHit(url=f"https://x.com/{len(q)}", title="t", content="c" * 50)])
+    jobs = tmp_path / "jobs"
+    backend = LocalFileBatchBackend(jobs, worker=lambda req: "batched summary")
+    real = llm_module.batch_executor
+    monkeypatch.setattr(llm_module, "batch_executor",
+                        lambda **kw: real(backend=backend, **kw))
+    state = GraphState(company_name="Acme", input_path=Path("."), run_id="r")
+    out = researcher.run(state)
+    assert [s.summary for s in out["web_snippets"]] == ["batched summary"] * 3
+    assert len(list(jobs.iterdir())) == 1
@@ -0,0 +1,144 @@
+import os
+import time
+
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.tools.llm import CostTracker
+from kelp_teaser.tools import llm_cache
+from kelp_teaser.tools.llm_cache import ResponseCache, cache_key
+
+
+class _Widget(BaseModel):
+    value: str
+
+
+def _cache(tmp_path, **kw) -> ResponseCache:
+    return ResponseCache(tmp_path / "c", max_bytes=kw.get("max_bytes", 10_000_000),
+                         ttl_s=kw.get("ttl_s", 3600))
+
+
+def test_cache_key_depends_on_every_input():
+    base = cache_key("m", "p", temperature=0.2)
+    assert base == cache_key("m", "p", temperature=0.2)
+    assert base != cache_key("m2", "p", temperature=0.2)
+    assert base != cache_key("m", "p2", temperature=0.2)
+    assert base != cache_key("m", "p", temperature=0.3)
+    assert base != cache_key("m", "p", temperature=0.2, schema={"type": "object"})
+
+
+def test_put_then_get_round_trips(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("ab" * 32, {"text": "hello"})
+    assert cache.get("ab" * 32)["text"] == "hello"
+    assert cache.get("cd" * 32) is None
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = _cache(tmp_path, ttl_s=0.0)
+    cache.put("ab" * 32, {"text": "hello"})
+    time.sleep(0.01)
+    assert cache.get("ab" * 32) is None
+    assert cache.stats().entries == 0
+
+
+def test_evicts_least_recently_used_over_size(tmp_path):
+    cache = _cache(tmp_path, max_bytes=10_000_000)
+    for i, key in enumerate(("aa" * 32, "bb" * 32, "cc" * 32)):
+        cache.put(key, {"text": "x" * 1000})
+        path = cache._path_for(key)
+        os.utime(path, (1000 + i, 1000 + i))
+    cache.get("aa" * 32)  # touch: now the most recent
+    kept = sum(cache._path_for(k).stat().st_size for k in ("aa" * 32, "cc" * 32))
+    cache.max_bytes = int(kept / llm_cache._LOW_WATER) + 1
+    cache._evict_over_size()
+    assert cache.get("bb" * 32) is None
+    assert cache.get("aa" * 32) is not None
+    assert cache.get("cc" * 32) is not None
+
+
+def test_puts_under_the_size_bound_do_not_scan(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, max_bytes=10_000_000)
+    cache.put("aa" * 32, {"text": "x"})  # first put learns the total
+    scans: list[int] = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or entries())
+    for key in ("bb" * 32, "cc" * 32, "aa" * 32):
+        cache.put(key, {"text": "x" * 100})
+    assert scans == []
+    assert cache._total == cache.stats().total_bytes
+
+    cache.max_bytes = cache._total - 1  # the next put scans and evicts in a batch
+    cache.put("dd" * 32, {"text": "x" * 100})
+    assert len(scans) == 2
+    assert cache._total == cache.stats().total_bytes <= cache.max_bytes * llm_cache._LOW_WATER
+
+
+def test_prune_clear_removes_everything(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("aa" * 32, {"text": "x"})
+    cache.put("bb" * 32, {"text": "y"})
+    assert cache.prune(clear=True) == 2
+    assert cache.stats().entries == 0
+
+
+def test_complete_json_second_call_is_a_zero_cost_cache_hit(monkeypatch):
+    calls: list[str] = []
+
+    def fake_generate(model, prompt, *, temperature=0.2, tracker=None, **_):
+        calls.append(prompt)
+        return '{"value": "ok"}'
+
+    monkeypatch.setattr(llm_module, "_generate", fake_generate)
+    monkeypatch.setattr(llm_module, "LLM_STRUCTURED_OUTPUT", False)
+    tracker = CostTracker()
+    first = llm_module.complete_json("gemini-2.5-flash", "p", _Widget, tracker=tracker)
+    second = llm_module.complete_json("gemini-2.5-flash", "p", _Widget, tracker=tracker)
+
+    assert first == second == _Widget(value="ok")
+    assert len(calls) == 1
+    assert tracker.cache_misses == 1
+    assert tracker.cache_hits == 1
+    assert tracker.calls[-1].cached is True
+    assert tracker.total_cost_usd == 0.0
+
+
+def test_complete_text_caches_and_skips_network(monkeypatch):
+    class _Resp:
+        text = "summary"
+        usage_metadata = None
+
+    class _Models:
+        n = 0
+
+        def generate_content(self, **kwargs):
+            _Models.n += 1
+            return _Resp()
+
+    class _Client:
+        models = _Models()
+
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    tracker = CostTracker()
+    assert llm_module.complete_text("gemini-2.5-flash", "p", tracker=tracker) == "summary"
+    assert llm_module.complete_text("gemini-2.5-flash", "p", tracker=tracker) == "summary"
+    assert _Models.n == 1
+    assert tracker.summary()["cache_hits"] == 1
+
+
+def test_cache_disabled_never_touches_disk(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_module, "LLM_CACHE_ENABLED", False)
+    assert llm_module._get_cache() is None
+
+
+def test_cli_cache_stats_and_prune(monkeypatch, tmp_path, capsys):
+    from kelp_teaser import cli
+
+    monkeypatch.setattr(cli, "LLM_CACHE_DIR", tmp_path / "c")
+    ResponseCache(tmp_path / "c", max_bytes=10_000, ttl_s=60).put("aa" * 32, {"text": "x"})
+    assert cli.main(["cache", "stats"]) == 0
+    assert "entries: 1" in capsys.readouterr().out
+    assert cli.main(["cache", "prune", "--all"]) == 0
+    out = capsys.readouterr().out
+    assert "Removed 1" in out
+    assert "entries: 0" in out
@@ -0,0 +1,128 @@
+import pytest
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.tools.llm import CostTracker
+from kelp_teaser.tools.llm_providers import LLMRequest, OpenAICompatProvider, Turn
+
+
+class _Widget(BaseModel):
+    value: str
+
+
+class _FakeResponse:
+    def __init__(self, body=None, lines=None):
+        self._body = body
+        self._lines = lines or []
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self._lines
+
+    def close(self):
+        self.closed = True
+
+
+class _FakePost:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls: list[dict] = []
+
+    def __call__(self, url, *, json, headers, timeout, stream):
+        self.calls.append({"url": url, "json": json, "headers": headers,
+                           "stream": stream})
+        return self.responses.pop(0)
+
+
+def _chat_body(text, prompt_tokens=12, completion_tokens=3):
+    return {"choices": [{"message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": prompt_tokens,
+                      "completion_tokens": completion_tokens}}
+
+
+def test_openai_provider_posts_chat_completion_with_json_schema():
+    post = _FakePost(_FakeResponse(_chat_body('{"value": "ok"}')))
+    provider = OpenAICompatProvider("http://box:8000/v1/", api_key="k", post=post)
+    out = provider.generate(LLMRequest(
+        model="qwen", contents="hi", temperature=0.1,
+        json_schema={"title": "Widget", "type": "object"}))
+    assert out.text == '{"value": "ok"}'
+    assert (out.usage.prompt_tokens, out.usage.output_tokens) == (12, 3)
+    call = post.calls[0]
+    assert call["url"] == "http://box:8000/v1/chat/completions"
+    assert call["headers"]["Authorization"] == "Bearer k"
+    assert call["json"]["messages"] == [{"role": "user", "content": "hi"}]
+    assert call["json"]["response_format"]["json_schema"]["name"] == "Widget"
+
+
+def test_openai_provider_sends_follow_up_turns_as_chat_messages():
+    post = _FakePost(_FakeResponse(_chat_body('{"value": "ok"}')))
+    provider = OpenAICompatProvider("http://box/v1", post=post)
+    provider.generate(LLMRequest(model="m", contents="hi", temperature=0,
+                                 turns=[Turn("model", "{}"), Turn("user", "fix it")]))
+    assert post.calls[0]["json"]["messages"] == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "{}"},
+        {"role": "user", "content": "fix it"},
+    ]
+
+
+def test_openai_provider_streams_sse_deltas_and_final_usage():
+    lines = [
+        'data: {"choices": [{"delta": {"content": "Hel"}}]}',
+        "",
+        'data: {"choices": [{"delta": {"content": "lo"}}]}',
+        'data: {"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 2}}',
+        "data: [DONE]",
+    ]
+    resp = _FakeResponse(lines=lines)
+    provider = OpenAICompatProvider("http://box/v1", post=_FakePost(resp))
+    chunks = list(provider.stream(LLMRequest(model="m", contents="p", temperature=0)))
+    assert "".join(c.text for c in chunks) == "Hello"
+    assert chunks[-1].usage.output_tokens == 2
+    assert resp.closed
+
+
+def test_model_mapping_falls_back_to_default_model():
+    provider = OpenAICompatProvider("http://box/v1",
+                                    models={"gemini-2.5-pro": "big-local"},
+                                    default_model="small-local")
+    assert provider.model_for("gemini-2.5-pro") == "big-local"
+    assert provider.model_for("gemini-2.5-flash") == "small-local"
+
+
+def test_agent_routed_to_openai_provider_end_to_end(monkeypatch):
+    post = _FakePost(_FakeResponse(_chat_body('{"value": "local"}')))
+    local = OpenAICompatProvider("http://box/v1", default_model="local-7b", post=post)
+    monkeypatch.setitem(llm_module.PROVIDERS, "openai", local)
+    monkeypatch.setattr(llm_module, "LLM_AGENT_PROVIDERS", {"critic": "openai"})
+
+    def no_gemini():
+        raise AssertionError("Gemini must not be called for a routed agent")
+
+    monkeypatch.setattr(llm_module, "_get_client", no_gemini)
+    tracker = CostTracker()
+    ctx = llm_module.shared_context("gemini-2.5-flash", "SOURCES " * 5000)
+    out = llm_module.complete_json("gemini-2.5-flash", "judge", _Widget,
+                                   tracker=tracker, context=ctx, agent="critic")
+    assert out.value == "local"
+    sent = post.calls[0]["json"]
+    assert sent["model"] == "local-7b"
+    # No context caching on this backend: the prefix is inlined.
+    assert sent["messages"][0]["content"].startswith("SOURCES")
+    assert [c.model for c in tracker.calls] == ["local-7b"]
+    assert tracker.calls[0].prompt_tokens == 12
+    assert tracker.total_cost_usd == 0.0
+
+
+def test_unknown_provider_name_raises(monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_AGENT_PROVIDERS", {"planner": "nope"})
+    with pytest.raises(ValueError, match="unknown LLM provider"):
+        llm_module.route("planner", "gemini-2.5-pro")
+    assert llm_module.route("critic", "gemini-2.5-flash")[0].name == "gemini"
@@ -0,0 +1,115 @@
+import pytest
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.tools.llm import CostTracker, estimate_cost_usd
+from kelp_teaser.tools.model_router import ModelRouter, RoutePolicy
+
+FAST, SMART = "gemini-2.5-flash", "gemini-2.5-pro"
+
+
+def _router(**policies):
+    return ModelRouter(policies or {"planner": RoutePolicy(small_prompt_tokens=1000)},
+                       fast=FAST, smart=SMART, soft_budget_usd=2.0,
+                       hard_budget_usd=5.0, cost_fn=estimate_cost_usd)
+
+
+def test_unrouted_calls_return_none():
+    router = _router()
+    assert router.choose("critic", SMART, 10, 0.0) is None
+    assert router.choose("planner", FAST, 10, 0.0) is None
+    assert router.choose(None, SMART, 10, 0.0) is None
+
+
+def test_small_prompt_starts_on_fast_with_escalation():
+    d = _router().choose("planner", SMART, 500, 0.0)
+    assert (d.chosen, d.reason, d.cascade) == (FAST, "small_prompt", True)
+
+
+def test_large_prompt_stays_on_smart_unless_agent_cascades():
+    assert _router().choose("planner", SMART, 50_000, 0.0).chosen == SMART
+    router = _router(planner=RoutePolicy(cascade=True))
+    d = router.choose("planner", SMART, 50_000, 0.0)
+    assert (d.chosen, d.reason, d.cascade) == (FAST, "cascade", True)
+
+
+def test_budget_pressure_forces_fast_without_escalation():
+    router = _router()
+    d = router.choose("planner", SMART, 50_000, 2.5)
+    assert (d.chosen, d.reason, d.cascade) == (FAST, "over_soft_budget", False)
+    # 3.5M prompt tokens on Pro (~$4.40) on top of $1 spent breaches the $5 cap.
+    d = router.choose("planner", SMART, 3_500_000, 1.0)
+    assert (d.chosen, d.reason, d.cascade) == (FAST, "budget_headroom", False)
+
+
+class _Plan(BaseModel):
+    title: str
+
+
+class _ModelAwareClient:
+    """Returns `replies[model]` and records which models were called."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.models_called: list[str] = []
+        outer = self
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                outer.models_called.append(model)
+                reply = outer.replies[model]
+                if isinstance(reply, Exception):
+                    raise reply
+
+                class _Usage:
+                    prompt_token_count = 200
+                    candidates_token_count = 20
+
+                class _Resp:
+                    usage_metadata = _Usage()
+                _Resp.text = reply
+                return _Resp()
+
+        self.models = _Models()
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    monkeypatch.setattr(llm_module, "MODEL_ROUTER", _router())
+    monkeypatch.setattr(llm_module.time, "sleep", lambda s: None)
+
+
+def test_cascade_escalates_to_smart_on_validation_failure(monkeypatch, routed):
+    client = _ModelAwareClient({FAST: '{"wrong": 1}', SMART: '{"title": "Deck"}'})
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    tracker = CostTracker()
+    out = llm_module.complete_json(SMART, "tiny prompt", _Plan, tracker=tracker,
+                                   agent="planner")
+    assert out.title == "Deck"
+    assert client.models_called == [FAST, SMART]
+    [route] = tracker.summary()["routing"]
+    assert route["agent"] == "planner"
+    assert route["reason"] == "small_prompt"
+    assert route["escalated"] is True
+    assert route["calls"] == 2
+    assert route["cost_usd"] == pytest.approx(
+        estimate_cost_usd(FAST, 200, 20) + estimate_cost_usd(SMART, 200, 20), abs=1e-6)
+
+
+def test_cascade_keeps_fast_result_when_it_validates(monkeypatch, routed):
+    client = _ModelAwareClient({FAST: '{"title": "Cheap"}', SMART: '{"title": "X"}'})
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    tracker = CostTracker()
+    out = llm_module.complete_json(SMART, "tiny prompt", _Plan, tracker=tracker,
+                                   agent="planner")
+    assert out.title == "Cheap"
+    assert client.models_called == [FAST]
+    assert tracker.summary()["routing"][0]["escalated"] is False
+
+
+def test_transport_failure_on_fast_does_not_escalate(monkeypatch, routed):
+    client = _ModelAwareClient({FAST: RuntimeError("503"), SMART: '{"title": "X"}'})
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    with pytest.raises(RuntimeError, match="complete_json failed"):
+        llm_module.complete_json(SMART, "tiny prompt", _Plan, agent="planner")
+    assert SMART not in client.models_called
@@ -0,0 +1,45 @@
+import random
+
+from kelp_teaser.tools.near_dup_cache import (
+    MinHasher,
+    NearDupCache,
+    NearDupKey,
+    group_near_duplicates,
+    similarity,
+)
+
+_rng = random.Random(7)
+_WORDS = [f"w{i}" for i in range(300)]
+ARTICLE = " ".join(_rng.choice(_WORDS) for _ in range(600))
+OTHER = " ".join(_rng.choice(_WORDS) for _ in range(600))
+
+
+def _excerpt(start: int, end: int) -> str:
+    return " ".join(ARTICLE.split()[start:end])
+
+
+def test_signatures_separate_excerpts_from_other_pages():
+    h = MinHasher()
+    a, b, c = h.signature(ARTICLE), h.signature(_excerpt(10, 600)), h.signature(OTHER)
+    assert similarity(a, b) > 0.85
+    assert similarity(a, c) < 0.2
+    assert h.signature(ARTICLE.upper()) == a
+
+
+def test_cache_reuses_within_scope_and_persists(tmp_path):
+    cache = NearDupCache(tmp_path, threshold=0.8, ttl_s=3600)
+    cache.put(NearDupKey("acme", ARTICLE), "summary")
+    value, sim = cache.get(NearDupKey("acme", _excerpt(5, 600)))
+    assert value == "summary" and sim >= 0.8
+    assert cache.get(NearDupKey("other-company", ARTICLE)) is None
+    assert cache.get(NearDupKey("acme", OTHER)) is None
+
+    reopened = NearDupCache(tmp_path, threshold=0.8, ttl_s=3600)
+    assert reopened.get(NearDupKey("acme", ARTICLE))[0] == "summary"
+    expired = NearDupCache(tmp_path, threshold=0.8, ttl_s=-1)
+    assert expired.get(NearDupKey("acme", ARTICLE)) is None
+
+
+def test_group_near_duplicates_picks_first_of_each_group():
+    texts = [ARTICLE, OTHER, _excerpt(0, 580), "short note"]
+    assert group_near_duplicates(texts, 0.8) == [0, 1, 0, 3]
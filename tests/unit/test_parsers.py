@@ -0,0 +1,148 @@
+from pathlib import Path
+
+import pytest
+
+from kelp_teaser.tools import parsers
+from kelp_teaser.tools.parsers import (
+    Extraction,
+    garbage_ratio,
+    parse_file,
+    pdf_text_quality,
+    sniff_mime,
+)
+from tests.fixtures.pdfs import PROSE, write_pdf
+
+
+def test_sniffs_types_from_content_not_suffix(tmp_path):
+    import docx
+    import pandas as pd
+    from pptx import Presentation
+
+    docx.Document().save(tmp_path / "memo.dat")
+    Presentation().save(tmp_path / "deck.bin")
+    pd.DataFrame({"a": [1]}).to_excel(tmp_path / "model.xlsx", index=False)
+    (tmp_path / "scan.PDF").write_bytes(b"%PDF-1.7 ...")
+    (tmp_path / "notes.md").write_text("# notes")
+
+    assert sniff_mime(tmp_path / "memo.dat") == parsers.DOCX
+    assert sniff_mime(tmp_path / "deck.bin") == parsers.PPTX
+    assert sniff_mime(tmp_path / "model.xlsx") == parsers.XLSX
+    assert sniff_mime(tmp_path / "scan.PDF") == parsers.PDF
+    assert sniff_mime(tmp_path / "notes.md") == parsers.MARKDOWN
+    assert parsers.file_type(tmp_path / "notes.md").kind == "text"
+
+
+def test_parses_docx_pptx_and_csv_locally(tmp_path):
+    import docx
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    document = docx.Document()
+    document.add_paragraph("Ksolves overview")
+    table = document.add_table(rows=2, cols=2)
+    for r, row in enumerate((("Year", "Revenue"), ("FY24", "120"))):
+        for c, value in enumerate(row):
+            table.cell(r, c).text = value
+    document.add_paragraph("Closing note")
+    document.save(tmp_path / "memo.docx")
+
+    deck = Presentation()
+    slide = deck.slides.add_slide(deck.slide_layouts[5])
+    slide.shapes.title.text = "Key metrics"
+    deck.slides.add_slide(deck.slide_layouts[6])  # blank
+    rows = deck.slides.add_slide(deck.slide_layouts[6]).shapes.add_table(
+        2, 2, Inches(1), Inches(1), Inches(4), Inches(1)).table
+    rows.cell(0, 0).text, rows.cell(1, 0).text = "EBITDA", "31%"
+    deck.save(tmp_path / "deck.pptx")
+
+    (tmp_path / "kpis.csv").write_text("metric;value\nrevenue;120\n;\nmargin;31%\n")
+
+    memo = parse_file(str(tmp_path / "memo.docx"))
+    assert memo.strategy == "python-docx" and memo.accepted
+    assert memo.text == "Ksolves overview\nYear | Revenue\nFY24 | 120\nClosing note"
+
+    slides = parse_file(str(tmp_path / "deck.pptx"))
+    assert slides.strategy == "python-pptx"
+    assert "[Slide 1]\nKey metrics" in slides.text
+    assert "[Slide 2]" not in slides.text
+    assert "[Slide 3]\nEBITDA | \n31% | " in slides.text
+
+    kpis = parse_file(str(tmp_path / "kpis.csv"))
+    assert kpis.strategy == "csv"
+    assert kpis.text == "[CSV: kpis.csv]\nmetric | value\nrevenue | 120\nmargin | 31%\n"
+
+
+def test_csv_is_capped_like_a_sheet(tmp_path):
+    from kelp_teaser.tools.excel_parser import flatten_csv
+
+    path = tmp_path / "ledger.csv"
+    path.write_text("id,amount\n" + "".join(f"{i},{i * 10}\n" for i in range(1, 100)))
+    assert flatten_csv(path, max_rows=3).splitlines() == [
+        "[CSV: ledger.csv]", "id | amount", "1 | 10", "2 | 20", "[... cut after 3 rows]"]
+    assert flatten_csv(path, max_cells=5).splitlines()[-1] == "[... cut after 2 rows]"
+    assert parsers.REGISTRY[parsers.CSV].parser_id.options["csv"]["max_rows"] > 0
+
+
+def test_pdf_with_a_good_text_layer_never_reaches_llamaparse(tmp_path, monkeypatch):
+    def fail(path):
+        raise AssertionError("LlamaParse called")
+
+    monkeypatch.setattr("kelp_teaser.tools.parsers.parse_pdf", fail)
+    pdf = write_pdf(tmp_path / "cim.pdf", [PROSE, PROSE])
+    outcome = parse_file(str(pdf))
+    assert outcome.strategy == "pypdf" and outcome.accepted
+    assert outcome.text.startswith("[Page 1]\nRevenue grew 0%")
+    assert "[Page 2]" in outcome.text
+    assert [a["strategy"] for a in outcome.attempts] == ["pypdf"]
+
+
+def test_pdf_with_a_poor_text_layer_escalates_to_llamaparse(tmp_path, monkeypatch):
+    monkeypatch.setattr("kelp_teaser.tools.parsers.parse_pdf",
+                        lambda path: "| Year | Revenue |\n| FY24 | 120 |")
+    pdf = write_pdf(tmp_path / "scan.pdf", ["", "", "Page 3"])
+    outcome = parse_file(str(pdf))
+    assert outcome.strategy == "llamaparse" and outcome.accepted
+    assert outcome.attempts[0]["strategy"] == "pypdf"
+    assert outcome.attempts[0]["rejected"].startswith("2 chars/page")
+
+
+def test_poor_local_text_is_kept_when_llamaparse_returns_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr("kelp_teaser.tools.parsers.parse_pdf", lambda path: "")
+    pdf = write_pdf(tmp_path / "scan.pdf", ["", "Cover page"])
+    outcome = parse_file(str(pdf))
+    assert outcome.strategy == "pypdf"
+    assert not outcome.accepted
+    assert "Cover page" in outcome.text
+    assert [a.get("rejected") for a in outcome.attempts] == [
+        outcome.attempts[0]["rejected"], "empty"]
+
+
+def test_pdf_quality_checks_density_and_garbage(monkeypatch):
+    monkeypatch.setattr(parsers, "PDF_LOCAL_MIN_CHARS_PER_PAGE", 10)
+    monkeypatch.setattr(parsers, "PDF_LOCAL_MAX_GARBAGE", 0.1)
+    assert pdf_text_quality(Extraction("a" * 30, pages=2)) is None
+    assert pdf_text_quality(Extraction("a" * 30, pages=4)) == "8 chars/page < 10"
+    garbled = "\ufffd" * 10 + "a" * 10
+    assert garbage_ratio(garbled) == pytest.approx(0.5)
+    assert pdf_text_quality(Extraction(garbled, pages=1)) == "garbage ratio 0.50 > 0.1"
+
+
+def test_registered_strategies_run_in_order_and_errors_fall_through(tmp_path, monkeypatch):
+    calls: list[str] = []
+
+    def boom(path):
+        calls.append("boom")
+        raise RuntimeError("no network")
+
+    def local(path):
+        calls.append("local")
+        return Extraction("hello")
+
+    (tmp_path / "a.txt").write_text("ignored")
+    monkeypatch.setitem(parsers.REGISTRY, parsers.PLAIN, parsers.FileType(
+        parsers.PLAIN, "text", (parsers.Strategy("boom", boom),
+                                parsers.Strategy("local", local))))
+    outcome = parse_file(str(tmp_path / "a.txt"))
+    assert calls == ["boom", "local"]
+    assert outcome.text == "hello" and outcome.strategy == "local" and outcome.error is None
+    assert outcome.attempts[0]["error"] == "RuntimeError: no network"
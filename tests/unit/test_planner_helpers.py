@@ -46,7 +46,8 @@ def test_planner_returns_deck_plan(monkeypatch):
 def test_planner_renders_prompt_with_sector(monkeypatch):
     captured = {}
 
-    def fake_complete_json(model, prompt, schema, *, temperature=0.2, tracker=None):
+    def fake_complete_json(model, prompt, schema, *, temperature=0.2, tracker=None,
+                           agent=None):
         captured["prompt"] = prompt
         return _valid_plan()
 
@@ -1,6 +1,14 @@
 import pytest
 
-from kelp_teaser.tools.prompt_loader import Prompt, load_prompt, PromptNotFoundError
+from kelp_teaser.tools.prompt_loader import (
+    PROMPT_VARIABLES,
+    Prompt,
+    PromptError,
+    PromptNotFoundError,
+    PromptRegistry,
+    check_prompts,
+    load_prompt,
+)
 
 
 def test_load_known_prompt_returns_prompt_instance():
@@ -29,3 +37,41 @@ def test_prompt_render_raises_on_missing_variable(tmp_path, monkeypatch):
     p = load_prompt("demo")
     with pytest.raises(Exception):  # jinja2.UndefinedError
         p.render()
+
+
+def test_prompts_are_compiled_once_and_reloaded_on_change(tmp_path, monkeypatch):
+    import os
+
+    prompt_file = tmp_path / "demo.md"
+    prompt_file.write_text("Hello {{ name }}")
+    monkeypatch.setattr("kelp_teaser.tools.prompt_loader.PROMPTS_DIR", tmp_path)
+    first = load_prompt("demo")
+    assert load_prompt("demo") is first
+    prompt_file.write_text("Hi {{ name }}!")
+    st = prompt_file.stat()
+    os.utime(prompt_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert load_prompt("demo").render(name="Halo") == "Hi Halo!"
+
+
+def test_prompt_knows_its_variables_and_static_tokens():
+    p = Prompt("demo", "x" * 400 + "{{ brief }}{% if flag %}y{% endif %}")
+    assert p.variables == {"brief", "flag"}
+    assert 100 <= p.static_tokens <= 102
+
+
+def test_repo_prompts_match_their_callers():
+    prompts = check_prompts()
+    assert set(prompts) == set(PROMPT_VARIABLES)
+
+
+def test_check_reports_undefined_variables_and_syntax_errors(tmp_path):
+    (tmp_path / "good.md").write_text("{{ a }}")
+    (tmp_path / "extra.md").write_text("{{ a }} {{ b }}")
+    (tmp_path / "broken.md").write_text("{% if %}")
+    with pytest.raises(PromptError) as exc:
+        PromptRegistry(tmp_path).check({"good": {"a"}, "extra": {"a"}, "gone": {"a"}})
+    message = str(exc.value)
+    assert "extra: undefined variables b" in message
+    assert "broken" in message
+    assert "gone" in message
+    assert "good" not in message
@@ -0,0 +1,146 @@
+import asyncio
+
+from kelp_teaser.tools.rate_limit import RateLimiter, retry_after_s
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, s: float) -> None:
+        self.sleeps.append(s)
+        self.now += s
+
+
+def _limiter(clock, limits):
+    return RateLimiter(limits, clock=clock, sleep=clock.sleep)
+
+
+def test_requests_within_rpm_are_admitted_immediately():
+    clock = _FakeClock()
+    limiter = _limiter(clock, {"m": (3, 1_000_000)})
+    for _ in range(3):
+        assert limiter.acquire("m", 10) == 0.0
+    assert clock.sleeps == []
+
+
+def test_request_over_rpm_waits_for_refill():
+    clock = _FakeClock()
+    limiter = _limiter(clock, {"m": (60, 1_000_000)})  # 1 request/s refill
+    for _ in range(60):
+        limiter.acquire("m", 1)
+    waited = limiter.acquire("m", 1)
+    assert abs(waited - 1.0) < 1e-9
+    assert limiter.stats()["m"]["waits"] == 1
+
+
+def test_token_budget_gates_large_prompts():
+    clock = _FakeClock()
+    limiter = _limiter(clock, {"m": (1000, 600)})  # 10 tokens/s refill
+    assert limiter.acquire("m", 500) == 0.0
+    waited = limiter.acquire("m", 200)  # 100 left, need 100 more → 10 s
+    assert abs(waited - 10.0) < 1e-9
+
+
+def test_oversized_prompt_is_admitted_against_a_full_bucket():
+    clock = _FakeClock()
+    limiter = _limiter(clock, {"m": (1000, 600)})
+    assert limiter.acquire("m", 10_000) == 0.0
+
+
+def test_reconcile_refunds_overestimate():
+    clock = _FakeClock()
+    limiter = _limiter(clock, {"m": (1000, 600)})
+    limiter.acquire("m", 600)
+    limiter.reconcile("m", estimated=600, actual=100)
+    assert limiter.acquire("m", 500) == 0.0
+
+
+def test_pause_holds_model_until_hint_elapses():
+    clock = _FakeClock()
+    limiter = _limiter(clock, {"m": (1000, 1_000_000)})
+    limiter.pause("m", 7.5)
+    assert abs(limiter.acquire("m", 1) - 7.5) < 1e-9
+
+
+def test_unlisted_models_are_never_throttled():
+    clock = _FakeClock()
+    limiter = _limiter(clock, {})
+    for _ in range(1000):
+        assert limiter.acquire("other", 10**9) == 0.0
+
+
+def test_async_acquire_waits_on_the_loop(monkeypatch):
+    clock = _FakeClock()
+    limiter = _limiter(clock, {"m": (60, 1_000_000)})
+    for _ in range(60):
+        limiter.acquire("m", 1)
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(s):
+        clock.now += s
+        await real_sleep(0)
+
+    monkeypatch.setattr("kelp_teaser.tools.rate_limit.asyncio.sleep", fake_sleep)
+    assert abs(asyncio.run(limiter.aacquire("m", 1)) - 1.0) < 1e-9
+
+
+def test_retry_after_parses_gemini_hints():
+    assert retry_after_s(RuntimeError(
+        "429 RESOURCE_EXHAUSTED {'@type': 'RetryInfo', 'retryDelay': '33s'}")) == 33.0
+    assert retry_after_s(RuntimeError("Please retry in 12.5s.")) == 12.5
+    assert retry_after_s(RuntimeError("500 internal")) is None
+
+
+def test_complete_text_honors_retry_hint_without_sleeping(monkeypatch):
+    import kelp_teaser.tools.llm as llm_module
+
+    calls = {"n": 0}
+
+    class _Resp:
+        text = "ok"
+        usage_metadata = None
+
+    class _Models:
+        def generate_content(self, **kwargs):
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise RuntimeError("429 RESOURCE_EXHAUSTED 'retryDelay': '4s'")
+            return _Resp()
+
+    class _Client:
+        models = _Models()
+
+    clock = _FakeClock()
+    limiter = _limiter(clock, {"gemini-2.5-flash": (1000, 1_000_000)})
+    monkeypatch.setattr(llm_module, "RATE_LIMITER", limiter)
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    monkeypatch.setattr(llm_module.time, "sleep",
+                        lambda s: (_ for _ in ()).throw(AssertionError("slept")))
+    tracker = llm_module.CostTracker()
+    assert llm_module.complete_text("gemini-2.5-flash", "p", tracker=tracker) == "ok"
+    assert clock.sleeps == [4.0]
+    assert tracker.rate_limit_wait_s == 4.0
+
+
+def test_no_sleep_after_final_attempt(monkeypatch):
+    import pytest
+    import kelp_teaser.tools.llm as llm_module
+
+    class _Models:
+        def generate_content(self, **kwargs):
+            raise RuntimeError("503 unavailable")
+
+    class _Client:
+        models = _Models()
+
+    slept: list[float] = []
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    monkeypatch.setattr(llm_module.time, "sleep", slept.append)
+    with pytest.raises(RuntimeError):
+        llm_module.complete_text("gemini-2.5-flash", "p")
+    assert len(slept) == llm_module.LLM_MAX_ATTEMPTS - 1
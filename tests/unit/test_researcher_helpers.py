@@ -91,3 +91,49 @@ def test_researcher_warns_and_traces_when_no_tavily_hits(monkeypatch, caplog):
                for rec in caplog.records)
     assert len(writer.steps) == 1
     assert writer.steps[0]["data"].get("web_research_empty") is True
+
+
+def test_researcher_reuses_summaries_of_near_identical_pages(monkeypatch):
+    import asyncio
+
+    import kelp_teaser.tools.llm as llm_module
+    from kelp_teaser.tools.llm import CostTracker
+
+    article = " ".join(f"fact{i} about the plant and its {i * 7} customers"
+                       for i in range(60))
+    runs = [
+        {"https://a.com/x": article, "https://b.com/y": article[40:] + " more"},
+        {"https://a.com/x?utm=1": article[:-30]},
+    ]
+    prompts: list[str] = []
+
+    class _Models:
+        async def generate_content(self, *, model, contents, config):
+            prompts.append(contents)
+            await asyncio.sleep(0)
+
+            class _Resp:
+                text = "Bullet: 600+ customers."
+                usage_metadata = None
+            return _Resp()
+
+    class _Client:
+        class aio:
+            models = _Models()
+
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    for pages in runs:
+        first_query = default_queries("Ksolves")[0]
+        monkeypatch.setattr(
+            "kelp_teaser.agents.researcher.web_search.search",
+            lambda query, max_results=5, pages=pages: [
+                TavilyHit(url=u, title="Plant", content=c) for u, c in pages.items()
+            ] if query == first_query else [])
+        tracker = CostTracker()
+        monkeypatch.setattr(llm_module, "CURRENT_TRACKER", tracker)
+        result = run_researcher(_state())
+        assert all(s.summary == "Bullet: 600+ customers." for s in result["web_snippets"])
+        stats = tracker.summary()["near_dup"]["researcher"]
+        assert stats["hits"] == 1 and stats["saved_usd"] > 0
+
+    assert len(prompts) == 1
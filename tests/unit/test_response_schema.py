@@ -0,0 +1,92 @@
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.schemas.critic import CriticReport
+from kelp_teaser.schemas.plan import DeckPlan
+from kelp_teaser.schemas.slide import ComposedSlide
+from kelp_teaser.tools.response_schema import to_response_schema
+
+
+class _FreeForm(BaseModel):
+    counts: dict[str, int]
+
+
+class _Node(BaseModel):
+    children: list["_Node"] = []
+
+
+class _Widget(BaseModel):
+    value: str
+
+
+def test_pipeline_schemas_are_expressible():
+    for schema in (ComposedSlide, DeckPlan, CriticReport):
+        assert to_response_schema(schema) is not None, schema.__name__
+
+
+def test_refs_are_inlined_and_nullable_preserved():
+    converted = to_response_schema(DeckPlan).model_dump(exclude_none=True)
+    section = converted["properties"]["slides"]["items"]["properties"]["sections"]["items"]
+    assert section["properties"]["chart_spec"]["nullable"] is True
+    assert "chart_kind" in section["properties"]["chart_spec"]["properties"]
+    assert converted["properties"]["slides"]["min_items"] == 3
+
+
+def test_unexpressible_schemas_return_none():
+    assert to_response_schema(_FreeForm) is None
+    assert to_response_schema(_Node) is None
+
+
+def test_conversion_is_cached_per_class():
+    assert to_response_schema(ComposedSlide) is to_response_schema(ComposedSlide)
+
+
+class _RecordingClient:
+    def __init__(self, responses):
+        self.configs = []
+        self.prompts = []
+        outer = self
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                outer.configs.append(config)
+                if not isinstance(contents, str):  # a chat: join the turns' text
+                    contents = "\n".join(c.parts[0].text for c in contents)
+                outer.prompts.append(contents)
+
+                class _Resp:
+                    usage_metadata = None
+                _Resp.text = responses.pop(0)
+                return _Resp()
+
+        self.models = _Models()
+
+
+def test_complete_json_sends_native_schema_without_prompt_hint(monkeypatch):
+    client = _RecordingClient(['{"value": "ok"}'])
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    tracker = llm_module.CostTracker()
+    out = llm_module.complete_json("gemini-2.5-flash", "base", _Widget, tracker=tracker)
+    assert out.value == "ok"
+    assert client.prompts == ["base"]
+    assert client.configs[0].response_mime_type == "application/json"
+    assert client.configs[0].response_schema is not None
+    assert tracker.summary()["schema_tokens_saved"] > 0
+
+
+def test_retry_in_native_mode_does_not_resend_schema(monkeypatch):
+    client = _RecordingClient(['{"value": 5}', '{"value": "ok"}'])
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    llm_module.complete_json("gemini-2.5-flash", "base", _Widget)
+    assert len(client.prompts) == 2
+    assert "failed validation" in client.prompts[1]
+    assert '"properties"' not in client.prompts[1]
+
+
+def test_unexpressible_schema_falls_back_to_text_hint(monkeypatch):
+    client = _RecordingClient(['{"counts": {"a": 1}}'])
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    out = llm_module.complete_json("gemini-2.5-flash", "base", _FreeForm)
+    assert out.counts == {"a": 1}
+    assert client.configs[0].response_schema is None
+    assert "MUST validate against this schema" in client.prompts[0]
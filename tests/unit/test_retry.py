@@ -0,0 +1,154 @@
+import json
+
+import pytest
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.tools.llm import CostExceeded, CostTracker
+from kelp_teaser.tools.llm_providers import GeminiProvider, LLMRequest, SafetyBlocked
+from kelp_teaser.tools.retry import (
+    ErrorKind,
+    RetryBudget,
+    RetryBudgetExhausted,
+    RetryPolicy,
+    classify,
+)
+
+
+def test_classify_error_kinds():
+    assert classify(RuntimeError("503 unavailable")) is ErrorKind.transport
+    assert classify(RuntimeError("429 RESOURCE_EXHAUSTED")) is ErrorKind.quota
+    assert classify(SafetyBlocked("prompt blocked")) is ErrorKind.safety
+    assert classify(json.JSONDecodeError("x", "doc", 0)) is ErrorKind.validation
+    assert classify(RetryBudgetExhausted("cap")) is ErrorKind.fatal
+    assert classify(CostExceeded("run cap"), fatal=(CostExceeded,)) is ErrorKind.fatal
+
+
+def test_budget_is_shared_across_kinds():
+    budget = RetryBudget(max_attempts=3)
+    budget.start_attempt()
+    assert budget.after_failure(ErrorKind.transport) == 2.0
+    budget.start_attempt()
+    assert budget.after_failure(ErrorKind.validation) == 0.0
+    budget.start_attempt()
+    assert budget.after_failure(ErrorKind.validation) is None  # 3 of 3 used
+
+
+def test_per_kind_limits_and_backoff():
+    budget = RetryBudget(max_attempts=10)
+    budget.start_attempt()
+    assert budget.after_failure(ErrorKind.safety) == 0.0
+    budget.start_attempt()
+    assert budget.after_failure(ErrorKind.safety) is None
+    assert RetryPolicy(max_retries=5, base_s=2.0, cap_s=5.0).delay_s(3) == 5.0
+
+
+def test_cost_and_time_caps():
+    budget = RetryBudget(max_attempts=5, max_cost_usd=0.10)
+    budget.start_attempt()
+    budget.charge(0.25)
+    assert budget.after_failure(ErrorKind.validation) is None
+    with pytest.raises(RetryBudgetExhausted):
+        budget.start_attempt()
+
+    now = [0.0]
+    budget = RetryBudget(max_attempts=5, max_elapsed_s=10.0, clock=lambda: now[0])
+    budget.start_attempt()
+    now[0] = 9.0
+    assert budget.after_failure(ErrorKind.transport) is None  # 2s backoff overruns
+
+
+class _Plan(BaseModel):
+    title: str
+
+
+class _ScriptedClient:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+        outer = self
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                outer.calls += 1
+                reply = outer.replies.pop(0)
+                if isinstance(reply, Exception):
+                    raise reply
+
+                class _Resp:
+                    text = reply
+                    usage_metadata = None
+                return _Resp()
+
+        self.models = _Models()
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(llm_module.time, "sleep", lambda s: None)
+
+
+def test_complete_json_one_budget_for_transport_and_validation(monkeypatch, no_sleep):
+    client = _ScriptedClient([RuntimeError("503"), "not json", RuntimeError("503"),
+                              '{"title": "late"}'])
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    tracker = CostTracker()
+    with pytest.raises(RuntimeError, match="complete_json failed after 3 attempts"):
+        llm_module.complete_json("gemini-2.5-flash", "p", _Plan, tracker=tracker)
+    assert client.calls == llm_module.LLM_MAX_ATTEMPTS
+    assert tracker.summary()["errors_by_kind"] == {"transport": 2, "validation": 1}
+
+
+def test_safety_block_is_resampled_once(monkeypatch, no_sleep):
+    client = _ScriptedClient([SafetyBlocked("blocked"), SafetyBlocked("blocked"),
+                              '{"title": "x"}'])
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    with pytest.raises(RuntimeError):
+        llm_module.complete_json("gemini-2.5-flash", "p", _Plan)
+    assert client.calls == 2
+
+
+def test_request_cost_cap_stops_retries(monkeypatch, no_sleep):
+    class _Usage:
+        prompt_token_count = 1_000_000
+        candidates_token_count = 0
+
+    class _Models:
+        calls = 0
+
+        def generate_content(self, *, model, contents, config):
+            _Models.calls += 1
+
+            class _Resp:
+                text = "not json"
+                usage_metadata = _Usage()
+            return _Resp()
+
+    class _Client:
+        models = _Models()
+
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    monkeypatch.setattr(llm_module, "LLM_REQUEST_MAX_COST_USD", 0.05)
+    with pytest.raises(RuntimeError, match="after 1 attempts"):
+        llm_module.complete_json("gemini-2.5-flash", "p", _Plan)
+    assert _Models.calls == 1
+
+
+def test_gemini_provider_raises_safety_blocked():
+    class _Feedback:
+        block_reason = "SAFETY"
+
+    class _Resp:
+        text = None
+        prompt_feedback = _Feedback()
+
+    class _Models:
+        def generate_content(self, **kwargs):
+            return _Resp()
+
+    class _Client:
+        models = _Models()
+
+    provider = GeminiProvider(lambda: _Client())
+    with pytest.raises(SafetyBlocked):
+        provider.generate(LLMRequest(model="m", contents="p", temperature=0.0))
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.tools.llm import CostTracker
+from kelp_teaser.tools.single_flight import SingleFlight
+
+
+def test_concurrent_threads_share_one_execution():
+    sf = SingleFlight()
+    runs = []
+    gate = threading.Event()
+
+    def work():
+        runs.append(1)
+        gate.wait(timeout=5)
+        return "result"
+
+    out: list[tuple[str, bool]] = []
+    threads = [threading.Thread(target=lambda: out.append(sf.do("k", work)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    while sf.in_flight() == 0:
+        time.sleep(0.001)
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(runs) == 1
+    assert sorted(shared for _, shared in out) == [False, True, True, True, True]
+    assert {r for r, _ in out} == {"result"}
+    assert sf.in_flight() == 0
+
+
+def test_followers_receive_the_leaders_exception():
+    sf = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*(sf.ado("k", boom) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_sequential_calls_are_not_coalesced():
+    sf = SingleFlight()
+    assert sf.do("k", lambda: 1) == (1, False)
+    assert sf.do("k", lambda: 2) == (2, False)
+
+
+def test_async_follower_waits_on_a_thread_leader():
+    sf = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        started.set()
+        release.wait(timeout=5)
+        return "from-thread"
+
+    t = threading.Thread(target=lambda: sf.do("k", work))
+    t.start()
+    started.wait(timeout=5)
+
+    async def follower():
+        asyncio.get_running_loop().call_later(0.02, release.set)
+        return await sf.ado("k", lambda: None)
+
+    assert asyncio.run(follower()) == ("from-thread", True)
+    t.join()
+
+
+class _Widget(BaseModel):
+    value: str
+
+
+class _SlowClient:
+    def __init__(self):
+        self.calls = 0
+        outer = self
+
+        class _Models:
+            async def generate_content(self, **kwargs):
+                outer.calls += 1
+                await asyncio.sleep(0.02)
+
+                class _Usage:
+                    prompt_token_count = 100
+                    candidates_token_count = 10
+
+                class _Resp:
+                    text = '{"value": "ok"}'
+                    usage_metadata = _Usage()
+                return _Resp()
+
+        class _Aio:
+            models = _Models()
+
+        self.aio = _Aio()
+
+
+def test_identical_async_json_requests_share_one_call_and_one_cost(monkeypatch):
+    client = _SlowClient()
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    monkeypatch.setattr(llm_module, "LLM_CACHE_ENABLED", False)
+    tracker = CostTracker()
+
+    async def main():
+        return await asyncio.gather(*(
+            llm_module.acomplete_json("gemini-2.5-flash", "same", _Widget,
+                                      tracker=tracker)
+            for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert client.calls == 1
+    assert [r.value for r in results] == ["ok"] * 4
+    assert len({id(r) for r in results}) == 4  # followers get copies
+    summary = tracker.summary()
+    assert summary["coalesced"] == 3
+    assert tracker.total_cost_usd == pytest.approx(
+        llm_module.estimate_cost_usd("gemini-2.5-flash", 100, 10))
+
+
+def test_different_temperatures_are_not_coalesced(monkeypatch):
+    client = _SlowClient()
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    monkeypatch.setattr(llm_module, "LLM_CACHE_ENABLED", False)
+
+    async def main():
+        await asyncio.gather(
+            llm_module.acomplete_text("gemini-2.5-flash", "same", temperature=0.2),
+            llm_module.acomplete_text("gemini-2.5-flash", "same", temperature=0.7))
+
+    asyncio.run(main())
+    assert client.calls == 2
@@ -0,0 +1,113 @@
+import pytest
+from pydantic import BaseModel
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.agents.composer import build_source_context
+from kelp_teaser.schemas.facts import IngestedDoc, WebSnippet
+from kelp_teaser.tools.llm import CostTracker
+from kelp_teaser.tools.token_budget import (
+    Source,
+    TokenBudget,
+    TokenEstimator,
+    fit_sources,
+    truncate,
+)
+
+
+def _est(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def test_estimator_calibrates_per_model():
+    est = TokenEstimator(alpha=0.5)
+    assert est.estimate("x" * 400, "m") == 101
+    est.observe("m", chars=400, tokens=200)  # 2 chars/token
+    assert est.chars_per_token("m") == 2.0
+    est.observe("m", chars=400, tokens=100)  # 4 chars/token, averaged in
+    assert est.chars_per_token("m") == 3.0
+    assert est.chars_per_token("other") == 4.0
+    est.observe("m", chars=10, tokens=1_000_000)  # implausible: clamped
+    assert est.chars_per_token("m") == 2.0
+
+
+def test_truncate_strategies():
+    text = "A" * 400 + "Z" * 400
+    head = truncate(text, 50, "head", _est)
+    tail = truncate(text, 50, "tail", _est)
+    both = truncate(text, 50, "head_tail", _est)
+    assert head.startswith("A") and "Z" not in head
+    assert tail.endswith("Z") and "A" not in tail
+    assert both.startswith("A") and both.endswith("Z")
+    assert all(_est(t) <= 55 for t in (head, tail, both))
+    assert truncate("short", 50, "head", _est) == "short"
+
+
+def test_fit_sources_caps_then_drops_lowest_priority():
+    sources = [Source("doc:a", "a" * 400, priority=1),
+               Source("doc:b", "b" * 4000, priority=1),
+               Source("web:1", "w" * 400),
+               Source("web:2", "v" * 400)]
+    kept, report = fit_sources(sources, 420, _est, per_source_tokens=200)
+    assert [s.id for s in kept] == ["doc:a", "doc:b", "web:1"]
+    assert report.truncated == ["doc:b"]
+    assert report.dropped == ["web:2"]
+    assert report.after_tokens <= 420
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError, match="strategy"):
+        TokenBudget(input_tokens=10, output_tokens=10, strategy="middle")
+
+
+def test_build_source_context_drops_web_snippets_first(monkeypatch):
+    monkeypatch.setitem(llm_module.TOKEN_BUDGETS, "composer", TokenBudget(
+        input_tokens=300, output_tokens=100, strategy="drop_low_priority"))
+    docs = [IngestedDoc(source_id="doc:x.md", filename="x.md", text="r" * 800)]
+    snippets = [WebSnippet(source_id="web:tavily:https://x.com", url="https://x.com",
+                           summary="s" * 800)]
+    tracker = CostTracker()
+    monkeypatch.setattr(llm_module, "CURRENT_TRACKER", tracker)
+    ctx = build_source_context(docs, snippets, reserve_tokens=50)
+    assert "doc:x.md" in ctx and "web:tavily" not in ctx
+    fit = tracker.summary()["token_budgets"]["composer"]["truncations"]
+    assert fit[0]["dropped"] == ["web:tavily:https://x.com"]
+    # Without a reserve the context is left whole.
+    assert "web:tavily" in build_source_context(docs, snippets)
+
+
+class _Plan(BaseModel):
+    title: str
+
+
+def test_complete_json_sends_output_cap_and_reports_tokens(monkeypatch):
+    configs = []
+
+    class _Usage:
+        prompt_token_count = 1000
+        candidates_token_count = 40
+
+    class _Models:
+        def generate_content(self, *, model, contents, config):
+            configs.append(config)
+
+            class _Resp:
+                text = '{"title": "x"}'
+                usage_metadata = _Usage()
+            return _Resp()
+
+    class _Client:
+        models = _Models()
+
+    monkeypatch.setattr(llm_module, "_get_client", lambda: _Client())
+    monkeypatch.setitem(llm_module.LLM_MAX_OUTPUT_TOKENS, "_Plan", 256)
+    monkeypatch.setitem(llm_module.TOKEN_BUDGETS, "critic", TokenBudget(
+        input_tokens=400, output_tokens=100))
+    tracker = CostTracker()
+    llm_module.complete_json("gemini-2.5-flash", "p" * 2000, _Plan, tracker=tracker,
+                             agent="critic")
+    assert configs[0].max_output_tokens == 256
+    stats = tracker.summary()["token_budgets"]["critic"]
+    assert stats["calls"] == 1
+    assert stats["max_prompt_tokens"] == 1000
+    assert stats["over_input"] == 1 and stats["over_output"] == 0
+    assert llm_module.TOKENS.chars_per_token("gemini-2.5-flash") == 2.0
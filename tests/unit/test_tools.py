@@ -22,3 +22,82 @@ def test_build_pexels_query_url_includes_query():
     assert "query=chemical+reactor" in url or "query=chemical%20reactor" in url
     assert "orientation=landscape" in url
     assert "per_page=5" in url
+
+
+def _workbook(rows_by_sheet: dict[str, list[list]]) -> io.BytesIO:
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, rows in rows_by_sheet.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def test_flatten_workbook_emits_compact_rows_without_empty_rows_or_columns():
+    import datetime as dt
+
+    buf = _workbook({
+        "P&L": [["Metric", None, "FY23", "FY24", None],
+                [],
+                ["Revenue", None, 1200.0, 1534.5, None],
+                ["  EBITDA\nmargin ", None, 0.1 + 0.2, None, None],
+                ["Closed", None, dt.datetime(2024, 3, 31), True]],
+        "Empty": [],
+    })
+    assert flatten_workbook(buf) == (
+        "[Sheet: P&L]\n"
+        "Metric | FY23 | FY24\n"
+        "Revenue | 1200 | 1534.5\n"
+        "EBITDA margin | 0.3\n"
+        "Closed | 2024-03-31 | TRUE\n"
+        "\n"
+        "[Sheet: Empty]\n")
+
+
+def test_flatten_workbook_caps_rows_and_cells_per_sheet():
+    rows = [["id", "value"]] + [[i, i * 10] for i in range(1, 50)]
+    text = flatten_workbook(_workbook({"Big": rows}), max_rows=5)
+    lines = text.splitlines()
+    assert lines[1:6] == ["id | value", "1 | 10", "2 | 20", "3 | 30", "4 | 40"]
+    assert lines[6] == "[... cut after 5 rows]"
+
+    text = flatten_workbook(_workbook({"Big": rows}), max_cells=7)
+    assert text.splitlines()[-1] == "[... cut after 3 rows]"
+
+
+def test_flatten_workbook_summarizes_sheets_over_the_cap():
+    rows = [["region", "units", None, "note"]]
+    rows += [[("North", "South")[i % 2], i, None, "x" if i == 3 else None]
+             for i in range(1, 101)]
+    text = flatten_workbook(_workbook({"Orders": rows}), max_rows=10, summary=True,
+                            summary_rows=2)
+    assert text.splitlines() == [
+        "[Sheet: Orders] (summary of 101 rows)",
+        "region | units | note",
+        "South | 1",
+        "North | 2",
+        "[Column stats]",
+        "region: 100 values, 2 distinct",
+        "units: 100 values, min 1, max 100, mean 50.5",
+        "note: 1 values, 1 distinct",
+    ]
+    small = flatten_workbook(_workbook({"Orders": rows[:5]}), max_rows=10, summary=True)
+    assert "[Column stats]" not in small and small.endswith("North | 4\n")
+
+
+def test_flatten_workbook_output_is_smaller_than_the_pandas_dump():
+    from kelp_teaser.tools.excel_parser import flatten_legacy_workbook
+
+    rows = [["Date", None, "Revenue", "Notes"]]
+    rows += [[f"2024-{m:02d}", None, m * 1000.5, "promo" if m % 4 == 0 else None]
+             for m in range(1, 13)]
+    compact = flatten_workbook(_workbook({"Sales": rows}))
+    legacy = flatten_legacy_workbook(_workbook({"Sales": rows}))
+    assert "NaN" in legacy and "NaN" not in compact
+    assert len(compact) < len(legacy) / 2
@@ -0,0 +1,87 @@
+import json
+
+import kelp_teaser.tools.llm as llm_module
+from kelp_teaser.schemas.critic import CriticReport
+from kelp_teaser.schemas.slide import ComposedSection, ComposedSlide
+from kelp_teaser.schemas.wire import ComposerSlide
+
+_SLIDE = {"index": 0, "title": "Financials", "sections": [
+    {"kind": "bullet_list", "heading": "Scale",
+     "bullets": [{"text": "Revenue ₹450 Cr", "source_id": "doc:x.md"}]},
+    {"kind": "chart", "heading": "Growth"},
+]}
+
+
+def test_composer_wire_schema_has_no_chart_or_image():
+    wire = json.dumps(ComposerSlide.model_json_schema())
+    full = json.dumps(ComposedSlide.model_json_schema())
+    assert "ChartSpec" not in wire and "HeroImage" not in wire
+    assert "ChartSpec" in full
+    assert len(wire) < len(full)
+
+
+def test_wire_objects_convert_to_canonical_models():
+    slide = ComposerSlide.model_validate(_SLIDE).to_canonical()
+    assert isinstance(slide, ComposedSlide)
+    assert slide.sections[1].chart is None
+
+
+class _Client:
+    def __init__(self, reply):
+        self.configs = []
+        outer = self
+
+        class _Models:
+            def generate_content(self, *, model, contents, config):
+                outer.configs.append(config)
+
+                class _Resp:
+                    text = reply
+                    usage_metadata = None
+                return _Resp()
+
+            def generate_content_stream(self, *, model, contents, config):
+                outer.configs.append(config)
+                for i in range(0, len(reply), 40):
+
+                    class _Chunk:
+                        text = reply[i:i + 40]
+                        usage_metadata = None
+                    yield _Chunk()
+
+        self.models = _Models()
+
+
+def test_critic_is_asked_for_suggested_fixes(monkeypatch):
+    client = _Client(json.dumps({"issues": [
+        {"slide_index": 1, "severity": "warning", "category": "length",
+         "detail": "bullet too long", "fx": "Cut it to 15 words"}]}))
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    monkeypatch.setattr(llm_module, "LLM_COMPACT_WIRE_AGENTS", frozenset({"critic"}))
+    report = llm_module.complete_json("gemini-2.5-flash", "review", CriticReport,
+                                      agent="critic")
+    assert isinstance(report, CriticReport)
+    assert report.issues[0].suggested_fix == "Cut it to 15 words"
+    sent = client.configs[0].response_schema.model_dump_json()
+    assert '"fx"' in sent
+
+
+def test_composer_asks_for_wire_schema_and_returns_canonical(monkeypatch):
+    client = _Client(json.dumps(_SLIDE))
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    slide = llm_module.complete_json("gemini-2.5-pro", "compose", ComposedSlide,
+                                     agent="composer")
+    assert isinstance(slide, ComposedSlide)
+    assert "ChartSpec" not in client.configs[0].response_schema.model_dump_json()
+
+
+def test_stream_json_yields_canonical_sections(monkeypatch):
+    client = _Client(json.dumps(_SLIDE))
+    monkeypatch.setattr(llm_module, "_get_client", lambda: client)
+    stream = llm_module.stream_json("gemini-2.5-pro", "compose", ComposedSlide,
+                                    item_field="sections", agent="composer")
+    sections = list(stream)
+    assert all(isinstance(s, ComposedSection) for s in sections)
+    assert isinstance(stream.result, ComposedSlide)
+    assert stream.result.sections[0].bullets[0].source_id == "doc:x.md"
+    assert "HeroImage" not in client.configs[0].response_schema.model_dump_json()